@@ -3,13 +3,20 @@
 # Copyright 2019-2021 phytolrr.com. All rights reserved.
 
 import logging
+import threading
+import time
 
 from dao.datasource import *
 import dao.sequence_entity as sequence
 import dao.motif_entity as motif
 import dao.nsite_entity as nsite
 import dao.tag_ref_entity as tag
-from sqlalchemy import delete, select, update, exists, func
+import dao.sequence_stats_entity as stats
+import dao.seq_id_gram_entity as gram
+import dao.checkpoint_entity as checkpoint
+import dao.score_track_entity as score_track
+from sqlalchemy import delete, select, update, exists, func, and_
+from settings import cache
 from tools.exception import ValidationError
 
 
@@ -35,6 +42,8 @@ def _update_motif_correct(session, ids, version):
         cls = motif.get_entity(version)
         stmt = update(cls).where(cls.id == mid).values(correct=not wrong)
         session.execute(stmt)
+    if len(ids) > 0:
+        stats.refresh_stats(session, motif.find_seq_ids_by_motif_ids(session, list(ids), version), version)
 
 
 def replace_tags_by_motifs(ids_to_tags, version):
@@ -54,15 +63,18 @@ def add_manually_motif(seq_id, offset, version, score, probability):
     motif_e = motif.MotifEntityBase(offset, seq_id, score, probability, 0.0, manually_add=True)
     with session_scope() as session:
         motif.add_motifs(session, [motif_e], version)
+        stats.refresh_stats(session, [seq_id], version)
     return None
 
 
 def remove_manually_motif(mid, version):
     with session_scope() as session:
+        seq_ids = motif.find_seq_ids_by_motif_ids(session, [mid], version)
         tag.replace_tags_by_motifs(session, {mid: []})
         deleted_count = motif.delete_manually_motifs_by_ids(session, [mid], version, synchronize_session='fetch')
         if deleted_count != 1:
             raise ValidationError(str.format("Failed to delete motif by id {}", mid))
+        stats.refresh_stats(session, seq_ids, version)
 
 
 def seq_exists(seq_id):
@@ -84,6 +96,126 @@ def add_seq(seq_id, seq_str, version, motifs_16=[], species=None, ss=None):
     with session_scope() as session:
         motif.replace_motifs_by_seq(session, seq_id, motifs_16, version)
         sequence.add_seq(session, seq_id, seq_str, species=species, ss=ss)
+        stats.refresh_stats(session, [seq_id], version)
+        gram.add_grams(session, [seq_id])
+    _invalidate_seqs_count()
+
+
+class SequenceRecord(object):
+    '''A new sequence with its motifs(MotifEntityBase) and nsites, to be added by add_seqs'''
+    def __init__(self, seq_id, seq, species=None, motifs=[], nsite_positions=[], nsite_types=[]):
+        self.seq_id = seq_id
+        self.seq = seq
+        self.species = species
+        self.motifs = motifs
+        self.nsite_positions = nsite_positions
+        self.nsite_types = nsite_types
+
+
+def add_seqs(records, version):
+    '''
+    Add the new sequences with their motifs and nsites by bulk inserts in one transaction,
+    the sequences already in the database (or repeated in the records) are skipped
+    :param records: list of SequenceRecord
+    :return: the IDs of the added sequences
+    '''
+    with session_scope() as session:
+        seq_ids = set([r.seq_id for r in records])
+        exists_seq_ids = set([seq.seq_id for seq in sequence.find_seq_by_ids(session, seq_ids)])
+        records_to_add = []
+        for r in records:
+            if r.seq_id in exists_seq_ids:
+                logging.warning(str.format("The sequence {} already exists, skip it", r.seq_id))
+                continue
+            exists_seq_ids.add(r.seq_id)
+            records_to_add.append(r)
+        if len(records_to_add) == 0:
+            return []
+
+        session.bulk_insert_mappings(sequence.SequenceEntity, [
+            {'seq_id': r.seq_id, 'seq': r.seq, 'species': r.species} for r in records_to_add])
+        session.bulk_insert_mappings(motif.get_entity(version), [
+            {'seq_id': r.seq_id, 'offset': m.offset, 'score': m.score, 'probability': m.probability,
+             'fdr_probability': m.fdr_probability, 'false_discovery': False, 'manually_add': False, 'correct': True}
+            for r in records_to_add for m in r.motifs])
+        session.bulk_insert_mappings(nsite.NSiteEntity, [
+            {'seq_id': r.seq_id, 'start_pos': pos, 'ntype': ntype}
+            for r in records_to_add for pos, ntype in zip(r.nsite_positions, r.nsite_types)])
+        added_seq_ids = [r.seq_id for r in records_to_add]
+        stats.refresh_stats(session, added_seq_ids, version)
+        gram.add_grams(session, added_seq_ids)
+    _invalidate_seqs_count()
+    return added_seq_ids
+
+
+def replace_motifs_by_seqs(seq_ids_to_motifs, version, checkpoint_name=None, checkpoint_value=None,
+                           seq_ids_to_track=None, matrix_version=None):
+    '''
+    Replace the motifs of many sequences in one transaction
+    :param checkpoint_name: the checkpoint saved in the same transaction if not None
+    :param seq_ids_to_track: the score tracks of the matrix_version saved in the same transaction if not None
+    '''
+    with session_scope() as session:
+        motif.replace_motifs_by_seqs(session, seq_ids_to_motifs, version)
+        stats.refresh_stats(session, seq_ids_to_motifs.keys(), version)
+        if seq_ids_to_track is not None:
+            score_track.save_score_tracks(session, seq_ids_to_track, matrix_version)
+        if checkpoint_name is not None:
+            checkpoint.save_checkpoint(session, checkpoint_name, checkpoint_value)
+
+
+def update_scanned_motifs_fdr(seq_ids_to_fdr, version):
+    '''
+    Update the fdr_probability of the scanned motifs(neither added manually nor marked wrong) in one transaction,
+    and mark the ones no longer found as false discovery, the other motifs are kept
+    :param seq_ids_to_fdr: (the fdr_probability of every window, the offsets of the found motifs) by seq_id
+    :return: the count of the motifs marked as false discovery
+    '''
+    false_discovery_count = 0
+    with session_scope() as session:
+        seq_ids_to_motifs = motif.find_scanned_motifs_by_seq_ids(session, seq_ids_to_fdr.keys(), version)
+        for seq_id, motifs in seq_ids_to_motifs.items():
+            fdr_probabilities, offsets = seq_ids_to_fdr[seq_id]
+            for m in motifs:
+                if m.offset >= len(fdr_probabilities):
+                    logging.warning(str.format("The motif {} is out of the track of {}, skip it", m.id, seq_id))
+                    continue
+                m.fdr_probability = float(fdr_probabilities[m.offset])
+                if m.offset not in offsets:
+                    m.false_discovery = True
+                    m.correct = False
+                    false_discovery_count += 1
+        session.flush()
+        stats.refresh_stats(session, seq_ids_to_fdr.keys(), version)
+    return false_discovery_count
+
+
+def find_score_track(seq_id, matrix_version):
+    '''The score track of the sequence by the matrix, None if not saved or the scoretrack table not created'''
+    with query_session() as session:
+        if not score_track.table_exists(session):
+            return None
+        return score_track.find_score_tracks(session, [seq_id], matrix_version).get(seq_id, None)
+
+
+def find_score_tracks_after(matrix_version, after, limit):
+    with query_session() as session:
+        return score_track.find_score_tracks_after(session, matrix_version, after, limit)
+
+
+def find_checkpoint(name):
+    with query_session() as session:
+        return checkpoint.find_checkpoint(session, name)
+
+
+def remove_checkpoint(name):
+    with session_scope() as session:
+        checkpoint.remove_checkpoint(session, name)
+
+
+def find_seq_strs_after(after, limit):
+    with query_session() as session:
+        return sequence.find_seq_strs_after(session, after, limit)
 
 
 def remove_tags_by_seq_id(session, seq_id, version):
@@ -113,6 +245,17 @@ def find_seq_by_sid(sid):
 def replace_nsites_by_seq_id(seq_id, positions, ntypes):
     with session_scope() as session:
         nsite.replace_nsites_by_seq_id(session, seq_id, positions, ntypes)
+        stats.update_nsite_count(session, seq_id)
+
+
+def replace_nsites_by_seqs(seq_ids_to_nsites):
+    '''
+    Replace the nsites of many sequences in one transaction
+    :param seq_ids_to_nsites: the (positions, ntypes) by seq_id
+    '''
+    with session_scope() as session:
+        nsite.replace_nsites_by_seq_ids(session, seq_ids_to_nsites)
+        stats.update_nsite_counts(session, list(seq_ids_to_nsites.keys()))
 
 
 class Sequence(object):
@@ -122,9 +265,75 @@ class Sequence(object):
         self.seq = seq
 
 
+# (expire_at, count) of all the sequences, the count of the unfiltered listing
+_seqs_count = None
+_seqs_count_lock = threading.Lock()
+
+
+def _invalidate_seqs_count():
+    global _seqs_count
+    with _seqs_count_lock:
+        _seqs_count = None
+
+
+def _count_all_seqs(session):
+    '''
+    The count of all the sequences, cached for cache.sequence_count_ttl seconds.
+    The sequences added by other processes are counted after the cache expired.
+    '''
+    global _seqs_count
+    now = time.monotonic()
+    with _seqs_count_lock:
+        if _seqs_count is not None and _seqs_count[0] > now:
+            return _seqs_count[1]
+    count = sequence.count_seqs(session)
+    if cache.sequence_count_ttl > 0:
+        with _seqs_count_lock:
+            _seqs_count = (now + cache.sequence_count_ttl, count)
+    return count
+
+
+def _query_sequences_filtered(filters):
+    if filters.get('keyword', None) is not None or filters.get('species', None) is not None:
+        return True
+    return _query_sequences_need_join_motif(filters)
+
+
+OFFSET_FILTERS = {'offsetlt', 'offsetgt', 'offseteq'}
+LRR_COUNT_FILTERS = {'lrr_count_lt', 'lrr_count_gt', 'lrr_count_eq'}
+
+
 def _query_sequences_need_join_motif(filters):
-    motif_filters = {'offsetlt', 'offsetgt', 'offseteq', 'lrr_count_lt', 'lrr_count_gt', 'lrr_count_eq'}
-    return len(motif_filters & set(filters.keys())) > 0
+    return len((OFFSET_FILTERS | LRR_COUNT_FILTERS) & set(filters.keys())) > 0
+
+
+def _query_sequences_by_stats(filters):
+    '''
+    Whether the motif filters can be done by the sequence statistics: the lrr count filters, or one of offsetlt
+    and offsetgt, which are the same as the min and max offset. The others are done by grouping the motifs.
+    '''
+    offset_keys = OFFSET_FILTERS & set(filters.keys())
+    lrr_count_keys = LRR_COUNT_FILTERS & set(filters.keys())
+    if len(offset_keys) == 0:
+        return len(lrr_count_keys) > 0
+    return len(lrr_count_keys) == 0 and offset_keys in ({'offsetlt'}, {'offsetgt'})
+
+
+def _add_stats_filters(filters, query):
+    cls = stats.SequenceStatsEntity
+    # the sequences without correct motifs are not matched, the same as grouping the motifs
+    query = query.filter(cls.lrr_count > 0)
+    if filters.get('offsetlt', None) is not None:
+        query = query.filter(cls.min_offset < filters['offsetlt'])
+    if filters.get('offsetgt', None) is not None:
+        query = query.filter(cls.max_offset > filters['offsetgt'])
+    if filters.get('lrr_count_lt', None) is not None:
+        query = query.filter(cls.lrr_count < filters['lrr_count_lt'])
+    if filters.get('lrr_count_gt', None) is not None:
+        query = query.filter(cls.lrr_count > filters['lrr_count_gt'])
+    if filters.get('lrr_count_eq', None) is not None:
+        query = query.filter(cls.lrr_count == filters['lrr_count_eq'])
+    return query
 
 
 def _add_offset_filters(filters, cls, query):
@@ -142,11 +351,31 @@ def _add_offset_filters(filters, cls, query):
     return query
 
 
-def _add_keyword_filters(filters, query):
+def _add_keyword_filters(filters, query, by_grams=True):
+    '''
+    :param by_grams: search the IDs by the index of the grams, else by LIKE '%keyword%' only
+    '''
     keyword = filters.get('keyword', None)
-    if keyword is not None:
-        query = query.filter(sequence.SequenceEntity.seq_id.like('%' + keyword + '%'))
-    return query
+    if keyword is None or len(keyword) == 0:
+        return query
+    if by_grams:
+        query = query.filter(sequence.SequenceEntity.seq_id.in_(gram.select_seq_ids_by_keyword(keyword)))
+        if len(keyword) <= gram.GRAM_LENGTH:
+            return query
+    # also check the IDs found by the grams, they have all the grams but may not contain the keyword
+    pattern = '%' + keyword.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    return query.filter(func.lower(sequence.SequenceEntity.seq_id).like(pattern, escape='\\'))
+
+
+def _search_keyword_by_grams(session, filters):
+    keyword = filters.get('keyword', None)
+    if keyword is None or len(keyword) == 0:
+        return False
+    if not gram.grams_built(session):
+        logging.warning("The seqidgram table is missing or empty, search the keyword by LIKE, "
+                        "run ot-rebuild-seq-id-grams.py to build the index")
+        return False
+    return True
 
 
 def _add_species_filter(filters, query):
@@ -171,6 +400,59 @@ def _add_lrr_count_havings(filters, cls, query):
     return query
 
 
+def _query_sequences(session, filters, version):
+    cls = motif.get_entity(version)
+    query = session.query(sequence.SequenceEntity)
+    count_query = session.query(sequence.SequenceEntity.id)
+    by_stats = _query_sequences_by_stats(filters)
+    if by_stats and not stats.stats_built(session, version):
+        logging.warning(str.format("The sequencestats of version {} are not built, filter by the motifs, "
+                                   "run ot-rebuild-sequence-stats.py to build them", version))
+        by_stats = False
+    if by_stats:
+        on = and_(sequence.SequenceEntity.seq_id == stats.SequenceStatsEntity.seq_id,
+                  stats.SequenceStatsEntity.version == int(version))
+        query = _add_stats_filters(filters, query.join(stats.SequenceStatsEntity, on))
+        count_query = _add_stats_filters(filters, count_query.join(stats.SequenceStatsEntity, on))
+    elif _query_sequences_need_join_motif(filters):
+        query = query.outerjoin(cls, sequence.SequenceEntity.seq_id == cls.seq_id).filter(cls.correct)
+        count_query = count_query.outerjoin(cls, sequence.SequenceEntity.seq_id == cls.seq_id).filter(cls.correct)
+
+        query = _add_offset_filters(filters, cls, query)
+        count_query = _add_offset_filters(filters, cls, count_query)
+
+    by_grams = _search_keyword_by_grams(session, filters)
+    query = _add_keyword_filters(filters, query, by_grams)
+    count_query = _add_keyword_filters(filters, count_query, by_grams)
+
+    query = _add_species_filter(filters, query)
+    count_query = _add_species_filter(filters, count_query)
+
+    if not by_stats and _query_sequences_need_join_motif(filters):
+        query = query.group_by(sequence.SequenceEntity.seq_id)
+        count_query = count_query.group_by(sequence.SequenceEntity.seq_id)
+
+        query = _add_lrr_count_havings(filters, cls, query)
+        count_query = _add_lrr_count_havings(filters, cls, count_query)
+
+    after = filters.get('after', None)
+    if after is not None:
+        # seek by the index of seq_id, the total is still the count of all the matched sequences
+        query = query.filter(sequence.SequenceEntity.seq_id > after)
+    query = query.order_by(sequence.SequenceEntity.seq_id).limit(filters['page_size'])
+    if after is None:
+        query = query.offset(filters['page_index'])
+
+    if not _query_sequences_filtered(filters):
+        total = _count_all_seqs(session)
+    elif not by_stats and _query_sequences_need_join_motif(filters):
+        # count the groups by the database, instead of fetching them
+        total = session.query(func.count()).select_from(count_query.subquery()).scalar()
+    else:
+        total = count_query.with_entities(func.count(sequence.SequenceEntity.id)).scalar()
+    return query.all(), total
+
+
 def query_sequences(filters, version):
     '''
     query sequences according to filters
@@ -180,35 +462,43 @@ def query_sequences(filters, version):
     lrr_count_lt, lrr_count_gr, lrr_count_eq: the number of lrr less than, greater than and equal than
     keyword: query the sequences by ID, case insensitive
     species: species
+    after: the seq_id the page starts after, page_index is ignored if given
     :return: return seqences list, ordered by ID
     '''
-    cls = motif.get_entity(version)
     with query_session() as session:
-        query = session.query(sequence.SequenceEntity)
-        count_query = session.query(sequence.SequenceEntity.id)
-        if _query_sequences_need_join_motif(filters):
-            query = query.outerjoin(cls, sequence.SequenceEntity.seq_id == cls.seq_id).filter(cls.correct)
-            count_query = count_query.outerjoin(cls, sequence.SequenceEntity.seq_id == cls.seq_id).filter(cls.correct)
-
-            query = _add_offset_filters(filters, cls, query)
-            count_query = _add_offset_filters(filters, cls, count_query)
-
-        query = _add_keyword_filters(filters, query)
-        count_query = _add_keyword_filters(filters, count_query)
+        return _query_sequences(session, filters, version)
 
-        query = _add_species_filter(filters, query)
-        count_query = _add_species_filter(filters, count_query)
 
-        if _query_sequences_need_join_motif(filters):
-            query = query.group_by(sequence.SequenceEntity.seq_id)
-            count_query = count_query.group_by(sequence.SequenceEntity.seq_id)
+class SequencesPage(object):
+    def __init__(self, seqs, total, seq_ids_to_motifs, seq_ids_to_nsites, motif_ids_to_tag_names):
+        self.seqs = seqs
+        self.total = total
+        self.seq_ids_to_motifs = seq_ids_to_motifs
+        self.seq_ids_to_nsites = seq_ids_to_nsites
+        self.motif_ids_to_tag_names = motif_ids_to_tag_names
 
-            query = _add_lrr_count_havings(filters, cls, query)
-            count_query = _add_lrr_count_havings(filters, cls, count_query)
 
-        query = query.order_by(sequence.SequenceEntity.seq_id).limit(filters['page_size']).offset(filters['page_index'])
+def query_sequences_page(filters, version, with_tags=False):
+    '''
+    query sequences like query_sequences, together with their motifs, nsites and the tags of the motifs.
+    All the queries are done in one session, the count of the queries does not depend on the page size.
+    :param with_tags: query the tags of the motifs
+    :return: SequencesPage
+    '''
+    with query_session() as session:
+        seqs, total = _query_sequences(session, filters, version)
+        seq_ids = [seq.seq_id for seq in seqs]
+        if len(seq_ids) == 0:
+            return SequencesPage(seqs, total, {}, {}, {})
 
-        return query.all(), len(count_query.all())
+        seq_ids_to_motifs = motif.find_motifs_by_seq_ids(session, seq_ids, version)
+        seq_ids_to_nsites = nsite.find_nsites_by_seq_ids(session, seq_ids)
+        motif_ids = set([m.id for motifs in seq_ids_to_motifs.values() for m in motifs])
+        if with_tags and len(motif_ids) > 0:
+            motif_ids_to_tag_names = tag.find_tag_names_by_motif_ids(session, motif_ids)
+        else:
+            motif_ids_to_tag_names = {}
+        return SequencesPage(seqs, total, seq_ids_to_motifs, seq_ids_to_nsites, motif_ids_to_tag_names)
 
 
 def find_motifs_by_seq_ids(seq_ids, version, with_wrong=True):
@@ -216,6 +506,12 @@ def find_motifs_by_seq_ids(seq_ids, version, with_wrong=True):
         return motif.find_motifs_by_seq_ids(session, seq_ids, version, with_wrong=with_wrong)
 
 
+def find_seq_ids_having_motifs(seq_ids, version):
+    '''The IDs of the sequences already having motifs(the wrong ones included) of the version'''
+    with query_session() as session:
+        return motif.find_seq_ids_having_motifs(session, seq_ids, version)
+
+
 def find_motifs_by_offsets(seq_id, offsets, version):
     with query_session() as session:
         return motif.find_motifs_by_offsets(session, seq_id, offsets, version)
@@ -231,13 +527,19 @@ def find_baseline_seqs():
         return sequence.find_seqs_by_baseline(session)
 
 
-def find_baseline_motifs(baseline_version=1, with_wrong=True):
+def find_baseline_motifs(baseline_version=1, with_wrong=True, length=16):
+    '''
+    :param length: the length of the windows from the offsets of the motifs, e.g. 24 for the extended LRRs,
+    the windows beyond the end of the sequence are dropped
+    '''
     seqs = find_baseline_seqs()
     seq_ids_to_seq_str = dict([(seq.seq_id, seq.seq) for seq in seqs])
     logging.info(str.format("Baseline sequence ids count({}): {}", len(seq_ids_to_seq_str), seq_ids_to_seq_str.keys()))
 
     seq_ids_to_motifs = find_motifs_by_seq_ids(seq_ids_to_seq_str.keys(), baseline_version, with_wrong)
-    return [seq_ids_to_seq_str[m.seq_id][m.offset:m.offset+16] for motifs in seq_ids_to_motifs.values() for m in motifs]
+    motif_strs = [seq_ids_to_seq_str[m.seq_id][m.offset:m.offset+length]
+                  for motifs in seq_ids_to_motifs.values() for m in motifs]
+    return [motif_str for motif_str in motif_strs if len(motif_str) == length]
 
 
 def update_false_discovery_by_motif(mid, false_discovery, version):
@@ -245,6 +547,7 @@ def update_false_discovery_by_motif(mid, false_discovery, version):
         raise ValidationError(str.format("The version below 2 is no longer support to mark wrong"))
     with session_scope() as session:
         motif.update_false_discovery_by_motif(session, mid, false_discovery, version)
+        stats.refresh_stats(session, motif.find_seq_ids_by_motif_ids(session, [mid], version), version)
 
 
 def find_motif_by_mid(mid, version):
@@ -0,0 +1,38 @@
+# THIS FILE IS PART OF phytolrr.com PROJECT.
+# Copyright 2019-2021 phytolrr.com. All rights reserved.
+
+'''The progress of the long running jobs, saved in the same transaction as the results so the jobs can resume'''
+
+import datetime
+from sqlalchemy import Column, Integer, String, DateTime
+from dao.datasource import *
+
+
+class CheckpointEntity(Base):
+    __tablename__ = 'checkpoint'
+
+    id = Column(Integer, autoincrement=True, primary_key=True)
+    name = Column(String(length=256), unique=True)
+    value = Column(String(length=256), nullable=True)
+    updated_at = Column(DateTime)
+
+    def __init__(self, name):
+        self.name = name
+
+
+def find_checkpoint(session, name):
+    checkpoint = session.query(CheckpointEntity).filter(CheckpointEntity.name == name).one_or_none()
+    return None if checkpoint is None else checkpoint.value
+
+
+def save_checkpoint(session, name, value):
+    checkpoint = session.query(CheckpointEntity).filter(CheckpointEntity.name == name).one_or_none()
+    if checkpoint is None:
+        checkpoint = CheckpointEntity(name)
+    checkpoint.value = value
+    checkpoint.updated_at = datetime.datetime.utcnow()
+    session.add(checkpoint)
+
+
+def remove_checkpoint(session, name):
+    session.query(CheckpointEntity).filter(CheckpointEntity.name == name).delete(synchronize_session=False)
@@ -1,9 +1,11 @@
 # THIS FILE IS PART OF phytolrr.com PROJECT.
 # Copyright 2019-2021 phytolrr.com. All rights reserved.
 
-from sqlalchemy import Column, Integer, String, Boolean, REAL
+from sqlalchemy import Column, Integer, String, Boolean, REAL, Index
 from sqlalchemy import delete
+from sqlalchemy.ext.declarative import declared_attr
 from dao.datasource import *
+import dao.tag_ref_entity as tag
 
 
 class MotifEntityBase(object):
@@ -17,6 +19,12 @@ class MotifEntityBase(object):
     manually_add = Column(Boolean, default=False)
     correct = Column(Boolean, default=True, index=True)
 
+    @declared_attr
+    def __table_args__(cls):
+        # the motifs are queried by the sequence, filtered by correct or ordered by offset
+        return (Index(str.format("ix_{}_seq_id_correct", cls.__tablename__), 'seq_id', 'correct'),
+                Index(str.format("ix_{}_seq_id_offset", cls.__tablename__), 'seq_id', 'offset'))
+
     def __init__(self, offset, seq_id, score, probability, fdr_probability, manually_add=False, correct=True):
         self.offset = offset
         self.seq_id = seq_id
@@ -106,6 +114,23 @@ def find_motifs_by_seq_ids(session, seq_ids, version, with_wrong=True):
     return seq_ids_to_motifs
 
 
+def find_seq_ids_having_motifs(session, seq_ids, version):
+    cls = get_entity(version)
+    seq_ids = session.query(cls.seq_id).distinct().filter(cls.seq_id.in_(seq_ids)).all()
+    return [seq_id for seq_id_tuple in seq_ids for seq_id in seq_id_tuple]
+
+
+def find_scanned_motifs_by_seq_ids(session, seq_ids, version):
+    '''The motifs found by the scan and not curated: neither added manually nor marked wrong'''
+    cls = get_entity(version)
+    motifs = session.query(cls).filter(cls.seq_id.in_(seq_ids)).filter(cls.correct)\
+        .filter(cls.manually_add.isnot(True)).filter(cls.false_discovery.isnot(True)).all()
+    seq_ids_to_motifs = dict([(seq_id, []) for seq_id in seq_ids])
+    for m in motifs:
+        seq_ids_to_motifs[m.seq_id].append(m)
+    return seq_ids_to_motifs
+
+
 def find_seq_ids_by_motif_ids(session, motif_ids, version):
     cls = get_entity(version)
     seq_ids = session.query(cls.seq_id).distinct().filter(cls.id.in_(motif_ids)).all()
@@ -135,30 +160,80 @@ def find_motifs_count_by_seq_id(session, seq_id, version):
     return session.query(cls.id).filter(cls.seq_id == seq_id).filter(cls.correct).count()
 
 
+# The max count of the parameters in a IN clause
+IN_CHUNK_SIZE = 500
+
+# The columns of a new motif, the defaults are used if not set on the input
+_MOTIF_COLUMN_DEFAULTS = {'false_discovery': False, 'manually_add': False, 'correct': True}
+_MOTIF_COLUMNS = ['offset', 'score', 'probability', 'fdr_probability', 'false_discovery', 'manually_add', 'correct']
+
+
+def _chunks(items, size=IN_CHUNK_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _motif_to_mapping(m, seq_id):
+    mapping = {'seq_id': seq_id}
+    for key in _MOTIF_COLUMNS:
+        value = getattr(m, key, None)
+        if value is None or type(value) == Column:
+            value = _MOTIF_COLUMN_DEFAULTS.get(key, None)
+        mapping[key] = value
+    return mapping
+
+
 def replace_motifs_by_seq(session, seq_id, motifs, version):
-    motifs = convert_to_entity(motifs, version)
-    old_motifs = find_motifs_by_seq_id(session, seq_id, version)
-    old_offsets_to_motif = dict([(m.offset, m) for m in old_motifs])
-    new_offsets_to_motif = dict([(m.offset, m) for m in motifs])
-    offsets_to_del = set(old_offsets_to_motif.keys()) - set(new_offsets_to_motif.keys())
-    ids_to_del = set([old_offsets_to_motif[offset].id for offset in offsets_to_del])
+    replace_motifs_by_seqs(session, {seq_id: motifs}, version)
+
+
+def replace_motifs_by_seqs(session, seq_ids_to_motifs, version):
+    '''
+    Replace the motifs of many sequences by bulk statements: the motifs are matched by offset,
+    the old motifs not matched are deleted with their tags, the matched ones updated and the others inserted.
+    The motifs added manually or marked wrong(false discovery or by the tags) are the decisions of the curators,
+    they are neither deleted nor updated, and the new motifs at their offsets are not inserted.
+    :param seq_ids_to_motifs: the new motifs(MotifEntityBase) by seq_id
+    '''
+    cls = get_entity(version)
+    old_keys_to_id = {}
+    kept_keys = set()
+    for seq_ids in _chunks(seq_ids_to_motifs.keys()):
+        query = session.query(cls.id, cls.seq_id, cls.offset, cls.manually_add, cls.false_discovery, cls.correct)\
+            .filter(cls.seq_id.in_(seq_ids))
+        for mid, seq_id, offset, manually_add, false_discovery, correct in query:
+            if manually_add or false_discovery or not correct:
+                kept_keys.add((seq_id, offset))
+            else:
+                old_keys_to_id[(seq_id, offset)] = mid
+
+    new_keys_to_motif = {}
+    for seq_id, motifs in seq_ids_to_motifs.items():
+        for m in motifs:
+            new_keys_to_motif[(seq_id, m.offset)] = m
+
+    ids_to_del = [mid for key, mid in old_keys_to_id.items() if key not in new_keys_to_motif]
+    motifs_to_insert = []
     motifs_to_update = []
-    for offset, new_motif in new_offsets_to_motif.items():
-        motif = old_offsets_to_motif.get(offset, None)
-        if motif is None:
-            motifs_to_update.append(new_motif)
+    for key, m in new_keys_to_motif.items():
+        if key in kept_keys:
+            continue
+        mid = old_keys_to_id.get(key, None)
+        if mid is None:
+            motifs_to_insert.append(_motif_to_mapping(m, key[0]))
         else:
-            motif.score = new_motif.score
-            motif.probability = new_motif.probability
-            motif.fdr_probability = new_motif.fdr_probability
-            motif.correct = new_motif.correct
-            motifs_to_update.append(motif)
-
-    if len(ids_to_del) > 0:
-        cls = get_entity(version)
-        session.execute(delete(cls).where(cls.id.in_(ids_to_del)))
+            mapping = _motif_to_mapping(m, key[0])
+            motifs_to_update.append({'id': mid, 'score': mapping['score'], 'probability': mapping['probability'],
+                                     'fdr_probability': mapping['fdr_probability']})
+
+    for ids in _chunks(ids_to_del):
+        tag.remove_by_target_ids(session, ids)
+        session.execute(delete(cls).where(cls.id.in_(ids)))
     if len(motifs_to_update) > 0:
-        session.add_all(motifs_to_update)
+        session.bulk_update_mappings(cls, motifs_to_update)
+    if len(motifs_to_insert) > 0:
+        session.bulk_insert_mappings(cls, motifs_to_insert)
 
 
 def find_motifs_by_ids(session, motif_ids, version):
@@ -1,7 +1,7 @@
 # THIS FILE IS PART OF phytolrr.com PROJECT.
 # Copyright 2019-2021 phytolrr.com. All rights reserved.
 
-from sqlalchemy import Column, String, Integer
+from sqlalchemy import Column, String, Integer, Index
 from sqlalchemy import delete
 from dao.datasource import *
 
@@ -12,6 +12,7 @@ T = 1
 
 class NSiteEntity(Base):
     __tablename__ = 'nsiteentity'
+    __table_args__ = (Index('ix_nsiteentity_seq_id_start_pos', 'seq_id', 'start_pos'), )
 
     id = Column(Integer, autoincrement=True, primary_key=True)
     seq_id = Column(String(length=256), index=True)
@@ -72,3 +73,40 @@ def replace_nsites_by_seq_id(session, seq_id, positions, ntypes):
     ids_to_del = set([old_poses_to_entity[pos].id for pos in poses_to_del])
     if len(ids_to_del) > 0:
         remove_nsites_by_ids(session, ids_to_del)
+
+
+def replace_nsites_by_seq_ids(session, seq_ids_to_nsites, chunk_size=500):
+    '''
+    Replace the nsites of many sequences by bulk statements, the nsites are matched by the start position
+    :param seq_ids_to_nsites: the (positions, ntypes) by seq_id
+    '''
+    seq_ids = list(seq_ids_to_nsites.keys())
+    old_keys_to_nsite = {}
+    for i in range(0, len(seq_ids), chunk_size):
+        for nid, seq_id, pos, ntype in session.query(NSiteEntity.id, NSiteEntity.seq_id, NSiteEntity.start_pos,
+                                                     NSiteEntity.ntype)\
+                .filter(NSiteEntity.seq_id.in_(seq_ids[i:i + chunk_size])):
+            old_keys_to_nsite[(seq_id, pos)] = (nid, ntype)
+
+    new_keys_to_ntype = {}
+    for seq_id, (positions, ntypes) in seq_ids_to_nsites.items():
+        assert len(positions) == len(ntypes)
+        for pos, ntype in zip(positions, ntypes):
+            new_keys_to_ntype[(seq_id, pos)] = ntype
+
+    ids_to_del = [nid for key, (nid, ntype) in old_keys_to_nsite.items() if key not in new_keys_to_ntype]
+    nsites_to_add = []
+    nsites_to_update = []
+    for (seq_id, pos), ntype in new_keys_to_ntype.items():
+        old_nsite = old_keys_to_nsite.get((seq_id, pos), None)
+        if old_nsite is None:
+            nsites_to_add.append({'seq_id': seq_id, 'start_pos': pos, 'ntype': ntype})
+        elif old_nsite[1] != ntype:
+            nsites_to_update.append({'id': old_nsite[0], 'ntype': ntype})
+
+    for i in range(0, len(ids_to_del), chunk_size):
+        remove_nsites_by_ids(session, ids_to_del[i:i + chunk_size])
+    if len(nsites_to_update) > 0:
+        session.bulk_update_mappings(NSiteEntity, nsites_to_update)
+    if len(nsites_to_add) > 0:
+        session.bulk_insert_mappings(NSiteEntity, nsites_to_add)
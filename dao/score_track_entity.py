@@ -0,0 +1,53 @@
+# THIS FILE IS PART OF phytolrr.com PROJECT.
+# Copyright 2019-2021 phytolrr.com. All rights reserved.
+
+'''The score tracks(tools.score_track) of the sequences, keyed by the sequence and the hash of the matrix'''
+
+from sqlalchemy import Column, Integer, String, LargeBinary, UniqueConstraint
+from sqlalchemy import delete, and_
+from dao.datasource import *
+
+
+class ScoreTrackEntity(Base):
+    __tablename__ = 'scoretrack'
+    __table_args__ = (UniqueConstraint('matrix_version', 'seq_id'), )
+
+    id = Column(Integer, autoincrement=True, primary_key=True)
+    seq_id = Column(String(length=256))
+    matrix_version = Column(String(length=64))
+    # MEDIUMBLOB on mysql, the track of a 35k residues sequence is about 140KB
+    track = Column(LargeBinary(length=2 ** 24 - 1))
+
+
+def table_exists(session):
+    '''The scoretrack table is only created by ot-create-tables.py or lrr-search.py --save-tracks'''
+    return session.get_bind().dialect.has_table(session.connection(), ScoreTrackEntity.__tablename__)
+
+
+def save_score_tracks(session, seq_ids_to_track, matrix_version, chunk_size=500):
+    seq_ids = list(seq_ids_to_track.keys())
+    for i in range(0, len(seq_ids), chunk_size):
+        session.execute(delete(ScoreTrackEntity).where(and_(ScoreTrackEntity.matrix_version == matrix_version,
+                                                            ScoreTrackEntity.seq_id.in_(seq_ids[i:i + chunk_size]))))
+    if len(seq_ids) > 0:
+        session.bulk_insert_mappings(ScoreTrackEntity, [
+            {'seq_id': seq_id, 'matrix_version': matrix_version, 'track': track}
+            for seq_id, track in seq_ids_to_track.items()])
+
+
+def find_score_tracks(session, seq_ids, matrix_version):
+    '''
+    :return: the tracks by seq_id, the sequences without track are not included
+    '''
+    return dict(session.query(ScoreTrackEntity.seq_id, ScoreTrackEntity.track)
+                .filter(ScoreTrackEntity.matrix_version == matrix_version)
+                .filter(ScoreTrackEntity.seq_id.in_(seq_ids)).all())
+
+
+def find_score_tracks_after(session, matrix_version, after, limit):
+    '''The (seq_id, track) of the matrix ordered by seq_id, from the first if after is None'''
+    query = session.query(ScoreTrackEntity.seq_id, ScoreTrackEntity.track)\
+        .filter(ScoreTrackEntity.matrix_version == matrix_version)
+    if after is not None:
+        query = query.filter(ScoreTrackEntity.seq_id > after)
+    return query.order_by(ScoreTrackEntity.seq_id).limit(limit).all()
@@ -0,0 +1,74 @@
+# THIS FILE IS PART OF phytolrr.com PROJECT.
+# Copyright 2019-2021 phytolrr.com. All rights reserved.
+
+'''
+An inverted index of the lower case trigrams of the sequence IDs, so the IDs can be searched by substring with
+the index of gram instead of scanning the sequence table by LIKE '%keyword%'.
+The grams at the end of an ID are shorter (e.g. "at1g" has "at1", "t1g", "1g" and "g"), so every substring
+no longer than GRAM_LENGTH is the prefix of a gram.
+'''
+
+from sqlalchemy import Column, Integer, String, Index
+from sqlalchemy import select, func, and_
+from dao.datasource import *
+
+GRAM_LENGTH = 3
+
+
+class SeqIdGramEntity(Base):
+    __tablename__ = 'seqidgram'
+    __table_args__ = (Index('ix_seqidgram_gram_seq_id', 'gram', 'seq_id'), )
+
+    id = Column(Integer, autoincrement=True, primary_key=True)
+    gram = Column(String(length=GRAM_LENGTH))
+    seq_id = Column(String(length=256), index=True)
+
+    def __init__(self, gram, seq_id):
+        self.gram = gram
+        self.seq_id = seq_id
+
+
+def make_grams(text):
+    text = text.lower()
+    return set([text[i:i + GRAM_LENGTH] for i in range(0, len(text))])
+
+
+def add_grams(session, seq_ids):
+    session.bulk_insert_mappings(SeqIdGramEntity, [{'gram': gram, 'seq_id': seq_id}
+                                                  for seq_id in seq_ids for gram in make_grams(seq_id)])
+
+
+def grams_built(session):
+    '''
+    Whether the grams are built: the table is created and filled by ot-rebuild-seq-id-grams.py on an existing
+    database, and kept by add_seq and add_seqs after that
+    '''
+    if not session.get_bind().dialect.has_table(session.connection(), SeqIdGramEntity.__tablename__):
+        return False
+    # the first entry of the index, instead of scanning the table
+    return session.query(SeqIdGramEntity.gram).order_by(SeqIdGramEntity.gram).limit(1).scalar() is not None
+
+
+def _next_prefix(prefix):
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def select_seq_ids_by_keyword(keyword):
+    '''
+    The select of the IDs containing the keyword, case insensitive
+    :return: the select of seq_id, None if the keyword is empty
+    '''
+    keyword = keyword.lower()
+    if len(keyword) == 0:
+        return None
+    if len(keyword) <= GRAM_LENGTH:
+        # the grams starting with the keyword, a range of the index
+        return select([SeqIdGramEntity.seq_id]).distinct()\
+            .where(and_(SeqIdGramEntity.gram >= keyword, SeqIdGramEntity.gram < _next_prefix(keyword)))
+
+    # the IDs having all the grams of the keyword, they are the candidates to be checked by LIKE
+    grams = set([keyword[i:i + GRAM_LENGTH] for i in range(0, len(keyword) - GRAM_LENGTH + 1)])
+    return select([SeqIdGramEntity.seq_id])\
+        .where(SeqIdGramEntity.gram.in_(grams))\
+        .group_by(SeqIdGramEntity.seq_id)\
+        .having(func.count(func.distinct(SeqIdGramEntity.gram)) == len(grams))
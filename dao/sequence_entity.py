@@ -2,7 +2,7 @@
 # Copyright 2019-2021 phytolrr.com. All rights reserved.
 
 from sqlalchemy import Column, Integer, String, Text, Boolean
-from sqlalchemy import update
+from sqlalchemy import update, func
 from dao.datasource import *
 
 
@@ -71,10 +71,25 @@ def find_all_seqs(session):
     return session.query(SequenceEntity).all()
 
 
+def count_seqs(session):
+    return session.query(func.count(SequenceEntity.id)).scalar()
+
+
 def find_all_seq_ids(session):
     return [ret[0] for ret in session.query(SequenceEntity.seq_id).all()]
 
 
+def find_seq_strs_after(session, after, limit):
+    '''
+    The (seq_id, seq) of the sequences ordered by seq_id, seek by the index of seq_id
+    :param after: the seq_id the sequences start after, from the first if None
+    '''
+    query = session.query(SequenceEntity.seq_id, SequenceEntity.seq)
+    if after is not None:
+        query = query.filter(SequenceEntity.seq_id > after)
+    return query.order_by(SequenceEntity.seq_id).limit(limit).all()
+
+
 def find_seqs_by_baseline(session):
     return session.query(SequenceEntity).filter(SequenceEntity.baseline).all()
 
@@ -0,0 +1,117 @@
+# THIS FILE IS PART OF phytolrr.com PROJECT.
+# Copyright 2019-2021 phytolrr.com. All rights reserved.
+
+'''
+The statistics of the correct motifs and the nsites of a sequence per motif version, refreshed in the same
+transaction as the motifs, so the sequences can be filtered by the indexed columns instead of grouping the motifs.
+'''
+
+from sqlalchemy import Column, Integer, String, Index, UniqueConstraint
+from sqlalchemy import update, func
+from dao.datasource import *
+import dao.motif_entity as motif
+import dao.nsite_entity as nsite
+
+MOTIF_LENGTH = 16
+
+
+class SequenceStatsEntity(Base):
+    __tablename__ = 'sequencestats'
+    __table_args__ = (
+        UniqueConstraint('seq_id', 'version'),
+        Index('ix_sequencestats_version_lrr_count', 'version', 'lrr_count'),
+        Index('ix_sequencestats_version_min_offset', 'version', 'min_offset'),
+        Index('ix_sequencestats_version_max_offset', 'version', 'max_offset'),
+    )
+
+    id = Column(Integer, autoincrement=True, primary_key=True)
+    seq_id = Column(String(length=256))
+    version = Column(Integer)
+    lrr_count = Column(Integer, default=0)
+    min_offset = Column(Integer, nullable=True)
+    max_offset = Column(Integer, nullable=True)
+    nsite_count = Column(Integer, default=0)
+    covered_residues = Column(Integer, default=0)
+
+    def __init__(self, seq_id, version):
+        self.seq_id = seq_id
+        self.version = version
+
+    def __repr__(self):
+        return str.format("<{}: {{seq_id={}, version={}, lrr_count={}}}>",
+                          SequenceStatsEntity.__name__, self.seq_id, self.version, self.lrr_count)
+
+
+def stats_built(session, version):
+    '''
+    Whether the statistics of the version are built: the table is created and filled by
+    ot-rebuild-sequence-stats.py on an existing database, and refreshed with the motifs after that
+    '''
+    if not session.get_bind().dialect.has_table(session.connection(), SequenceStatsEntity.__tablename__):
+        return False
+    return session.query(SequenceStatsEntity.id)\
+        .filter(SequenceStatsEntity.version == int(version)).limit(1).scalar() is not None
+
+
+def calc_covered_residues(offsets, length=MOTIF_LENGTH):
+    '''The count of the residues covered by the motifs, the overlapped residues are counted once'''
+    covered = 0
+    end = None
+    for offset in sorted(offsets):
+        if end is None or offset >= end:
+            covered += length
+        else:
+            covered += offset + length - end
+        end = offset + length
+    return covered
+
+
+def refresh_stats(session, seq_ids, version):
+    '''Recalculate the statistics of the sequences from the motifs and the nsites in the session'''
+    seq_ids = set(seq_ids)
+    if len(seq_ids) == 0:
+        return
+    cls = motif.get_entity(version)
+    seq_ids_to_offsets = dict([(seq_id, []) for seq_id in seq_ids])
+    for seq_id, offset in session.query(cls.seq_id, cls.offset).filter(cls.seq_id.in_(seq_ids)).filter(cls.correct):
+        seq_ids_to_offsets[seq_id].append(offset)
+    seq_ids_to_nsite_count = dict(session.query(nsite.NSiteEntity.seq_id, func.count(nsite.NSiteEntity.id))
+                                  .filter(nsite.NSiteEntity.seq_id.in_(seq_ids))
+                                  .group_by(nsite.NSiteEntity.seq_id).all())
+    seq_ids_to_stats = dict([(stats.seq_id, stats) for stats in find_stats_by_seq_ids(session, seq_ids, version)])
+
+    for seq_id, offsets in seq_ids_to_offsets.items():
+        stats = seq_ids_to_stats.get(seq_id, None)
+        if stats is None:
+            stats = SequenceStatsEntity(seq_id, int(version))
+            session.add(stats)
+        stats.lrr_count = len(offsets)
+        stats.min_offset = min(offsets) if len(offsets) > 0 else None
+        stats.max_offset = max(offsets) if len(offsets) > 0 else None
+        stats.nsite_count = seq_ids_to_nsite_count.get(seq_id, 0)
+        stats.covered_residues = calc_covered_residues(offsets)
+
+
+def update_nsite_count(session, seq_id):
+    '''The nsites are shared by all the versions'''
+    count = nsite.find_nsites_count_by_seq_id(session, seq_id)
+    stmt = update(SequenceStatsEntity).where(SequenceStatsEntity.seq_id == seq_id).values(nsite_count=count)
+    session.execute(stmt)
+
+
+def update_nsite_counts(session, seq_ids):
+    '''The nsite counts of many sequences, of all the versions'''
+    seq_ids_to_nsite_count = dict(session.query(nsite.NSiteEntity.seq_id, func.count(nsite.NSiteEntity.id))
+                                  .filter(nsite.NSiteEntity.seq_id.in_(seq_ids))
+                                  .group_by(nsite.NSiteEntity.seq_id).all())
+    mappings = [{'id': sid, 'nsite_count': seq_ids_to_nsite_count.get(seq_id, 0)}
+                for sid, seq_id in session.query(SequenceStatsEntity.id, SequenceStatsEntity.seq_id)
+                .filter(SequenceStatsEntity.seq_id.in_(seq_ids))]
+    if len(mappings) > 0:
+        session.bulk_update_mappings(SequenceStatsEntity, mappings)
+
+
+def find_stats_by_seq_ids(session, seq_ids, version):
+    return session.query(SequenceStatsEntity)\
+        .filter(SequenceStatsEntity.seq_id.in_(seq_ids))\
+        .filter(SequenceStatsEntity.version == int(version)).all()
@@ -1,7 +1,7 @@
 # THIS FILE IS PART OF phytolrr.com PROJECT.
 # Copyright 2019-2021 phytolrr.com. All rights reserved.
 
-from sqlalchemy import Column, String, Integer
+from sqlalchemy import Column, String, Integer, Index
 from sqlalchemy import delete
 from dao.datasource import *
 
@@ -13,6 +13,7 @@ WRONG_MOTIF_TAGS = {OVERLAP_TAG}
 
 class TagRefEntity(Base):
     __tablename__ = "tagrefentity"
+    __table_args__ = (Index('ix_tagrefentity_target_id_tag_name', 'target_id', 'tag_name'), )
 
     id = Column(Integer, autoincrement=True, primary_key=True)
     tag_name = Column(String(256), index=True)
@@ -55,10 +56,19 @@ def add_tags_by_map(session, target_ids_to_tags):
 
 
 def remove_by_tag_ids(session, ids):
+    if len(ids) == 0:
+        return
     stmt = delete(TagRefEntity).where(TagRefEntity.id.in_(ids))
     session.execute(stmt)
 
 
+def remove_by_target_ids(session, target_ids):
+    if len(target_ids) == 0:
+        return
+    stmt = delete(TagRefEntity).where(TagRefEntity.target_id.in_(target_ids))
+    session.execute(stmt)
+
+
 def find_tag_names_by_motif_ids(session, motif_ids):
     mids_to_tags = find_tags_by_motif_ids(session, motif_ids)
     mids_to_tag_names = {}
@@ -0,0 +1,43 @@
+'''
+Benchmark the kernels summing the PSSM scores(see tools.motifs.KERNELS) on the matrix of the baseline motifs,
+the kernel "auto" of lrr-search.py and ingest-proteome.py picks the faster one the same way.
+'''
+import argparse
+import logging
+import dao
+from tools import matrix_store
+from tools import motifs as motif_tools
+
+BASELINE_MOTIF_VERSION = 1
+
+
+class Config(object):
+    def __init__(self):
+        parser = argparse.ArgumentParser()
+        parser.add_argument('-l', '--seq-length', type=int, default=motif_tools.BENCHMARK_SEQ_LENGTH * 10,
+                            help='The length of the random sequence scanned')
+        parser.add_argument('-r', '--repeat', type=int, default=5, help='The times each kernel is run')
+        parser.add_argument('-m', '--motif-length', type=int, default=16, help='The length of the motifs')
+        self._parser = parser
+
+    def parse(self):
+        cfg = self._parser.parse_args()
+        if cfg.seq_length < cfg.motif_length or cfg.repeat <= 0:
+            print("The sequence must be longer than the motif and the repeat must be greater than 0")
+            exit(1)
+        return cfg
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    cfg = Config().parse()
+    motif_strs = dao.find_baseline_motifs(BASELINE_MOTIF_VERSION, with_wrong=False, length=cfg.motif_length)
+    matrix = matrix_store.get_matrix(motif_strs)
+    alphabet, table = motif_tools.build_score_table(matrix)
+    kernels_to_seconds = motif_tools.benchmark_kernels(table, cfg.seq_length, cfg.repeat)
+    for kernel, seconds in sorted(kernels_to_seconds.items(), key=lambda item: item[1]):
+        print(str.format("{}\t{:.4f}s\t{:.1f}M residues/s", kernel, seconds, cfg.seq_length / seconds / 1e6))
+
+
+if __name__ == '__main__':
+    main()
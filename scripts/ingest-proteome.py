@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*
+'''
+本脚本将一个物种的蛋白质组fasta文件导入数据库：流式读取序列，校验氨基酸，在进程内分批计算N糖位点和LRR，
+并按批次批量写入序列、motif和N糖位点，每批一个事务。已存在的序列会被跳过，中断后可以直接重新运行。
+LRR使用基线序列的motif生成的矩阵计算。
+'''
+import argparse
+import logging
+import os
+import dao
+from tools import fasta
+from tools import matrix_store
+from tools import nsites as nsite_tools
+from tools import motifs as motif_tools
+
+MOTIF_VERSION = 3
+BASELINE_MOTIF_VERSION = 1
+
+
+class Config(object):
+    def __init__(self):
+        parser = argparse.ArgumentParser()
+        parser.add_argument('-f', '--fasta-file', required=True, help='The fasta file of the proteome')
+        parser.add_argument('-s', '--species', required=True, help='The species of the sequences')
+        parser.add_argument('-b', '--batch-size', type=int, default=500,
+                            help='The count of the sequences searched and committed together')
+        parser.add_argument('-v', '--version', type=int, default=MOTIF_VERSION, help='The version of the motifs')
+        parser.add_argument('-k', '--kernel', choices=motif_tools.KERNELS, default=motif_tools.KERNEL_AUTO,
+                            help='The kernel summing the PSSM scores, see benchmark-pssm-kernels.py, '
+                                 'only gather gives the scores bit-identical to calc_pssm_score')
+        self._parser = parser
+
+    def parse(self):
+        cfg = self._parser.parse_args()
+        if not os.path.isfile(cfg.fasta_file):
+            print(str.format("The fasta file {} does not exists", cfg.fasta_file))
+            exit(1)
+        if cfg.batch_size <= 0:
+            print("The batch size must be greater than 0")
+            exit(1)
+        return cfg
+
+
+def _read_valid_seqs(fasta_file):
+    with open(fasta_file, 'r') as f:
+        for seq in fasta.read_seqs(f):
+            invalid_aminos = fasta.find_invalid_aminos(seq.seq)
+            if len(invalid_aminos) > 0:
+                logging.error(str.format("The sequence {} contains invalid amino {}, skip it",
+                                         seq.seq_id, invalid_aminos))
+                continue
+            yield seq
+
+
+def _batches(seqs, batch_size):
+    batch = []
+    for seq in seqs:
+        batch.append(seq)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
+
+
+def build_records(matrix, seqs, species):
+    result = motif_tools.lrr_search_batch(matrix, [seq.seq for seq in seqs])
+    records = []
+    for i, seq in enumerate(seqs):
+        motifs = motif_tools.found_no_overlapped_motifs(result.to_motifs(i, seq.seq_id))
+        positions, ntypes = nsite_tools.search_nsites(seq.seq)
+        records.append(dao.SequenceRecord(seq.seq_id, seq.seq, species, motifs, positions, ntypes))
+    return records
+
+
+def ingest(cfg):
+    motif_tools.set_kernel(cfg.kernel)
+    motif_strs = dao.find_baseline_motifs(BASELINE_MOTIF_VERSION, with_wrong=False)
+    matrix = matrix_store.get_matrix(motif_strs)
+    logging.info(str.format("Matrix {} generated from {} baseline motifs", matrix.version, len(motif_strs)))
+
+    seq_count = 0
+    added_count = 0
+    for seqs in _batches(_read_valid_seqs(cfg.fasta_file), cfg.batch_size):
+        records = build_records(matrix, seqs, cfg.species)
+        added_count += len(dao.add_seqs(records, cfg.version))
+        seq_count += len(seqs)
+        logging.info(str.format("{} sequences read, {} added", seq_count, added_count))
+    logging.info(str.format("All done, {} sequences read, {} added", seq_count, added_count))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s:Process %(process)d:%(levelname)s:%(message)s')
+    ingest(Config().parse())
@@ -1,115 +1,160 @@
+'''
+Re-scan the LRR motifs of all the sequences by the matrix of the baseline motifs.
+The sequences are read in chunks ordered by ID, searched by the worker processes, and the motifs of a chunk are
+written with the checkpoint in one transaction, so the job resumes from the last written chunk if interrupted.
+The checkpoint is per motif version and matrix, a new baseline starts a new scan.
+The sequences already having motifs of the version are skipped unless --overwrite, and even then the motifs added
+manually or marked wrong by the curators are kept.
+'''
 import logging
 import argparse
-import os
+import collections
 from multiprocessing import Pool
 import dao
-from tools import motifs as motif_tool, pssm_matrix
+from tools import fasta
+from tools import motifs as motif_tool, matrix_store, score_track
 
 MOTIF_VERSION = 3
 BASELINE_MOTIF_VERSION = 1
-VALID_AMINO = {'A', 'R', 'N', 'D', 'C', 'E', 'Q', 'G', 'H', 'V', 'I', 'L', 'K', 'M', 'F', 'P', 'S', 'T', 'W', 'Y'}
 
 
 class Config(object):
     def __init__(self):
         parser = argparse.ArgumentParser()
-        parser.add_argument('-f', '--sequences-file', required=True, help='The sequences file')
-        parser.add_argument('-t', '--training-lrr-file', required=True)
+        parser.add_argument('-w', '--workers', type=int, default=12, help='The count of the worker processes')
+        parser.add_argument('-c', '--chunk-size', type=int, default=200,
+                            help='The count of the sequences searched by a task and written in one transaction')
+        parser.add_argument('-v', '--version', type=int, default=MOTIF_VERSION, help='The version of the motifs')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint, scan from the beginning')
+        parser.add_argument('--overwrite', action='store_true',
+                            help='Re-scan the sequences already having motifs and replace their scanned motifs, '
+                                 'the motifs added manually or marked wrong are kept')
+        parser.add_argument('-k', '--kernel', choices=motif_tool.KERNELS, default=motif_tool.KERNEL_AUTO,
+                            help='The kernel summing the PSSM scores, see benchmark-pssm-kernels.py, '
+                                 'only gather gives the scores bit-identical to calc_pssm_score')
+        parser.add_argument('--exact-pvalues', action='store_true',
+                            help='The probabilities are the exact p-values of the matrix rather than 2^-score')
+        parser.add_argument('--save-tracks', action='store_true',
+                            help='Save the scores of all the windows of the scanned sequences, '
+                                 'see ot-rethreshold-lrr.py')
         self._parser = parser
 
     def parse(self):
         cfg = self._parser.parse_args()
-        if not os.path.isfile(cfg.sequences_file):
-            print(str.format("The sequence file {} does not exists", cfg.sequences_file))
-            exit(1)
-        if not os.path.isfile(cfg.training_lrr_file):
-            print(str.format("The file {} does not exists", cfg.training_lrr_file))
+        if cfg.workers <= 0 or cfg.chunk_size <= 0:
+            print("The workers and the chunk size must be greater than 0")
             exit(1)
         return cfg
 
 
-class CalculateTask(object):
-    def __init__(self, matrix, seq):
-        self.matrix = matrix
-        self.seq = seq
-
-
-def _print_debug(motifs, seq):
-    if logging.root.level > logging.DEBUG:
-        return
-    offsets = [m.offset for m in motifs]
-    offsets.sort()
-
-    seq_str = str(seq.seq)
-    for motif in motifs:
-        offset = motif.offset
-        logging.debug(str.format("Offset {}, score {} LRR {}", offset, motif.score, seq_str[offset:offset+16]))
-
-
-def find_lrr_and_save_db(matrix, seq):
-    seq_ids_to_motifs = dao.find_motifs_by_seq_ids([seq.seq_id,], MOTIF_VERSION)
-    if len(seq_ids_to_motifs.get(seq.seq_id, [])) > 0:
-        logging.warning(str.format("The sequence {} is already analysied before, skip it", seq.seq_id))
-        return
-
-    seq_str = str(seq.seq)
-
-    invalid_amino = set(seq_str) - VALID_AMINO
-    if len(invalid_amino) > 0:
-        logging.error(str.format("The sequence {} contains invalid amino {}", seq.seq_id, invalid_amino))
-        return
+_matrix = None
+_pvalue_table = None
 
-    logging.info(str.format("Begin to find lrr in seq {}, {}", seq.seq_id, seq_str))
-    motifs = motif_tool.lrr_search(matrix, str(seq.seq))
-    motifs = motif_tool.found_no_overlapped_motifs(motifs)
-    for m in motifs:
-        m.seq_id = seq.seq_id
-        m.correct = True
 
-    logging.info(str.format("Found {} LRR motifs in sequence {}", len(motifs), seq.seq_id))
-    _print_debug(motifs, seq)
-
-    # Write to db
-    motif_entities = [dao.motif_entity.MotifEntityBase(**m.__dict__) for m in motifs]
-    logging.debug("Begin to write to db")
-    with dao.session_scope() as session:
-        dao.motif.replace_motifs_by_seq(session, seq.seq_id, motif_entities, MOTIF_VERSION)
-
-
-def find_lrr_and_save_db_task(task):
-    logging.basicConfig(level=logging.DEBUG,
+def _init_worker(matrix, kernel, exact_pvalues):
+    global _matrix, _pvalue_table
+    _matrix = matrix
+    _pvalue_table = matrix.pvalue_table if exact_pvalues else None
+    motif_tool.set_kernel(kernel)
+    logging.basicConfig(level=logging.INFO,
                         format='%(asctime)s:Process %(process)d:%(levelname)s:%(message)s')
-    dao.reconnect()
-    logging.debug(str.format("Begin to run task for seq {}", task.seq.seq_id))
-    find_lrr_and_save_db(task.matrix, task.seq)
-
-
-def main():
-    # generate the matrix
-    seqs = dao.find_baseline_seqs()
-    seq_ids_to_seq_str = dict([(seq.seq_id, seq.seq) for seq in seqs])
-    logging.info(str.format("Baseline sequence ids count({}): {}", len(seq_ids_to_seq_str), seq_ids_to_seq_str.keys()))
-
-    seq_ids_to_motifs = dao.find_motifs_by_seq_ids(seq_ids_to_seq_str.keys(), BASELINE_MOTIF_VERSION, with_wrong=False)
-    motif_strs = [seq_ids_to_seq_str[m.seq_id][m.offset:m.offset+16] for motifs in seq_ids_to_motifs.values() for m in motifs]
-    logging.info(str.format("Baseline LRR motifs( count {}): {}", len(motif_strs), motif_strs))
-
-    matrix = pssm_matrix.calc_pssm_matrix(motif_strs)
-    logging.info(str.format("Matrix: {}", matrix))
-    logging.info(str.format("PSSM: {}", matrix.pssm))
-
-    # find the lrr
-    with dao.query_session() as session:
-        all_seqs = dao.sequence.find_all_seqs(session)
 
-    tasks = [CalculateTask(matrix, seq) for seq in all_seqs]
 
-    with Pool(12) as pool:
-        pool.map(find_lrr_and_save_db_task, tasks)
-    logging.info("All tasks done")
+def search_chunk(seq_strs, save_tracks=False):
+    '''
+    Search the LRR motifs of the (seq_id, seq) by the matrix of the worker
+    :return: the seq_ids of the chunk, the motifs of the valid sequences by seq_id,
+    and their score tracks by seq_id if save_tracks(else None)
+    '''
+    valid_seq_strs = []
+    for seq_id, seq_str in seq_strs:
+        invalid_amino = fasta.find_invalid_aminos(seq_str)
+        if len(invalid_amino) > 0:
+            logging.error(str.format("The sequence {} contains invalid amino {}", seq_id, invalid_amino))
+            continue
+        valid_seq_strs.append((seq_id, seq_str))
+
+    result = motif_tool.lrr_search_batch(_matrix, [seq_str for seq_id, seq_str in valid_seq_strs], save_tracks,
+                                         _pvalue_table)
+    seq_ids_to_motifs = {}
+    seq_ids_to_track = None
+    if save_tracks:
+        seq_ids_to_track = dict([(seq_id, score_track.scores_to_track(scores))
+                                 for (seq_id, seq_str), scores in zip(valid_seq_strs, result.window_scores)])
+    for i, (seq_id, seq_str) in enumerate(valid_seq_strs):
+        motifs = motif_tool.found_no_overlapped_motifs(result.to_motifs(i, seq_id))
+        seq_ids_to_motifs[seq_id] = [dao.motif.MotifEntityBase(m.offset, seq_id, m.score, m.probability,
+                                                               m.fdr_probability) for m in motifs]
+    logging.debug(str.format("Found {} LRR motifs in {} sequences",
+                             sum([len(motifs) for motifs in seq_ids_to_motifs.values()]), len(seq_strs)))
+    return [seq_id for seq_id, seq_str in seq_strs], seq_ids_to_motifs, seq_ids_to_track
+
+
+def read_chunks(after, chunk_size):
+    while True:
+        seq_strs = dao.find_seq_strs_after(after, chunk_size)
+        if len(seq_strs) == 0:
+            return
+        yield [(seq_id, seq_str) for seq_id, seq_str in seq_strs]
+        after = seq_strs[-1][0]
+
+
+def skip_analysed_seqs(seq_strs, version):
+    '''The (seq_id, seq) of the sequences without motifs of the version'''
+    analysed_seq_ids = set(dao.find_seq_ids_having_motifs([seq_id for seq_id, seq_str in seq_strs], version))
+    for seq_id in sorted(analysed_seq_ids):
+        logging.debug(str.format("The sequence {} is already analysed before, skip it", seq_id))
+    return [(seq_id, seq_str) for seq_id, seq_str in seq_strs if seq_id not in analysed_seq_ids]
+
+
+def get_baseline_matrix(with_pvalue_table=False):
+    motif_strs = dao.find_baseline_motifs(BASELINE_MOTIF_VERSION, with_wrong=False)
+    logging.info(str.format("Baseline LRR motifs count {}", len(motif_strs)))
+    return matrix_store.get_matrix(motif_strs, with_pvalue_table=with_pvalue_table)
+
+
+def scan(cfg):
+    dao.checkpoint.CheckpointEntity.__table__.create(dao.engine, checkfirst=True)
+    if cfg.save_tracks:
+        dao.score_track.ScoreTrackEntity.__table__.create(dao.engine, checkfirst=True)
+    matrix = get_baseline_matrix(cfg.exact_pvalues)
+    checkpoint_name = str.format("lrr-search:v{}:{}", cfg.version, matrix.version)
+    if cfg.exact_pvalues:
+        checkpoint_name += ':exact'
+    if cfg.overwrite:
+        checkpoint_name += ':overwrite'
+    if cfg.restart:
+        dao.remove_checkpoint(checkpoint_name)
+    after = dao.find_checkpoint(checkpoint_name)
+    logging.info(str.format("Scan by matrix {}, start after {}", matrix.version, after))
+
+    seq_count = 0
+    skipped_count = 0
+    with Pool(cfg.workers, initializer=_init_worker, initargs=(matrix, cfg.kernel, cfg.exact_pvalues)) as pool:
+        # keep a few chunks in flight, the chunks are written in order so the checkpoint only moves forward
+        pending = collections.deque()
+        chunks = read_chunks(after, cfg.chunk_size)
+        while True:
+            while len(pending) < cfg.workers * 2:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                seq_strs = chunk if cfg.overwrite else skip_analysed_seqs(chunk, cfg.version)
+                skipped_count += len(chunk) - len(seq_strs)
+                pending.append((chunk[-1][0], len(chunk),
+                                pool.apply_async(search_chunk, (seq_strs, cfg.save_tracks))))
+            if len(pending) == 0:
+                break
+            last_seq_id, chunk_size, result = pending.popleft()
+            _, seq_ids_to_motifs, seq_ids_to_track = result.get()
+            dao.replace_motifs_by_seqs(seq_ids_to_motifs, cfg.version, checkpoint_name, last_seq_id,
+                                       seq_ids_to_track, matrix.version)
+            seq_count += chunk_size
+            logging.info(str.format("{} sequences scanned, last {}", seq_count, last_seq_id))
+    logging.info(str.format("All done, {} sequences scanned, {} already analysed skipped", seq_count, skipped_count))
 
 
 if __name__ == '__main__':
-    logging.basicConfig(level=logging.DEBUG,
+    logging.basicConfig(level=logging.INFO,
                         format='%(asctime)s:Process %(process)d:%(levelname)s:%(message)s')
-    main()
+    scan(Config().parse())
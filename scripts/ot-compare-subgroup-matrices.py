@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*
+'''
+本脚本用各亚组序列的LRR分别生成PSSM矩阵，一次扫描数据库中的所有序列，比较各亚组矩阵找到的LRR。
+以制表符分隔输出每条序列的亚组、各亚组矩阵找到的LRR数量，以及在这些LRR中得分最高次数最多的亚组矩阵。
+'''
+import argparse
+import collections
+import logging
+import dao
+from tools import fasta
+from tools import matrix_store
+from tools import motifs as motif_tools
+
+MOTIF_VERSION = 3
+SUBGROUPS = ['3', '7-1', '7-2', '10', '11', '12', '15']
+
+
+class Config(object):
+    def __init__(self):
+        parser = argparse.ArgumentParser()
+        parser.add_argument('-s', '--subgroups', nargs='*', default=SUBGROUPS, help='The subgroups to compare')
+        parser.add_argument('-c', '--chunk-size', type=int, default=500,
+                            help='The count of the sequences scanned together')
+        parser.add_argument('-v', '--version', type=int, default=MOTIF_VERSION, help='The version of the motifs')
+        self._parser = parser
+
+    def parse(self):
+        cfg = self._parser.parse_args()
+        if len(cfg.subgroups) == 0 or cfg.chunk_size <= 0:
+            print("The subgroups must not be empty and the chunk size must be greater than 0")
+            exit(1)
+        return cfg
+
+
+def get_subgroup_matrices(subgroups_to_seqs, subgroups, version):
+    '''
+    The matrix generated from the correct motifs of the sequences of each subgroup
+    :return: the subgroups with motifs, and their matrices, the subgroups without motif are skipped
+    '''
+    matrix_subgroups = []
+    matrices = []
+    for subgroup in subgroups:
+        seqs = subgroups_to_seqs[subgroup]
+        seq_ids_to_seq_str = dict([(seq.seq_id, seq.seq) for seq in seqs])
+        seq_ids_to_motifs = dao.find_motifs_by_seq_ids(seq_ids_to_seq_str.keys(), version, with_wrong=False)
+        motif_strs = [seq_ids_to_seq_str[m.seq_id][m.offset:m.offset + 16]
+                      for motifs in seq_ids_to_motifs.values() for m in motifs]
+        motif_strs = [motif_str for motif_str in motif_strs if len(motif_str) == 16]
+        if len(motif_strs) == 0:
+            logging.warning(str.format("Subgroup {}: {} sequences, no motif, skip it", subgroup, len(seqs)))
+            continue
+        logging.info(str.format("Subgroup {}: {} sequences, {} motifs", subgroup, len(seqs), len(motif_strs)))
+        matrix_subgroups.append(subgroup)
+        matrices.append(matrix_store.get_matrix(motif_strs))
+    return matrix_subgroups, matrices
+
+
+def compare_chunk(matrices, seq_strs):
+    '''
+    :return: (seq_id, hits count of each matrix, the index of the best matrix of the most hits, None if no hit)
+    '''
+    result = motif_tools.lrr_search_batch_by_matrices(matrices, [seq_str for seq_id, seq_str in seq_strs])
+    seq_indexes_to_offsets = collections.defaultdict(set)
+    counts = [[0] * len(matrices) for seq_str in seq_strs]
+    for matrix_index, matrix_result in enumerate(result.results):
+        for i in range(0, len(seq_strs)):
+            motifs = motif_tools.found_no_overlapped_motifs(matrix_result.to_motifs(i))
+            counts[i][matrix_index] = len(motifs)
+            seq_indexes_to_offsets[i].update([m.offset for m in motifs])
+
+    rows = []
+    for i, (seq_id, seq_str) in enumerate(seq_strs):
+        best = result.best_matrix_indexes[i]
+        votes = collections.Counter([int(best[offset]) for offset in seq_indexes_to_offsets[i]])
+        best_index = votes.most_common(1)[0][0] if len(votes) > 0 else None
+        rows.append((seq_id, counts[i], best_index))
+    return rows
+
+
+def compare_all_seqs(cfg):
+    subgroups_to_seqs = collections.defaultdict(list)
+    for seq in dao.find_seqs_by_subgroups(cfg.subgroups):
+        subgroups_to_seqs[seq.subgroup].append(seq)
+    seq_ids_to_subgroup = dict([(seq.seq_id, seq.subgroup) for seqs in subgroups_to_seqs.values() for seq in seqs])
+    subgroups, matrices = get_subgroup_matrices(subgroups_to_seqs, cfg.subgroups, cfg.version)
+    if len(matrices) == 0:
+        logging.error("No subgroup has motifs, nothing to compare")
+        return
+    skipped = [subgroup for subgroup in cfg.subgroups if subgroup not in subgroups]
+    if len(skipped) > 0:
+        logging.warning(str.format("Subgroups skipped for no motif: {}", ', '.join(skipped)))
+    print('\t'.join(['seq_id', 'subgroup'] + subgroups + ['best']))
+    seq_count = 0
+    after = None
+    while True:
+        seq_strs = dao.find_seq_strs_after(after, cfg.chunk_size)
+        if len(seq_strs) == 0:
+            break
+        after = seq_strs[-1][0]
+        seq_count += len(seq_strs)
+        seq_strs = [(seq_id, seq_str) for seq_id, seq_str in seq_strs
+                    if len(fasta.find_invalid_aminos(seq_str)) == 0]
+        for seq_id, counts, best_index in compare_chunk(matrices, seq_strs):
+            best = subgroups[best_index] if best_index is not None else ''
+            print('\t'.join([seq_id, seq_ids_to_subgroup.get(seq_id, '')] + [str(c) for c in counts] + [best]))
+        logging.info(str.format("{} sequences compared", seq_count))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    compare_all_seqs(Config().parse())
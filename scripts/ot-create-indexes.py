@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*
+'''本脚本为数据库中已存在的表创建实体中定义、但数据库中尚不存在的索引（如motif表的组合索引），已存在的索引不会重建。'''
+import logging
+import sqlalchemy
+import dao
+
+
+def create_missing_indexes(engine):
+    inspector = sqlalchemy.inspect(engine)
+    table_names = set(inspector.get_table_names())
+    for table in dao.Base.metadata.sorted_tables:
+        if table.name not in table_names:
+            logging.warning(str.format("Table {} does not exist, skip it", table.name))
+            continue
+        index_names = set([index['name'] for index in inspector.get_indexes(table.name)])
+        for index in table.indexes:
+            if index.name in index_names:
+                continue
+            logging.info(str.format("Create index {} on {}({})",
+                                    index.name, table.name, ', '.join([c.name for c in index.columns])))
+            index.create(engine)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    create_missing_indexes(dao.engine)
+
+
+main()
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*
+'''
+本脚本创建实体中定义、但数据库中尚不存在的表（如scoretrack、checkpoint、sequencestats、seqidgram），已存在的表不会改动。
+新建的sequencestats和seqidgram表需要再运行ot-rebuild-sequence-stats.py和ot-rebuild-seq-id-grams.py填充数据。
+'''
+import logging
+import sqlalchemy
+import dao
+
+
+def create_missing_tables(engine):
+    table_names = set(sqlalchemy.inspect(engine).get_table_names())
+    for table in dao.Base.metadata.sorted_tables:
+        if table.name in table_names:
+            continue
+        logging.info(str.format("Create table {}", table.name))
+        table.create(engine, checkfirst=True)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    create_missing_tables(dao.engine)
+
+
+main()
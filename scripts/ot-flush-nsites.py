@@ -1,59 +1,54 @@
 # -*- coding: utf-8 -*
-'''本脚本读取数据库中的所有序列，找出N糖位点，并将N糖位点写回数据库。'''
-import dao
-import re
+'''本脚本按序列ID分批流式读取数据库中的所有序列，找出N糖位点，并将每批的N糖位点在一个事务中批量写回数据库。'''
+import argparse
 import logging
+import dao
+from tools import nsites as nsite_tools
+
 
+class Config(object):
+    def __init__(self):
+        parser = argparse.ArgumentParser()
+        parser.add_argument('-p', '--pattern', default=nsite_tools.NSITE_PATTERN,
+                            help='The regex of the sequon, the type of a site is its last letter(S or T)')
+        parser.add_argument('-o', '--overlapping', action='store_true', help='Find the overlapping sites')
+        parser.add_argument('-c', '--chunk-size', type=int, default=1000,
+                            help='The count of the sequences written in one transaction')
+        self._parser = parser
 
-def _get_ntype_from_match(match_str):
-    if match_str[-1] == 'S':
-        return dao.nsite.S
-    elif match_str[-1] == 'T':
-        return dao.nsite.T
-    else:
-        raise Exception(str.format("Unexpected match {}", match_str))
+    def parse(self):
+        return self._parser.parse_args()
 
 
-def search_seq(seq, regex_str):
-    r = re.compile(regex_str)
-    start_positions = []
-    ntypes = []
-    cur_pos = 0
+def flush_all_seqs(scanner, chunk_size):
+    seq_count = 0
+    nsite_count = 0
+    after = None
     while True:
-        m = r.search(seq)
-        if m is None:
+        seq_strs = dao.find_seq_strs_after(after, chunk_size)
+        if len(seq_strs) == 0:
             break
-        start_positions.append(m.start() + cur_pos)
-        ntypes.append(_get_ntype_from_match(m.group()))
-
-        end_pos = m.end()
-        seq = seq[end_pos:]
-        cur_pos += end_pos
-
-    return start_positions, ntypes
-
-
-def update_seq(seq_id, seq, regex_str):
-    start_positions, ntypes = search_seq(seq, regex_str)
-    if len(start_positions) == 0:
-        logging.warning("No n-sites found in seq " + seq_id)
-        return
-    logging.info(str.format("Update nsites by seq_id {}, pos {}", seq_id, list(zip(start_positions, ntypes))))
-    dao.replace_nsites_by_seq_id(seq_id, start_positions, ntypes)
-
-
-def flush_all_seqs():
-    regex_str = r"N[A-OQ-Z][ST]"
-    with dao.session_scope() as session:
-        seqs = dao.sequence.find_all_seqs(session)
-        logging.info(str.format("Total seq count {}", len(seqs)))
-        for seq in seqs:
-            update_seq(seq.seq_id, seq.seq, regex_str)
+        seq_ids_to_nsites = {}
+        for seq_id, seq_str in seq_strs:
+            positions, ntypes = scanner.search(seq_str)
+            if len(positions) == 0:
+                # the nsites of the sequence are kept, the same as before
+                logging.warning("No n-sites found in seq " + seq_id)
+                continue
+            logging.debug(str.format("Nsites of seq_id {}, pos {}", seq_id, list(zip(positions, ntypes))))
+            seq_ids_to_nsites[seq_id] = (positions, ntypes)
+            nsite_count += len(positions)
+        dao.replace_nsites_by_seqs(seq_ids_to_nsites)
+
+        after = seq_strs[-1][0]
+        seq_count += len(seq_strs)
+        logging.info(str.format("{} sequences flushed, {} nsites found", seq_count, nsite_count))
 
 
 def main():
-    logging.basicConfig(level=logging.DEBUG)
-    flush_all_seqs()
+    logging.basicConfig(level=logging.INFO)
+    cfg = Config().parse()
+    flush_all_seqs(nsite_tools.NSiteScanner(cfg.pattern, cfg.overlapping), cfg.chunk_size)
 
 
 main()
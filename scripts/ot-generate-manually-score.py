@@ -1,13 +1,13 @@
 import logging
 logging.basicConfig(level=logging.INFO)
 import dao
-from tools import motifs as motif_tool, pssm_matrix
+from tools import motifs as motif_tool, matrix_store
 
 MOTIF_VERSION = 2
 
 
 with dao.session_scope() as session:
-    matrix = pssm_matrix.calc_pssm_matrix(dao.find_baseline_motifs())
+    matrix = matrix_store.get_matrix(dao.find_baseline_motifs())
 
     logging.info(matrix.pssm)
 
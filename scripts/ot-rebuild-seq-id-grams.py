@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*
+'''本脚本创建seqidgram表（如果不存在），并为数据库中的所有序列ID重建三元组（trigram）索引，用于按关键字搜索序列ID。'''
+import logging
+import dao
+
+BATCH_SIZE = 1000
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    dao.gram.SeqIdGramEntity.__table__.create(dao.engine, checkfirst=True)
+    with dao.query_session() as session:
+        seq_ids = dao.sequence.find_all_seq_ids(session)
+    logging.info(str.format("Total seq count {}", len(seq_ids)))
+
+    with dao.session_scope() as session:
+        session.query(dao.gram.SeqIdGramEntity).delete(synchronize_session=False)
+    for i in range(0, len(seq_ids), BATCH_SIZE):
+        with dao.session_scope() as session:
+            dao.gram.add_grams(session, seq_ids[i:i + BATCH_SIZE])
+        logging.info(str.format("{}/{} sequence ids indexed", min(i + BATCH_SIZE, len(seq_ids)), len(seq_ids)))
+
+
+main()
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*
+'''本脚本创建sequencestats表（如果不存在），并根据数据库中的motif和N糖位点重新计算所有序列各版本的统计信息。'''
+import logging
+import dao
+
+BATCH_SIZE = 500
+VERSIONS = [1, 2, 3]
+
+
+def rebuild_stats(seq_ids, version):
+    for i in range(0, len(seq_ids), BATCH_SIZE):
+        with dao.session_scope() as session:
+            dao.stats.refresh_stats(session, seq_ids[i:i + BATCH_SIZE], version)
+        logging.info(str.format("Version {}: {}/{} sequences refreshed",
+                                version, min(i + BATCH_SIZE, len(seq_ids)), len(seq_ids)))
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    dao.stats.SequenceStatsEntity.__table__.create(dao.engine, checkfirst=True)
+    with dao.query_session() as session:
+        seq_ids = dao.sequence.find_all_seq_ids(session)
+    logging.info(str.format("Total seq count {}", len(seq_ids)))
+    for version in VERSIONS:
+        rebuild_stats(seq_ids, version)
+
+
+main()
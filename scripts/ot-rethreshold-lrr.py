@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*
+'''
+本脚本读取lrr-search.py --save-tracks保存的打分轨迹，在新的FDR水平下重新计算LRR，无需重新扫描序列。
+默认只统计各序列的LRR数量，指定--write时将结果写入数据库（每批一个事务）：
+只更新扫描得到的motif的fdr_probability，不再被找到的标记为false discovery，
+手工添加的和已标记为错误的motif保持不变，新找到的motif也不插入（需要时用lrr-search.py --overwrite重新扫描）。
+'''
+import argparse
+import logging
+import dao
+from tools import matrix_store
+from tools import motifs as motif_tools
+from tools import score_track
+
+MOTIF_VERSION = 3
+BASELINE_MOTIF_VERSION = 1
+
+
+class Config(object):
+    def __init__(self):
+        parser = argparse.ArgumentParser()
+        parser.add_argument('-a', '--alpha', type=float, default=motif_tools.FDR_ALPHA, help='The FDR level')
+        parser.add_argument('-c', '--chunk-size', type=int, default=1000,
+                            help='The count of the tracks read and written together')
+        parser.add_argument('-v', '--version', type=int, default=MOTIF_VERSION, help='The version of the motifs')
+        parser.add_argument('--exact-pvalues', action='store_true',
+                            help='The probabilities are the exact p-values of the matrix rather than 2^-score')
+        parser.add_argument('--write', action='store_true',
+                            help='Update the fdr_probability of the scanned motifs of the version, '
+                                 'and mark the ones no longer found as false discovery')
+        self._parser = parser
+
+    def parse(self):
+        cfg = self._parser.parse_args()
+        if not 0 < cfg.alpha < 1:
+            print("The alpha must be between 0 and 1")
+            exit(1)
+        if cfg.chunk_size <= 0:
+            print("The chunk size must be greater than 0")
+            exit(1)
+        return cfg
+
+
+def rethreshold(cfg):
+    motif_strs = dao.find_baseline_motifs(BASELINE_MOTIF_VERSION, with_wrong=False)
+    matrix = matrix_store.get_matrix(motif_strs, with_pvalue_table=cfg.exact_pvalues)
+    logging.info(str.format("Rethreshold the tracks of matrix {} at alpha {}", matrix.version, cfg.alpha))
+
+    pvalue_table = matrix.pvalue_table if cfg.exact_pvalues else None
+    seq_count = 0
+    motif_count = 0
+    false_discovery_count = 0
+    after = None
+    while True:
+        tracks = dao.find_score_tracks_after(matrix.version, after, cfg.chunk_size)
+        if len(tracks) == 0:
+            break
+        seq_ids_to_fdr = {}
+        for seq_id, track in tracks:
+            motifs = score_track.lrr_search_by_track(track, cfg.alpha, matrix.length, pvalue_table)
+            if cfg.write:
+                fdr_probabilities = score_track.fdr_probabilities_by_track(track, cfg.alpha, pvalue_table)
+                seq_ids_to_fdr[seq_id] = (fdr_probabilities, set([m.offset for m in motifs]))
+            motif_count += len(motifs)
+        if cfg.write:
+            false_discovery_count += dao.update_scanned_motifs_fdr(seq_ids_to_fdr, cfg.version)
+
+        after = tracks[-1][0]
+        seq_count += len(tracks)
+        logging.info(str.format("{} sequences rethresholded, {} LRR motifs found", seq_count, motif_count))
+    logging.info(str.format("All done, {} sequences, {} LRR motifs, {} scanned motifs marked as false discovery",
+                            seq_count, motif_count, false_discovery_count))
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    rethreshold(Config().parse())
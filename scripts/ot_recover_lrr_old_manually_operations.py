@@ -15,7 +15,7 @@
 import logging
 from sqlalchemy import and_, not_
 import dao
-from tools import motifs as motif_tools, pssm_matrix
+from tools import motifs as motif_tools, matrix_store
 
 
 OLD_VERSION = 2
@@ -48,7 +48,7 @@ def main():
                          new_m.id, new_m.seq_id, new_m.offset, NEW_VERSION))
         #dao.update_false_discovery_by_motif(new_m.id, True, NEW_VERSION)
 
-    matrix = pssm_matrix.calc_pssm_matrix(dao.find_baseline_motifs())
+    matrix = matrix_store.get_matrix(dao.find_baseline_motifs())
     motifs = get_old_correct_new_not_exists()
     with dao.query_session() as session:
         all_seq_ids = set([m.seq_id for m in motifs])
@@ -3,9 +3,11 @@
 # Copyright 2019-2021 phytolrr.com. All rights reserved.
 
 import configparser
+from settings import cache
 from settings import db
 from settings import log
 from settings import server
+from settings import traffic
 
 MODE_DEV = 'development'
 MODE_PRODUCT = 'production'
@@ -30,6 +32,25 @@ def read_in_configs(file_path):
     if parser.has_section('server'):
         for key, value in parser.items('server'):
             setattr(server, key, value)
+        for key in ['workers', 'backlog', 'timeout', 'graceful_timeout', 'scan_workers', 'scan_queue_size']:
+            setattr(server, key, parser.getint('server', key, fallback=getattr(server, key)))
+        server.scan_timeout = parser.getfloat('server', 'scan_timeout', fallback=server.scan_timeout)
+    if parser.has_section('cache'):
+        for key, value in parser.items('cache'):
+            setattr(cache, key, value)
+        cache.port = parser.getint('cache', 'port', fallback=cache.port)
+        cache.redis_enabled = parser.getboolean('cache', 'redis_enabled', fallback=False)
+        cache.matrix_check_interval = parser.getint('cache', 'matrix_check_interval',
+                                                    fallback=cache.matrix_check_interval)
+        cache.result_cache_size = parser.getint('cache', 'result_cache_size', fallback=cache.result_cache_size)
+        cache.result_cache_ttl = parser.getint('cache', 'result_cache_ttl', fallback=cache.result_cache_ttl)
+        cache.sequence_count_ttl = parser.getint('cache', 'sequence_count_ttl', fallback=cache.sequence_count_ttl)
+    if parser.has_section('traffic'):
+        for key, value in parser.items('traffic'):
+            setattr(traffic, key, value)
+        traffic.enabled = parser.getboolean('traffic', 'enabled', fallback=False)
+        for key in ['scan_capacity', 'scan_rate', 'default_capacity', 'default_rate']:
+            setattr(traffic, key, parser.getfloat('traffic', key, fallback=getattr(traffic, key)))
 
 
 def check_configs():
@@ -53,6 +74,8 @@ def repr_all_configs():
     config_description += repr_config(server)
     config_description += repr_config(db)
     config_description += repr_config(log)
+    config_description += repr_config(cache)
+    config_description += repr_config(traffic)
 
     return config_description
 
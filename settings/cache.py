@@ -1,2 +1,17 @@
 host = 'localhost'
-port = 6379
\ No newline at end of file
+port = 6379
+
+# Whether to share the computed PSSM matrices by redis
+redis_enabled = False
+# The directory to store the computed PSSM matrices, disabled if None
+matrix_path = None
+# The interval(seconds) to check whether the baseline motifs have been changed
+matrix_check_interval = 60
+
+# The max count of the /find-lrr results cached in process, disabled if 0
+result_cache_size = 1024
+# The seconds a /find-lrr result is cached
+result_cache_ttl = 3600
+
+# The seconds the total count of the unfiltered sequence listing is cached, disabled if 0
+sequence_count_ttl = 60
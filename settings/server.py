@@ -1,2 +1,18 @@
 port = 8080
 host = "127.0.0.1"
+
+# wsgiref, threaded or gunicorn, see web_service/serving.py
+engine = 'wsgiref'
+# The count of the worker processes of gunicorn
+workers = 4
+# The max count of the pending connections
+backlog = 2048
+# The seconds of gunicorn to kill a silent worker, and to wait for the workers to finish on restart(SIGHUP or SIGTERM)
+timeout = 60
+graceful_timeout = 30
+# The count of the processes to run the LRR scan, the scan runs in the request thread if 0
+scan_workers = 0
+# The max count of the scans waiting for the scan workers, more scans are rejected by 503
+scan_queue_size = 16
+# The seconds to wait for a scan before responding 503
+scan_timeout = 30
@@ -0,0 +1,16 @@
+# THIS FILE IS PART OF phytolrr.com PROJECT.
+# Copyright 2019-2021 phytolrr.com. All rights reserved.
+
+# Limit the requests of each client by token buckets in redis, cache.redis_enabled is required
+enabled = False
+# The proxies(comma separated ips or networks) trusted to append the client ip to X-Forwarded-For,
+# the client ip is the right-most hop of X-Forwarded-For not in the trusted proxies
+trusted_proxies = '127.0.0.1,::1'
+# The Cloudflare networks(comma separated), CF-Connecting-IP is only trusted if the request is from them
+cloudflare_proxies = ''
+# The token bucket of /find-lrr: the burst size, and the tokens refilled per second
+scan_capacity = 10
+scan_rate = 0.2
+# The token bucket of the other endpoints
+default_capacity = 120
+default_rate = 10.0
@@ -1,8 +1,11 @@
+import sqlalchemy
 import dao
 from tests.test_tag_ref_entity import *
 from tests.test_motif_entity import *
 from tests.test_nsite_entity import *
 from tests.test_sequence_entity import *
+from tests.test_sequence_stats_entity import *
+from tests.test_seq_id_gram_entity import *
 
 MOTIF_VERSION = 1
 
@@ -36,6 +39,94 @@ class TestDao(unittest.TestCase):
         self.assertEqual(10, len(dao.find_correct_motifs_by_seq_ids(['SEQ1', ], MOTIF_VERSION)['SEQ1']))
         self.assertEqual('SEQABCDEFG', seq.seq)
 
+    def test_add_seqs(self):
+        motifs = [dao.motif.MotifEntityBase(i * 20, 'NEW1', 1.0, 0.5, 0.01) for i in range(0, 3)]
+        records = [dao.SequenceRecord('NEW1', 'NASQQ', 'SP4', motifs, [0], [dao.nsite.S]),
+                   dao.SequenceRecord('NEW2', 'QQQQQ', 'SP4'),
+                   dao.SequenceRecord('NEW1', 'QQQQQ', 'SP4'),
+                   dao.SequenceRecord('SEQ1', 'QQQQQ', 'SP4')]
+        self.assertEqual(['NEW1', 'NEW2'], dao.add_seqs(records, MOTIF_VERSION))
+        self.assertEqual('NASQQ', dao.find_seq_by_id('NEW1').seq)
+        self.assertEqual('SEQABCDEFG', dao.find_seq_by_id('SEQ1').seq)
+        self.assertEqual(3, len(dao.find_correct_motifs_by_seq_ids(['NEW1'], MOTIF_VERSION)['NEW1']))
+        self.assertEqual(1, len(dao.find_nsites_by_seq_id('NEW1')))
+        self.assertEqual(3, self._find_stats('NEW1').lrr_count)
+        self.assertEqual(1, self._find_stats('NEW1').nsite_count)
+        self.assertEqual(0, self._find_stats('NEW2').lrr_count)
+
+        seqs, total = dao.query_sequences({'page_index': 0, 'page_size': 20, 'keyword': 'new'}, MOTIF_VERSION)
+        self.assertEqual(2, total)
+        seqs, total = dao.query_sequences({'page_index': 0, 'page_size': 20}, MOTIF_VERSION)
+        self.assertEqual(11, total)
+        self.assertEqual([], dao.add_seqs(records, MOTIF_VERSION))
+
+    def test_find_seq_strs_after(self):
+        seq_strs = dao.find_seq_strs_after(None, 4)
+        self.assertEqual(['SEQ1', 'SEQ2', 'SEQ3', 'SEQ4'], [seq_id for seq_id, seq in seq_strs])
+        self.assertEqual('SEQABCDEFG', seq_strs[0][1])
+        self.assertEqual(['SEQ8', 'SEQ9'], [seq_id for seq_id, seq in dao.find_seq_strs_after('SEQ7', 4)])
+        self.assertEqual([], dao.find_seq_strs_after('SEQ9', 4))
+
+    def test_replace_motifs_by_seqs(self):
+        seq_ids_to_motifs = {
+            'SEQ1': [dao.motif.MotifEntityBase(0, 'SEQ1', 2.0, 0.1, 0.1), dao.motif.MotifEntityBase(500, 'SEQ1', 2.0, 0.1, 0.1)],
+            'SEQ2': []
+        }
+        self.assertIsNone(dao.find_checkpoint('scan'))
+        dao.replace_motifs_by_seqs(seq_ids_to_motifs, MOTIF_VERSION, 'scan', 'SEQ2')
+        self.assertEqual('SEQ2', dao.find_checkpoint('scan'))
+        motifs = dao.find_motifs_by_seq_ids(['SEQ1', 'SEQ2', 'SEQ3'], MOTIF_VERSION)
+        self.assertEqual([0, 500], sorted([m.offset for m in motifs['SEQ1']]))
+        self.assertEqual(2.0, [m for m in motifs['SEQ1'] if m.offset == 0][0].score)
+        self.assertEqual([], motifs['SEQ2'])
+        self.assertEqual(10, len(motifs['SEQ3']))
+        self.assertEqual(2, self._find_stats('SEQ1').lrr_count)
+        self.assertEqual(0, self._find_stats('SEQ2').lrr_count)
+
+        dao.replace_motifs_by_seqs({'SEQ3': []}, MOTIF_VERSION, 'scan', 'SEQ3')
+        self.assertEqual('SEQ3', dao.find_checkpoint('scan'))
+        dao.remove_checkpoint('scan')
+        self.assertIsNone(dao.find_checkpoint('scan'))
+
+    def test_replace_motifs_by_seqs_with_tracks(self):
+        tracks = {'SEQ1': b'\x00' * 40, 'SEQ2': b'\x01' * 8}
+        dao.replace_motifs_by_seqs({'SEQ1': [], 'SEQ2': []}, MOTIF_VERSION, seq_ids_to_track=tracks,
+                                   matrix_version='m1')
+        self.assertEqual(tracks['SEQ1'], dao.find_score_track('SEQ1', 'm1'))
+        self.assertIsNone(dao.find_score_track('SEQ1', 'm2'))
+        self.assertIsNone(dao.find_score_track('SEQ3', 'm1'))
+
+        dao.replace_motifs_by_seqs({'SEQ1': []}, MOTIF_VERSION, seq_ids_to_track={'SEQ1': b'\x02' * 4},
+                                   matrix_version='m1')
+        self.assertEqual(b'\x02' * 4, dao.find_score_track('SEQ1', 'm1'))
+        self.assertEqual([('SEQ1', b'\x02' * 4), ('SEQ2', tracks['SEQ2'])],
+                         [tuple(t) for t in dao.find_score_tracks_after('m1', None, 10)])
+        self.assertEqual(['SEQ2'], [t[0] for t in dao.find_score_tracks_after('m1', 'SEQ1', 10)])
+
+    def test_update_scanned_motifs_fdr(self):
+        dao.add_manually_motif('SEQ1', 5, MOTIF_VERSION, 1.0, 0.1)
+        offsets_to_motif = dict([(m.offset, m) for m in dao.find_motifs_by_seq_ids(['SEQ1'], MOTIF_VERSION)['SEQ1']])
+        dao.add_tags_by_names_to_ids({dao.tag.OVERLAP_TAG: [offsets_to_motif[20].id]}, MOTIF_VERSION)
+
+        fdr_probabilities = [0.5] * 200
+        count = dao.update_scanned_motifs_fdr({'SEQ1': (fdr_probabilities, {0, 40})}, MOTIF_VERSION)
+        # the scanned motifs at 60..180 are no longer found
+        self.assertEqual(7, count)
+        motifs = dict([(m.offset, m) for m in dao.find_motifs_by_seq_ids(['SEQ1'], MOTIF_VERSION)['SEQ1']])
+        self.assertEqual(11, len(motifs))
+        for offset in (0, 40):
+            self.assertTrue(motifs[offset].correct)
+            self.assertEqual(0.5, motifs[offset].fdr_probability)
+        self.assertTrue(motifs[60].false_discovery)
+        self.assertFalse(motifs[60].correct)
+        self.assertEqual(0.5, motifs[60].fdr_probability)
+        # the manually added motif and the one marked wrong by the curators are kept
+        self.assertTrue(motifs[5].correct)
+        self.assertFalse(motifs[20].false_discovery)
+        self.assertEqual(0.0, motifs[5].fdr_probability)
+        self.assertEqual(0.0, motifs[20].fdr_probability)
+        self.assertEqual(3, self._find_stats('SEQ1').lrr_count)
+
     def test_replace_tags_by_motifs(self):
         seq_ids_to_motifs = {'SEQ1': [], 'SEQ2': []}
         with query_session() as session:
@@ -221,6 +312,21 @@ class TestDao(unittest.TestCase):
         self.assertEqual(3, len(seqs))
         self.assertEqual(3, total)
 
+    def test_query_sequences_lrr_count_without_stats(self):
+        filters = {'page_index': 0, 'page_size': 20, 'lrr_count_gt': 15}
+        expect_seqs, expect_total = dao.query_sequences(filters, MOTIF_VERSION)
+        with dao.session_scope() as session:
+            session.query(dao.stats.SequenceStatsEntity).delete(synchronize_session=False)
+
+        # the existing databases without the statistics are filtered by the motifs
+        seqs, total = dao.query_sequences(filters, MOTIF_VERSION)
+        self.assertEqual(6, total)
+        self.assertEqual([seq.seq_id for seq in expect_seqs], [seq.seq_id for seq in seqs])
+        self.assertEqual(expect_total, total)
+        dao.stats.SequenceStatsEntity.__table__.drop(dao.engine)
+        seqs, total = dao.query_sequences({'page_index': 0, 'page_size': 20, 'offsetlt': 40}, MOTIF_VERSION)
+        self.assertEqual(3, total)
+
     def test_query_sequences_keyword(self):
         filters = {'page_index': 0, 'page_size': 20, 'keyword': 'SEQ1'}
         seqs, total = dao.query_sequences(filters, MOTIF_VERSION)
@@ -232,6 +338,52 @@ class TestDao(unittest.TestCase):
         self.assertEqual(9, len(seqs))
         self.assertEqual(9, total)
 
+    def test_query_sequences_keyword_substring(self):
+        for seq_id in ['AT1G01010.1', 'AT1G01020.1', 'AT_1G01030', 'ABC-BCD']:
+            self._set_up_seq(seq_id, 'SEQABCDEFG', 'SP4')
+
+        def search(keyword):
+            seqs, total = dao.query_sequences({'page_index': 0, 'page_size': 20, 'keyword': keyword}, MOTIF_VERSION)
+            self.assertEqual(len(seqs), total)
+            return [seq.seq_id for seq in seqs]
+
+        self.assertEqual(['AT1G01010.1', 'AT1G01020.1'], search('at1g'))
+        self.assertEqual(['AT1G01020.1'], search('G01020'))
+        self.assertEqual(['AT1G01010.1', 'AT1G01020.1'], search('.1'))
+        self.assertEqual(['AT_1G01030'], search('_'))
+        self.assertEqual(['AT_1G01030'], search('t_1g'))
+        # the grams abc and bcd are both in ABC-BCD, but it does not contain the keyword
+        self.assertEqual([], search('abcd'))
+        self.assertEqual(['ABC-BCD'], search('c-b'))
+        self.assertEqual([], search('%'))
+
+    def test_query_sequences_keyword_without_grams(self):
+        self._set_up_seq('AT1G01010.1', 'SEQABCDEFG', 'SP4')
+        with dao.session_scope() as session:
+            session.query(dao.gram.SeqIdGramEntity).delete(synchronize_session=False)
+
+        def search(keyword):
+            seqs, total = dao.query_sequences({'page_index': 0, 'page_size': 20, 'keyword': keyword}, MOTIF_VERSION)
+            self.assertEqual(len(seqs), total)
+            return [seq.seq_id for seq in seqs]
+
+        # the existing databases without the grams are searched by LIKE
+        self.assertEqual(['AT1G01010.1'], search('g0101'))
+        self.assertEqual(['SEQ1'], search('q1'))
+        dao.gram.SeqIdGramEntity.__table__.drop(dao.engine)
+        self.assertEqual(['AT1G01010.1'], search('At1'))
+
+    def test_query_sequences_after(self):
+        filters = {'page_index': 0, 'page_size': 4, 'after': 'SEQ2'}
+        seqs, total = dao.query_sequences(filters, MOTIF_VERSION)
+        self.assertEqual(['SEQ3', 'SEQ4', 'SEQ5', 'SEQ6'], [seq.seq_id for seq in seqs])
+        self.assertEqual(9, total)
+
+        filters = {'page_index': 0, 'page_size': 4, 'after': 'SEQ3', 'lrr_count_gt': 15}
+        seqs, total = dao.query_sequences(filters, MOTIF_VERSION)
+        self.assertEqual(['SEQ4', 'SEQ5', 'SEQ6', 'SEQ7'], [seq.seq_id for seq in seqs])
+        self.assertEqual(6, total)
+
     def test_query_sequences_species(self):
         filters = {'page_index': 0, 'page_size': 20, 'species': ['SP1', 'SP3']}
         seqs, total = dao.query_sequences(filters, MOTIF_VERSION)
@@ -243,6 +395,131 @@ class TestDao(unittest.TestCase):
         self.assertEqual(3, len(seqs))
         self.assertEqual(3, total)
 
+    def _find_stats(self, seq_id, version=MOTIF_VERSION):
+        with dao.query_session() as session:
+            return dao.stats.find_stats_by_seq_ids(session, [seq_id], version)[0]
+
+    def test_stats_maintained(self):
+        self.assertEqual(10, self._find_stats('SEQ1').lrr_count)
+        self.assertEqual(180, self._find_stats('SEQ1').max_offset)
+
+        dao.add_manually_motif('SEQ1', 400, MOTIF_VERSION, 10.0, 0.1)
+        self.assertEqual(11, self._find_stats('SEQ1').lrr_count)
+        self.assertEqual(400, self._find_stats('SEQ1').max_offset)
+
+        mid = dao.find_motifs_by_offsets('SEQ1', [400], MOTIF_VERSION)[0].id
+        dao.remove_manually_motif(mid, MOTIF_VERSION)
+        self.assertEqual(10, self._find_stats('SEQ1').lrr_count)
+        self.assertEqual(180, self._find_stats('SEQ1').max_offset)
+
+        dao.replace_nsites_by_seq_id('SEQ1', [1, 3], [dao.nsite.S, dao.nsite.T])
+        self.assertEqual(2, self._find_stats('SEQ1').nsite_count)
+
+        # the overlap tag marks the motif wrong
+        mid = dao.find_motifs_by_offsets('SEQ1', [0], MOTIF_VERSION)[0].id
+        dao.add_tags_by_names_to_ids({dao.tag.OVERLAP_TAG: [mid]}, MOTIF_VERSION)
+        self.assertEqual(9, self._find_stats('SEQ1').lrr_count)
+        self.assertEqual(20, self._find_stats('SEQ1').min_offset)
+
+    def test_replace_nsites_by_seqs(self):
+        dao.replace_nsites_by_seqs({'SEQ1': ([1, 3], [dao.nsite.S, dao.nsite.T]), 'SEQ2': ([7], [dao.nsite.S])})
+        self.assertEqual(2, len(dao.find_nsites_by_seq_id('SEQ1')))
+        self.assertEqual(2, self._find_stats('SEQ1').nsite_count)
+        self.assertEqual(1, self._find_stats('SEQ2').nsite_count)
+        dao.replace_nsites_by_seqs({'SEQ1': ([], [])})
+        self.assertEqual(0, self._find_stats('SEQ1').nsite_count)
+        self.assertEqual(1, self._find_stats('SEQ2').nsite_count)
+
+    def test_stats_maintained_false_discovery(self):
+        motifs = [dao.motif.MotifEntityBase(i * 20, 'SEQ10', 1.0, 0.0, 0.0) for i in range(0, 3)]
+        dao.add_seq('SEQ10', 'SEQABCDEFG', 2, motifs, 'SP1')
+        self.assertEqual(3, self._find_stats('SEQ10', 2).lrr_count)
+        mid = dao.find_motifs_by_offsets('SEQ10', [40], 2)[0].id
+        dao.update_false_discovery_by_motif(mid, True, 2)
+        self.assertEqual(2, self._find_stats('SEQ10', 2).lrr_count)
+        self.assertEqual(20, self._find_stats('SEQ10', 2).max_offset)
+        dao.update_false_discovery_by_motif(mid, False, 2)
+        self.assertEqual(3, self._find_stats('SEQ10', 2).lrr_count)
+
+    def test_query_sequences_offset_and_lrr_count(self):
+        # the motifs matched by the offset are counted
+        filters = {'page_index': 0, 'page_size': 20, 'offsetlt': 200, 'lrr_count_gt': 4}
+        seqs, total = dao.query_sequences(filters, MOTIF_VERSION)
+        self.assertEqual(['SEQ1', 'SEQ2', 'SEQ3', 'SEQ4', 'SEQ5', 'SEQ6'], [seq.seq_id for seq in seqs])
+        filters = {'page_index': 0, 'page_size': 20, 'offsetlt': 200, 'lrr_count_gt': 9}
+        seqs, total = dao.query_sequences(filters, MOTIF_VERSION)
+        self.assertEqual(['SEQ1', 'SEQ2', 'SEQ3'], [seq.seq_id for seq in seqs])
+        self.assertEqual(3, total)
+
+    def test_query_sequences_count_cached(self):
+        filters = {'page_index': 0, 'page_size': 2, 'keyword': None}
+        seqs, total = dao.query_sequences(filters, MOTIF_VERSION)
+        self.assertEqual(2, len(seqs))
+        self.assertEqual(9, total)
+
+        # the cached count is invalidated by adding sequence
+        self._set_up_seq('SEQ10', 'SEQABCDEFG', 'SP1')
+        seqs, total = dao.query_sequences(filters, MOTIF_VERSION)
+        self.assertEqual(10, total)
+
+        # the filtered listing is always counted by the database
+        with dao.session_scope() as session:
+            session.query(dao.sequence.SequenceEntity).filter(dao.sequence.SequenceEntity.seq_id == 'SEQ10').delete()
+        seqs, total = dao.query_sequences(filters, MOTIF_VERSION)
+        self.assertEqual(10, total)
+        seqs, total = dao.query_sequences(dict(filters, keyword='SEQ'), MOTIF_VERSION)
+        self.assertEqual(9, total)
+
+    def test_query_sequences_count_not_cached(self):
+        ttl = dao.cache.sequence_count_ttl
+        dao.cache.sequence_count_ttl = 0
+        try:
+            dao.query_sequences({'page_index': 0, 'page_size': 2}, MOTIF_VERSION)
+            with dao.session_scope() as session:
+                session.query(dao.sequence.SequenceEntity).filter(dao.sequence.SequenceEntity.seq_id == 'SEQ1').delete()
+            seqs, total = dao.query_sequences({'page_index': 0, 'page_size': 2}, MOTIF_VERSION)
+            self.assertEqual(8, total)
+        finally:
+            dao.cache.sequence_count_ttl = ttl
+
+    def _count_queries(self, func):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        sqlalchemy.event.listen(dao.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            result = func()
+        finally:
+            sqlalchemy.event.remove(dao.engine, 'before_cursor_execute', before_cursor_execute)
+        return result, len(statements)
+
+    def test_query_sequences_page(self):
+        filters = {'page_index': 0, 'page_size': 20, 'species': ['SP1', 'SP3']}
+        page = dao.query_sequences_page(filters, MOTIF_VERSION, with_tags=True)
+        self.assertEqual(6, len(page.seqs))
+        self.assertEqual(6, page.total)
+        self.assertEqual({'SEQ1', 'SEQ2', 'SEQ3', 'SEQ7', 'SEQ8', 'SEQ9'}, page.seq_ids_to_motifs.keys())
+        self.assertEqual(10, len(page.seq_ids_to_motifs['SEQ1']))
+        self.assertEqual(30, len(page.seq_ids_to_motifs['SEQ7']))
+        self.assertEqual([], page.seq_ids_to_nsites['SEQ1'])
+
+        page = dao.query_sequences_page({'page_index': 0, 'page_size': 20, 'keyword': 'NOT_EXISTS'}, MOTIF_VERSION)
+        self.assertEqual([], page.seqs)
+        self.assertEqual(0, page.total)
+
+    def test_query_sequences_page_query_count(self):
+        # the count of the queries does not grow with the page size
+        dao.query_sequences_page({'page_index': 0, 'page_size': 1}, MOTIF_VERSION)
+        _, small_count = self._count_queries(
+            lambda: dao.query_sequences_page({'page_index': 0, 'page_size': 1}, MOTIF_VERSION, with_tags=True))
+        page, large_count = self._count_queries(
+            lambda: dao.query_sequences_page({'page_index': 0, 'page_size': 20}, MOTIF_VERSION, with_tags=True))
+        self.assertEqual(9, len(page.seqs))
+        self.assertEqual(small_count, large_count)
+        self.assertTrue(large_count <= 5)
+
     def test_add_motif(self):
         # 向seq中添加motif，OK
         self.assertIsNone(dao.add_manually_motif('SEQ1', 400, MOTIF_VERSION, 10.0, 0.1))
@@ -3,11 +3,17 @@ import logging
 import unittest
 import json
 import random
+import numpy
+import bottle
 import dao
+import settings
 from boddle import boddle
 
-from web_service import lrr_search_web_service
-from tools.exception import ErrorCode
+from web_service import lrr_search_web_service, lrr_service, sequence_service
+from tools import result_cache
+from tools import motifs as motif_tools
+from tools import score_track
+from tools.exception import ErrorCode, ServiceUnavailableError
 from dao.sequence_entity import SequenceEntity
 
 
@@ -15,10 +21,10 @@ MOTIF_VERSION = 2
 AMINOS = 'TWVILNGERPSMKHFQCAYD'
 
 
-def random_seq(seq_len):
+def random_seq(seq_len, rng=random):
     seq5_seq = ''
     for i in range(seq_len):
-        seq5_seq += random.choice(AMINOS)
+        seq5_seq += rng.choice(AMINOS)
     return seq5_seq
 
 
@@ -96,6 +102,28 @@ class TestGetSequences(unittest.TestCase):
             self.assertEqual(len(seq_ids_to_seq['SEQ3']['motifs_16']), 30)
 
 
+    def test_get_sequences_after(self):
+        seq_ids = []
+        after = ''
+        while True:
+            with boddle(query={"size": 2, "after": after}):
+                result = json.loads(lrr_search_web_service.get_sequences(MOTIF_VERSION))
+            self.assertEqual(3, result['total'])
+            seq_ids.extend([seq['sequence_id'] for seq in result['sequences']])
+            if result['next'] is None:
+                break
+            after = result['next']
+        self.assertEqual(['SEQ1', 'SEQ2', 'SEQ3'], seq_ids)
+
+        # the page is ignored with the cursor
+        with boddle(query={"page": 5, "size": 2, "after": sequence_service.encode_cursor('SEQ1')}):
+            result = json.loads(lrr_search_web_service.get_sequences(MOTIF_VERSION))
+        self.assertEqual(['SEQ2', 'SEQ3'], [seq['sequence_id'] for seq in result['sequences']])
+
+        with boddle(query={"size": 2, "after": '%%%'}):
+            result = json.loads(lrr_search_web_service.get_sequences(MOTIF_VERSION))
+        self.assertIn('message', result)
+
     def test_get_sequences_offset_lt(self):
         with boddle(query={"page": 0, "size": 20, "offsetlt": 50}):
             result = lrr_search_web_service.get_sequences(MOTIF_VERSION)
@@ -230,6 +258,110 @@ class TestFalseDiscovery(unittest.TestCase):
         self.assertEqual(30, len(seq_ids_to_motifs['SEQ3']))
 
 
+class TestFindLrr(unittest.TestCase):
+    LRR = 'LKNLDLSGNKLSGPIP'
+
+    def setUp(self):
+        set_up_db()
+        # a fixed seed, a random filler may look like an LRR by chance
+        rng = random.Random(self.LRR)
+        # the baseline sequence is made of the same LRR, so the LRRs in the query sequence must be found
+        seq = SequenceEntity()
+        seq.seq_id = 'SEQ1'
+        seq.seq = (random_seq(8, rng) + self.LRR) * 30
+        seq.baseline = True
+        motifs = [dao.motif.MotifEntityBase(i * 24 + 8, 'SEQ1', 10.0, 0.1, 0.1) for i in range(0, 30)]
+        with dao.session_scope() as session:
+            session.add(seq)
+            dao.motif.add_motifs(session, motifs, 1)
+        lrr_service.MATRICES.clear()
+        lrr_service.MATRICES_CHECKED_AT.clear()
+        lrr_service.RESULT_CACHE = result_cache.ResultCache(10, 100)
+        self.seq = random_seq(100, rng) + self.LRR + random_seq(10, rng) + self.LRR + random_seq(100, rng)
+
+    def _find_lrr(self, seq, **options):
+        with boddle(json=dict(seq=seq, **options)):
+            return json.loads(lrr_search_web_service.find_lrr())
+
+    def test_find_lrr(self):
+        result = self._find_lrr(self.seq)
+        self.assertIn('LRRs', result)
+        self.assertEqual([100, 126], [m['offset'] for m in result['LRRs']])
+        self.assertEqual(1, len(lrr_service.RESULT_CACHE))
+
+        # the result is got from cache
+        self.assertEqual(result, self._find_lrr(self.seq))
+        self.assertEqual(1, len(lrr_service.RESULT_CACHE))
+
+        result = self._find_lrr(self.seq[:120])
+        self.assertEqual([100], [m['offset'] for m in result['LRRs']])
+        self.assertEqual(2, len(lrr_service.RESULT_CACHE))
+
+    def test_find_lrr_by_scan_workers(self):
+        expect_result = self._find_lrr(self.seq)
+        lrr_service.RESULT_CACHE = result_cache.ResultCache(10, 100)
+        scan_workers = settings.server.scan_workers
+        settings.server.scan_workers = 1
+        try:
+            self.assertEqual(expect_result, self._find_lrr(self.seq))
+            self.assertIsNotNone(lrr_service.SCAN_EXECUTOR)
+        finally:
+            settings.server.scan_workers = scan_workers
+            if lrr_service.SCAN_EXECUTOR is not None:
+                lrr_service.SCAN_EXECUTOR.shutdown()
+                lrr_service.SCAN_EXECUTOR = None
+
+    def test_find_lrr_saturated(self):
+        class SaturatedExecutor(object):
+            def search(self, matrix, seq, alpha, top_k):
+                raise ServiceUnavailableError("busy", retry_after=5)
+
+        lrr_service.SCAN_EXECUTOR = SaturatedExecutor()
+        try:
+            with boddle(json={'seq': self.seq}):
+                result = json.loads(lrr_search_web_service.find_lrr())
+                self.assertEqual(503, bottle.response.status_code)
+                self.assertEqual('5', bottle.response.headers['Retry-After'])
+            self.assertEqual({'message': 'busy'}, result)
+        finally:
+            lrr_service.SCAN_EXECUTOR = None
+
+    def test_find_lrr_options(self):
+        result = self._find_lrr(self.seq, alpha=0.05, motif_length=16)
+        self.assertEqual([100, 126], [m['offset'] for m in result['LRRs']])
+        # the options are in the key of the result cache
+        self.assertEqual([100], [m['offset'] for m in self._find_lrr(self.seq, top_k=1)['LRRs']])
+        self.assertEqual([], self._find_lrr(self.seq, alpha=1e-300)['LRRs'])
+        self.assertEqual(3, len(lrr_service.RESULT_CACHE))
+
+        # the extended windows, the LRR and the 8 residues after it
+        result = self._find_lrr(self.seq, motif_length=24)
+        self.assertEqual([100, 126], [m['offset'] for m in result['LRRs']])
+        self.assertEqual(4, len(lrr_service.RESULT_CACHE))
+        self.assertEqual(24, lrr_service.MATRICES[24].length)
+        self.assertEqual(16, lrr_service.MATRICES[16].length)
+
+    def test_find_lrr_no_baseline_motif_fits(self):
+        # the only baseline motif is too close to the end for a 24 residues window
+        dao.replace_motifs_by_seqs({'SEQ1': [dao.motif.MotifEntityBase(704, 'SEQ1', 10.0, 0.1, 0.1)]}, 1)
+        with boddle(json={'seq': self.seq, 'motif_length': 24}):
+            result = json.loads(lrr_search_web_service.find_lrr())
+            self.assertEqual(503, bottle.response.status_code)
+        self.assertIn('motif length 24', result['message'])
+        self.assertIn('LRRs', self._find_lrr(self.seq))
+
+    def test_find_lrr_invalid_options(self):
+        for options in [{'alpha': 0}, {'alpha': 1.5}, {'alpha': '0.1'}, {'motif_length': 20},
+                        {'motif_length': True}, {'top_k': 0}, {'top_k': 1.5}, {'top_k': 100000}]:
+            result = self._find_lrr(self.seq, **options)
+            self.assertIn('message', result, options)
+            self.assertIn(list(options.keys())[0], result['message'])
+
+    def test_find_lrr_too_long(self):
+        result = self._find_lrr(random_seq(8001))
+        self.assertIn('message', result)
+
+
 class TestManuallyMotif(unittest.TestCase):
     def setUp(self):
         set_up_db()
@@ -322,6 +454,29 @@ class TestManuallyMotif(unittest.TestCase):
         seq_ids_to_seq = dict([(seq.get("sequence_id"), seq) for seq in result.get("sequences")])
         self.assertEqual(11, len(seq_ids_to_seq['SEQ1'].get("motifs_16")), seq_ids_to_seq['SEQ1'])
 
+    def test_add_manually_motif_without_score_track_table(self):
+        set_up_baseline_seq('SEQ4', '', start=10, count=10, step=24)
+        dao.score_track.ScoreTrackEntity.__table__.drop(dao.engine)
+        seq = dao.find_seq_by_id('SEQ1')
+        with boddle(json={"offset": 196}):
+            result = json.loads(lrr_search_web_service.add_manually_motif(MOTIF_VERSION, seq.id))
+        self.assertEqual(196, result['motifs_16'][0]['offset'])
+        self.assertEqual(motif_tools.calc_pssm_score(seq.seq[196:212], lrr_service.get_baseline_matrix()),
+                         result['motifs_16'][0]['score'])
+
+    def test_add_manually_motif_by_score_track(self):
+        set_up_baseline_seq('SEQ4', '', start=10, count=10, step=24)
+        seq = dao.find_seq_by_id('SEQ1')
+        matrix = lrr_service.get_baseline_matrix()
+        track = score_track.scores_to_track(motif_tools.calc_pssm_scores(seq.seq, matrix))
+        dao.replace_motifs_by_seqs({}, MOTIF_VERSION, seq_ids_to_track={'SEQ1': track}, matrix_version=matrix.version)
+        with boddle(json={"offset": 196}):
+            result = json.loads(lrr_search_web_service.add_manually_motif(MOTIF_VERSION, seq.id))
+        # the score of the track is float32
+        expect_score = motif_tools.calc_pssm_score(seq.seq[196:212], matrix)
+        self.assertEqual(float(numpy.float32(expect_score)), result['motifs_16'][0]['score'])
+        self.assertAlmostEqual(expect_score, result['motifs_16'][0]['score'], places=5)
+
     def test_add_manually_motif_before_wrong_area(self):
         # 先把seq都查出来
         with dao.query_session() as session:
@@ -1,9 +1,11 @@
 import unittest
+import sqlalchemy
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 import logging
 from dao.motif_entity import *
 from dao.sequence_entity import *
+import dao.tag_ref_entity as tag
 
 
 MOTIF_VERSION = 2
@@ -109,7 +111,10 @@ class TestMotifEntity(unittest.TestCase):
         replace_motifs_by_seq(self.session, 'SEQ1', motifs, MOTIF_VERSION)
         self.session.commit()
         seqs = find_motifs_by_seq_id(self.session, 'SEQ1', MOTIF_VERSION)
-        self.assertEqual(2, len(seqs))
+        # the false discovery at offset 0 is kept
+        self.assertEqual([0, 100, 150], [m.offset for m in seqs])
+        self.assertFalse(seqs[0].correct)
+        seqs = seqs[1:]
         seq = seqs[0]
         self.assertEqual('SEQ1', seq.seq_id)
         self.assertEqual(100, seq.offset)
@@ -146,6 +151,70 @@ class TestMotifEntity(unittest.TestCase):
         motifs = find_motifs_by_seq_id(self.session, 'SEQ3', MOTIF_VERSION)
         self.assertEqual(expect_len, len(motifs))
 
+    def test_replace_motifs_by_seqs(self):
+        old_ids_to_offset = dict([(m.id, m.offset) for m in find_motifs_by_seq_id(self.session, 'SEQ1', MOTIF_VERSION)])
+        seq_ids_to_motifs = {
+            'SEQ1': [MotifEntityBase(100, 'SEQ1', 5.0, 0.5, 0.05), MotifEntityBase(150, 'SEQ1', 6.0, 0.6, 0.06)],
+            'SEQ2': [],
+            'SEQ6': [MotifEntityBase(offset, 'SEQ6', 1.0, 0.1, 0.01) for offset in range(0, 1000, 100)]
+        }
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        sqlalchemy.event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            replace_motifs_by_seqs(self.session, seq_ids_to_motifs, MOTIF_VERSION)
+            self.session.commit()
+        finally:
+            sqlalchemy.event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+        # select, delete of the tags, delete, update and insert, besides the transaction statements
+        self.assertTrue(len(statements) <= 6, statements)
+
+        seq1_motifs = find_motifs_by_seq_id(self.session, 'SEQ1', MOTIF_VERSION)
+        # the false discovery at offset 0 is kept
+        self.assertEqual([0, 100, 150], [m.offset for m in seq1_motifs])
+        seq1_motifs = seq1_motifs[1:]
+        # the matched motif is updated in place, its tags are kept
+        self.assertEqual(100, old_ids_to_offset[seq1_motifs[0].id])
+        self.assertEqual(5.0, seq1_motifs[0].score)
+        self.assertEqual(0.05, seq1_motifs[0].fdr_probability)
+        self.assertEqual(6.0, seq1_motifs[1].score)
+        self.assertTrue(seq1_motifs[1].correct)
+        self.assertFalse(seq1_motifs[1].manually_add)
+        self.assertEqual([0], [m.offset for m in find_motifs_by_seq_id(self.session, 'SEQ2', MOTIF_VERSION)])
+        self.assertEqual(10, len(find_motifs_by_seq_id(self.session, 'SEQ3', MOTIF_VERSION)))
+        self.assertEqual(10, find_motifs_count_by_seq_id(self.session, 'SEQ6', MOTIF_VERSION))
+
+    def test_replace_motifs_by_seqs_keep_curated(self):
+        manual = MotifEntityBase(50, 'SEQ1', 3.0, 0.3, 0.03, manually_add=True)
+        add_motifs(self.session, [manual], MOTIF_VERSION)
+        self.session.commit()
+        offsets_to_id = dict([(m.offset, m.id) for m in find_motifs_by_seq_id(self.session, 'SEQ1', MOTIF_VERSION)])
+        tag.add_tags_by_map(self.session, {offsets_to_id[0]: ['wrong.tag'], offsets_to_id[100]: ['kept.tag'],
+                                           offsets_to_id[200]: ['deleted.tag']})
+        self.session.commit()
+
+        seq_ids_to_motifs = {'SEQ1': [MotifEntityBase(offset, 'SEQ1', 9.0, 0.9, 0.09) for offset in (0, 50, 100)]}
+        replace_motifs_by_seqs(self.session, seq_ids_to_motifs, MOTIF_VERSION)
+        self.session.commit()
+
+        motifs = find_motifs_by_seq_id(self.session, 'SEQ1', MOTIF_VERSION)
+        self.assertEqual([0, 50, 100], [m.offset for m in motifs])
+        # the false discovery and the manually added motif are neither deleted nor updated
+        self.assertEqual(offsets_to_id[0], motifs[0].id)
+        self.assertFalse(motifs[0].correct)
+        self.assertTrue(motifs[0].false_discovery)
+        self.assertEqual(0.0, motifs[0].score)
+        self.assertEqual(offsets_to_id[50], motifs[1].id)
+        self.assertTrue(motifs[1].manually_add)
+        self.assertEqual(3.0, motifs[1].score)
+        self.assertEqual(9.0, motifs[2].score)
+        # the tags of the deleted motifs are deleted with them
+        self.assertEqual({offsets_to_id[0]: {'wrong.tag'}, offsets_to_id[100]: {'kept.tag'}},
+                         tag.find_tag_names_by_motif_ids(self.session, list(offsets_to_id.values())))
+
     def test_find_motifs_by_seq_ids(self):
         seq_ids_to_motifs = find_motifs_by_seq_ids(self.session, {'SEQ1', 'SEQ2', 'SEQ3'}, MOTIF_VERSION)
         self.assertEqual(3, len(seq_ids_to_motifs))
@@ -31,6 +31,21 @@ class TestNSiteEntity(unittest.TestCase):
             self.assertEqual(5, find_nsites_count_by_seq_id(session, 'SEQ3'))
             self.assertEqual(0, find_nsites_count_by_seq_id(session, 'SEQ4'))
 
+    def test_replace_nsites_by_seq_ids(self):
+        with session_scope() as session:
+            old_ids = dict([(n.start_pos, n.id) for n in find_nsites_by_seq_id(session, 'SEQ1')])
+            replace_nsites_by_seq_ids(session, {'SEQ1': ([1, 5, 30], [S, T, T]), 'SEQ2': ([], []),
+                                                'SEQ4': ([3], [S])})
+        with query_session() as session:
+            nsites = find_nsites_by_seq_id(session, 'SEQ1')
+            self.assertEqual({(1, S), (5, T), (30, T)}, set([(n.start_pos, n.ntype) for n in nsites]))
+            # the matched nsites are kept
+            self.assertEqual(old_ids[1], [n.id for n in nsites if n.start_pos == 1][0])
+            self.assertEqual(old_ids[5], [n.id for n in nsites if n.start_pos == 5][0])
+            self.assertEqual(0, find_nsites_count_by_seq_id(session, 'SEQ2'))
+            self.assertEqual(5, find_nsites_count_by_seq_id(session, 'SEQ3'))
+            self.assertEqual(1, find_nsites_count_by_seq_id(session, 'SEQ4'))
+
     def test_replace_nsites_by_seq_id1(self):
         with session_scope() as session:
             replace_nsites_by_seq_id(session, 'SEQ2', [1,5,15,30], [S,T,S,S])
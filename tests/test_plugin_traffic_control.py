@@ -0,0 +1,171 @@
+import json
+import unittest
+import bottle
+import redis
+from boddle import boddle
+import settings
+from web_service import plugin_traffic_control
+
+try:
+    # the Lua scripts of fakeredis require lupa
+    import fakeredis
+    import lupa
+except ImportError:
+    fakeredis = None
+
+
+class FakeLimiter(object):
+    def __init__(self, retry_after=0.0, error=False):
+        self.retry_after = retry_after
+        self.error = error
+        self.taken = []
+
+    def take(self, client_ip, budget):
+        if self.error:
+            raise redis.ConnectionError("redis is down")
+        self.taken.append((client_ip, budget.name))
+        return self.retry_after
+
+
+def request_from(remote_addr, path=None, headers=None):
+    context = boddle(path=path, headers=headers)
+    context.environ['REMOTE_ADDR'] = remote_addr
+    return context
+
+
+def find_lrr():
+    return json.dumps({'LRRs': []})
+
+
+class TestTrafficControl(unittest.TestCase):
+    def tearDown(self):
+        plugin_traffic_control._limiter = None
+
+    def test_get_client_ip(self):
+        with request_from('1.2.3.4'):
+            self.assertEqual('1.2.3.4', plugin_traffic_control.get_client_ip(bottle.request))
+        # the headers are not trusted if the request is not from the proxy
+        with request_from('1.2.3.4', headers={'CF-Connecting-IP': '5.6.7.8'}):
+            self.assertEqual('1.2.3.4', plugin_traffic_control.get_client_ip(bottle.request))
+        # the hop appended by the proxy, not the ones sent by the client
+        with request_from('127.0.0.1', headers={'X-Forwarded-For': '5.6.7.8, 10.0.0.1'}):
+            self.assertEqual('10.0.0.1', plugin_traffic_control.get_client_ip(bottle.request))
+        with request_from('127.0.0.1', headers={'X-Forwarded-For': '5.6.7.8, 10.0.0.1, 127.0.0.1'}):
+            self.assertEqual('10.0.0.1', plugin_traffic_control.get_client_ip(bottle.request))
+        with request_from('127.0.0.1', headers={'X-Forwarded-For': '127.0.0.1'}):
+            self.assertEqual('127.0.0.1', plugin_traffic_control.get_client_ip(bottle.request))
+        with request_from('127.0.0.1'):
+            self.assertEqual('127.0.0.1', plugin_traffic_control.get_client_ip(bottle.request))
+
+    def test_get_client_ip_spoofed_headers(self):
+        # the headers of a client skipping Cloudflare are passed through by the proxy
+        headers = {'CF-Connecting-IP': '5.6.7.8', 'X-Real-IP': '5.6.7.9', 'X-Forwarded-For': '5.6.7.10, 1.2.3.4'}
+        with request_from('127.0.0.1', headers=headers):
+            self.assertEqual('1.2.3.4', plugin_traffic_control.get_client_ip(bottle.request))
+
+    def test_get_client_ip_from_cloudflare(self):
+        cloudflare_proxies = settings.traffic.cloudflare_proxies
+        settings.traffic.cloudflare_proxies = '173.245.48.0/20, 2400:cb00::/32'
+        try:
+            with request_from('173.245.48.10', headers={'CF-Connecting-IP': '5.6.7.8'}):
+                self.assertEqual('5.6.7.8', plugin_traffic_control.get_client_ip(bottle.request))
+            with request_from('2400:cb00::1', headers={'CF-Connecting-IP': '5.6.7.8'}):
+                self.assertEqual('5.6.7.8', plugin_traffic_control.get_client_ip(bottle.request))
+            with request_from('1.2.3.4', headers={'CF-Connecting-IP': '5.6.7.8'}):
+                self.assertEqual('1.2.3.4', plugin_traffic_control.get_client_ip(bottle.request))
+        finally:
+            settings.traffic.cloudflare_proxies = cloudflare_proxies
+
+    def test_get_budget(self):
+        self.assertEqual('scan', plugin_traffic_control.get_budget('/find-lrr').name)
+        self.assertEqual('default', plugin_traffic_control.get_budget('/version/3/sequences').name)
+
+    def test_traffic_controller_allowed(self):
+        limiter = FakeLimiter()
+        plugin_traffic_control._limiter = limiter
+        with request_from('1.2.3.4', path='/find-lrr'):
+            result = plugin_traffic_control.traffic_controller(find_lrr)()
+        self.assertEqual({'LRRs': []}, json.loads(result))
+        self.assertEqual([('1.2.3.4', 'scan')], limiter.taken)
+
+    def test_traffic_controller_limited(self):
+        plugin_traffic_control._limiter = FakeLimiter(retry_after=2.5)
+        with request_from('1.2.3.4', path='/find-lrr'):
+            result = plugin_traffic_control.traffic_controller(find_lrr)()
+            self.assertEqual(429, bottle.response.status_code)
+            self.assertEqual('3', bottle.response.headers['Retry-After'])
+        self.assertIn('message', json.loads(result))
+
+    def test_traffic_controller_redis_error(self):
+        plugin_traffic_control._limiter = FakeLimiter(error=True)
+        with request_from('1.2.3.4', path='/find-lrr'):
+            result = plugin_traffic_control.traffic_controller(find_lrr)()
+        self.assertEqual({'LRRs': []}, json.loads(result))
+
+
+    def test_traffic_controller_scoped_to_api_routes(self):
+        from web_service import lrr_search_web_service
+        app = bottle.default_app()
+        app.install(plugin_traffic_control.traffic_controller)
+        try:
+            rules_to_plugins = dict([(route.rule, list(route.all_plugins())) for route in app.routes])
+        finally:
+            app.uninstall(plugin_traffic_control.traffic_controller)
+        for rule in ['/find-lrr', '/version/<version>/sequences']:
+            self.assertIn(plugin_traffic_control.traffic_controller, rules_to_plugins[rule])
+        for rule in ['/<filepath:path>', '/', '/findlrr', '/about']:
+            self.assertNotIn(plugin_traffic_control.traffic_controller, rules_to_plugins[rule])
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis and lupa are required to run the token bucket script")
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.redis_client = fakeredis.FakeRedis()
+        self.limiter = plugin_traffic_control.RateLimiter(self.redis_client)
+        self.budget = plugin_traffic_control.Budget('scan', 3, 0.5)
+        self.now = 1000000.0
+
+    def _bucket_key(self, client_ip):
+        return str.format("{}scan:{}", plugin_traffic_control.BUCKET_KEY_PREFIX, client_ip)
+
+    def test_burst(self):
+        for i in range(0, 3):
+            self.assertEqual(0.0, self.limiter.take('1.2.3.4', self.budget, self.now))
+        # a token is refilled in 2 seconds
+        self.assertAlmostEqual(2.0, self.limiter.take('1.2.3.4', self.budget, self.now))
+        # the buckets are per client
+        self.assertEqual(0.0, self.limiter.take('1.2.3.5', self.budget, self.now))
+
+    def test_refill(self):
+        for i in range(0, 3):
+            self.limiter.take('1.2.3.4', self.budget, self.now)
+        self.assertAlmostEqual(1.0, self.limiter.take('1.2.3.4', self.budget, self.now + 1))
+        self.assertEqual(0.0, self.limiter.take('1.2.3.4', self.budget, self.now + 2))
+        self.assertAlmostEqual(2.0, self.limiter.take('1.2.3.4', self.budget, self.now + 2))
+        # never refilled beyond the capacity
+        for i in range(0, 3):
+            self.assertEqual(0.0, self.limiter.take('1.2.3.4', self.budget, self.now + 100))
+        self.assertGreater(self.limiter.take('1.2.3.4', self.budget, self.now + 100), 0)
+
+    def test_expiry(self):
+        self.limiter.take('1.2.3.4', self.budget, self.now)
+        # the bucket expires once it would be full again
+        ttl = self.redis_client.ttl(self._bucket_key('1.2.3.4'))
+        self.assertTrue(0 < ttl <= 7, ttl)
+        self.limiter.take('1.2.3.4', self.budget, self.now)
+        self.limiter.take('1.2.3.4', self.budget, self.now)
+        self.assertGreater(self.limiter.take('1.2.3.4', self.budget, self.now), 0)
+        # an expired bucket is full
+        self.redis_client.delete(self._bucket_key('1.2.3.4'))
+        self.assertEqual(0.0, self.limiter.take('1.2.3.4', self.budget, self.now))
+
+    def test_statistics(self):
+        for i in range(0, 4):
+            self.limiter.take('1.2.3.4', self.budget, self.now)
+        stats_key = str.format("{}{}", plugin_traffic_control.STATS_KEY_PREFIX, int(self.now // 60))
+        self.assertEqual({b'scan': b'3', b'scan:limited': b'1'}, self.redis_client.hgetall(stats_key))
+        self.assertTrue(0 < self.redis_client.ttl(stats_key) <= 86400)
+
+
+if __name__ == '__main__':
+    unittest.main()
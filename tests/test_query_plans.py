@@ -0,0 +1,110 @@
+import logging
+import re
+import unittest
+import sqlalchemy
+import dao
+
+MOTIF_VERSION = 1
+
+# The plan of a full table scan on sqlite, a scan using an index is "SCAN table USING [COVERING] INDEX ..."
+FULL_SCAN_PATTERN = re.compile(r'^SCAN (TABLE )?(\w+)$')
+
+
+class TestQueryPlans(unittest.TestCase):
+    '''Capture the statements of the DAO queries, and check none of them scans a whole table on sqlite'''
+
+    def setUp(self):
+        logging.getLogger('sqlalchemy').setLevel(logging.WARNING)
+        dao.Base.metadata.drop_all(dao.engine)
+        dao.Base.metadata.create_all(dao.engine)
+        for i in range(0, 10):
+            seq_id = str.format("SEQ{}", i)
+            motifs = [dao.motif.MotifEntityBase(j * 20, seq_id, 1.0, 0.1, 0.1) for j in range(0, 10)]
+            dao.add_seq(seq_id, 'SEQABCDEFG', MOTIF_VERSION, motifs, 'SP1')
+            dao.replace_nsites_by_seq_id(seq_id, [1, 5], [dao.nsite.S, dao.nsite.T])
+
+    def _capture_statements(self, func):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if not executemany and statement.lstrip().split()[0].upper() in {'SELECT', 'UPDATE', 'DELETE'}:
+                statements.append((statement, parameters))
+
+        sqlalchemy.event.listen(dao.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            func()
+        finally:
+            sqlalchemy.event.remove(dao.engine, 'before_cursor_execute', before_cursor_execute)
+        return statements
+
+    def assertNoFullScan(self, func):
+        statements = self._capture_statements(func)
+        self.assertTrue(len(statements) > 0)
+        table_names = set(dao.Base.metadata.tables.keys())
+        with dao.engine.connect() as conn:
+            for statement, parameters in statements:
+                plan = [row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + statement, parameters)]
+                for detail in plan:
+                    m = FULL_SCAN_PATTERN.match(detail)
+                    # the scans of the subqueries are not table scans
+                    if m is not None and m.group(2) in table_names:
+                        self.fail(str.format("Full table scan of {} in {}, plan {}", m.group(2), statement, plan))
+
+    def _mid(self, seq_id, offset):
+        return dao.find_motifs_by_offsets(seq_id, [offset], MOTIF_VERSION)[0].id
+
+    def test_query_sequences(self):
+        self.assertNoFullScan(lambda: dao.query_sequences_page(
+            {'page_index': 0, 'page_size': 5, 'keyword': None}, MOTIF_VERSION, with_tags=True))
+        self.assertNoFullScan(lambda: dao.query_sequences(
+            {'page_index': 0, 'page_size': 5, 'after': 'SEQ3'}, MOTIF_VERSION))
+        self.assertNoFullScan(lambda: dao.query_sequences(
+            {'page_index': 0, 'page_size': 5, 'species': ['SP1']}, MOTIF_VERSION))
+        self.assertNoFullScan(lambda: dao.query_sequences(
+            {'page_index': 0, 'page_size': 5, 'keyword': 'eq'}, MOTIF_VERSION))
+        self.assertNoFullScan(lambda: dao.query_sequences(
+            {'page_index': 0, 'page_size': 5, 'keyword': 'Seq1'}, MOTIF_VERSION))
+
+    def test_query_sequences_motif_filters(self):
+        self.assertNoFullScan(lambda: dao.query_sequences(
+            {'page_index': 0, 'page_size': 5, 'lrr_count_gt': 5}, MOTIF_VERSION))
+        self.assertNoFullScan(lambda: dao.query_sequences(
+            {'page_index': 0, 'page_size': 5, 'offsetlt': 100}, MOTIF_VERSION))
+        self.assertNoFullScan(lambda: dao.query_sequences(
+            {'page_index': 0, 'page_size': 5, 'offsetlt': 100, 'offsetgt': 20}, MOTIF_VERSION))
+        self.assertNoFullScan(lambda: dao.query_sequences(
+            {'page_index': 0, 'page_size': 5, 'offseteq': 20, 'lrr_count_gt': 0}, MOTIF_VERSION))
+
+    def test_find_motifs(self):
+        self.assertNoFullScan(lambda: dao.find_motifs_by_seq_ids(['SEQ1', 'SEQ2'], MOTIF_VERSION))
+        self.assertNoFullScan(lambda: dao.find_correct_motifs_by_seq_ids(['SEQ1', 'SEQ2'], MOTIF_VERSION))
+        self.assertNoFullScan(lambda: dao.find_motifs_by_offsets('SEQ1', [20, 40], MOTIF_VERSION))
+        self.assertNoFullScan(lambda: dao.find_motif_by_mid(1, MOTIF_VERSION))
+        self.assertNoFullScan(lambda: dao.find_seq_ids_by_motif_ids([1, 2], MOTIF_VERSION))
+        self.assertNoFullScan(lambda: dao.find_tags_by_motif_ids([1, 2]))
+
+    def test_find_seqs_and_nsites(self):
+        self.assertNoFullScan(lambda: dao.find_seq_by_id('SEQ1'))
+        self.assertNoFullScan(lambda: dao.find_seq_by_sid(1))
+        self.assertNoFullScan(lambda: dao.seq_exists('SEQ1'))
+        self.assertNoFullScan(lambda: dao.find_nsites_by_seq_ids(['SEQ1', 'SEQ2']))
+
+    def test_update_motifs(self):
+        self.assertNoFullScan(lambda: dao.add_manually_motif('SEQ1', 400, MOTIF_VERSION, 1.0, 0.1))
+        mid = self._mid('SEQ1', 400)
+        self.assertNoFullScan(lambda: dao.remove_manually_motif(mid, MOTIF_VERSION))
+        mid = self._mid('SEQ1', 20)
+        self.assertNoFullScan(lambda: dao.add_tags_by_names_to_ids({dao.tag.OVERLAP_TAG: [mid]}, MOTIF_VERSION))
+        self.assertNoFullScan(lambda: dao.replace_tags_by_motifs({mid: []}, MOTIF_VERSION))
+        self.assertNoFullScan(lambda: dao.replace_nsites_by_seq_id('SEQ1', [1, 9], [dao.nsite.S, dao.nsite.S]))
+        self.assertNoFullScan(lambda: dao.add_seq('SEQ10', 'SEQABCDEFG', MOTIF_VERSION,
+                                                  [dao.motif.MotifEntityBase(0, 'SEQ10', 1.0, 0.1, 0.1)], 'SP2'))
+
+    def test_update_false_discovery(self):
+        dao.add_seq('SEQ10', 'SEQABCDEFG', 2, [dao.motif.MotifEntityBase(0, 'SEQ10', 1.0, 0.1, 0.1)], 'SP2')
+        mid = dao.find_motifs_by_offsets('SEQ10', [0], 2)[0].id
+        self.assertNoFullScan(lambda: dao.update_false_discovery_by_motif(mid, True, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
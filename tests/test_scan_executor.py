@@ -0,0 +1,96 @@
+import random
+import unittest
+from tools.exception import ServiceUnavailableError
+from tools.pssm_matrix import PROTEIN_ALPHABET, calc_pssm_matrix
+from web_service.scan_executor import ScanExecutor, search_lrr
+
+LRR = 'LKNLDLSGNKLSGPIP'
+
+
+def random_seq(seq_len):
+    return ''.join([random.choice(PROTEIN_ALPHABET) for i in range(seq_len)])
+
+
+class TestScanExecutor(unittest.TestCase):
+    def setUp(self):
+        self.matrix = calc_pssm_matrix([LRR] * 20 + [random_seq(16) for i in range(0, 20)])
+        self.matrix.version = 'v1'
+        self.seq = random_seq(100) + LRR + random_seq(100)
+        self.executor = ScanExecutor(1, 1, 60)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_search(self):
+        self.assertEqual(search_lrr(self.matrix, self.seq), self.executor.search(self.matrix, self.seq))
+        self.assertEqual(search_lrr(self.matrix, self.seq[50:]), self.executor.search(self.matrix, self.seq[50:]))
+
+    def test_search_matrix_changed(self):
+        self.executor.search(self.matrix, self.seq)
+        pool = self.executor._pool
+        matrix = calc_pssm_matrix([LRR] * 40)
+        matrix.version = 'v2'
+        self.assertEqual(search_lrr(matrix, self.seq), self.executor.search(matrix, self.seq))
+        self.assertIsNot(pool, self.executor._pool)
+
+    def test_search_options(self):
+        self.assertEqual(search_lrr(self.matrix, self.seq, 0.01, 1),
+                         self.executor.search(self.matrix, self.seq, 0.01, 1))
+
+    def test_search_lengths(self):
+        self.executor.search(self.matrix, self.seq)
+        matrix = calc_pssm_matrix([LRR + 'SGNK'] * 20)
+        matrix.version = 'v3'
+        self.assertEqual(search_lrr(matrix, self.seq), self.executor.search(matrix, self.seq))
+        # the workers hold the matrices of both lengths
+        pool = self.executor._pool
+        self.assertEqual(search_lrr(self.matrix, self.seq), self.executor.search(self.matrix, self.seq))
+        self.assertIs(pool, self.executor._pool)
+
+    def test_search_preloaded_lengths(self):
+        matrix = calc_pssm_matrix([LRR + 'SGNK'] * 20)
+        matrix.version = 'v3'
+        executor = ScanExecutor(1, 1, 60, lambda: [self.matrix, matrix])
+        try:
+            self.assertEqual(search_lrr(self.matrix, self.seq), executor.search(self.matrix, self.seq))
+            # the first scan of the other length does not restart the workers
+            pool = executor._pool
+            self.assertEqual(search_lrr(matrix, self.seq), executor.search(matrix, self.seq))
+            self.assertIs(pool, executor._pool)
+        finally:
+            executor.shutdown()
+
+    def test_search_saturated(self):
+        # the worker and the queue are all occupied
+        self.executor._slots.acquire()
+        self.executor._slots.acquire()
+        with self.assertRaises(ServiceUnavailableError):
+            self.executor.search(self.matrix, self.seq)
+        self.executor._slots.release()
+        self.executor._slots.release()
+        self.executor.search(self.matrix, self.seq)
+
+    def test_search_pool_error(self):
+        def get_pool(matrix):
+            raise OSError("Too many open files")
+
+        self.executor._get_pool = get_pool
+        for i in range(0, 3):
+            with self.assertRaises(OSError):
+                self.executor.search(self.matrix, self.seq)
+        # the slots are released
+        del self.executor._get_pool
+        self.assertEqual(search_lrr(self.matrix, self.seq), self.executor.search(self.matrix, self.seq))
+
+    def test_search_timeout(self):
+        executor = ScanExecutor(1, 1, 0.001)
+        try:
+            # starting the worker process takes much longer than the timeout
+            with self.assertRaises(ServiceUnavailableError):
+                executor.search(self.matrix, self.seq)
+        finally:
+            executor.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
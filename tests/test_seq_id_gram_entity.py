@@ -0,0 +1,36 @@
+import logging
+from dao.seq_id_gram_entity import *
+import unittest
+
+SEQ_IDS = ['AT1G01010.1', 'AT1G01020.1', 'Os01g0100100', 'GLYMA_01G000100']
+
+
+class TestSeqIdGramEntity(unittest.TestCase):
+    def setUp(self):
+        logging.getLogger('sqlalchemy').setLevel(logging.DEBUG)
+        Base.metadata.drop_all(engine)
+        Base.metadata.create_all(engine)
+        with session_scope() as session:
+            add_grams(session, SEQ_IDS)
+
+    def _search(self, keyword):
+        with query_session() as session:
+            return set([row[0] for row in session.execute(select_seq_ids_by_keyword(keyword))])
+
+    def test_make_grams(self):
+        self.assertEqual({'at1', 't1g', '1g', 'g'}, make_grams('AT1G'))
+        self.assertEqual({'a'}, make_grams('A'))
+
+    def test_search_short_keyword(self):
+        self.assertEqual({'AT1G01010.1', 'AT1G01020.1'}, self._search('at'))
+        self.assertEqual({'AT1G01010.1', 'AT1G01020.1'}, self._search('.1'))
+        self.assertEqual({'Os01g0100100', 'GLYMA_01G000100'}, self._search('00'))
+        self.assertEqual(set(SEQ_IDS), self._search('G'))
+        self.assertEqual(set(), self._search('zz'))
+
+    def test_search_long_keyword(self):
+        # the candidates have all the grams, they are checked by the caller
+        self.assertEqual({'AT1G01020.1'}, self._search('01020'))
+        self.assertEqual({'AT1G01010.1', 'AT1G01020.1'}, self._search('at1g010'))
+        self.assertEqual(set(), self._search('at2g'))
+        self.assertIsNone(select_seq_ids_by_keyword(''))
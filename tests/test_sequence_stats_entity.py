@@ -0,0 +1,51 @@
+import logging
+from dao.sequence_stats_entity import *
+from dao.motif_entity import MotifEntityBase, add_motifs
+from dao.nsite_entity import replace_nsites_by_seq_id, S, T
+import unittest
+
+
+class TestSequenceStatsEntity(unittest.TestCase):
+    def setUp(self):
+        logging.getLogger('sqlalchemy').setLevel(logging.DEBUG)
+        Base.metadata.drop_all(engine)
+        Base.metadata.create_all(engine)
+        with session_scope() as session:
+            add_motifs(session, [MotifEntityBase(offset, 'SEQ1', 1.0, 0.1, 0.1) for offset in [10, 20, 60]], 1)
+            add_motifs(session, [MotifEntityBase(100, 'SEQ1', 1.0, 0.1, 0.1, correct=False)], 1)
+            replace_nsites_by_seq_id(session, 'SEQ1', [1, 5], [S, T])
+
+    def test_calc_covered_residues(self):
+        self.assertEqual(0, calc_covered_residues([]))
+        self.assertEqual(16, calc_covered_residues([5]))
+        self.assertEqual(32, calc_covered_residues([0, 16]))
+        self.assertEqual(26, calc_covered_residues([10, 0]))
+        self.assertEqual(16, calc_covered_residues([0, 0]))
+
+    def test_refresh_stats(self):
+        with session_scope() as session:
+            refresh_stats(session, ['SEQ1', 'SEQ2'], 1)
+        with query_session() as session:
+            seq_ids_to_stats = dict([(s.seq_id, s) for s in find_stats_by_seq_ids(session, ['SEQ1', 'SEQ2'], 1)])
+            self.assertEqual({'SEQ1', 'SEQ2'}, seq_ids_to_stats.keys())
+            seq1_stats = seq_ids_to_stats['SEQ1']
+            self.assertEqual(3, seq1_stats.lrr_count)
+            self.assertEqual(10, seq1_stats.min_offset)
+            self.assertEqual(60, seq1_stats.max_offset)
+            self.assertEqual(2, seq1_stats.nsite_count)
+            self.assertEqual(42, seq1_stats.covered_residues)
+            self.assertEqual(0, seq_ids_to_stats['SEQ2'].lrr_count)
+            self.assertIsNone(seq_ids_to_stats['SEQ2'].min_offset)
+            self.assertEqual([], find_stats_by_seq_ids(session, ['SEQ1'], 2))
+
+    def test_update_nsite_count(self):
+        with session_scope() as session:
+            refresh_stats(session, ['SEQ1'], 1)
+            refresh_stats(session, ['SEQ1'], 2)
+        with session_scope() as session:
+            replace_nsites_by_seq_id(session, 'SEQ1', [1, 5, 9], [S, T, T])
+            update_nsite_count(session, 'SEQ1')
+        with query_session() as session:
+            self.assertEqual(3, find_stats_by_seq_ids(session, ['SEQ1'], 1)[0].nsite_count)
+            self.assertEqual(3, find_stats_by_seq_ids(session, ['SEQ1'], 2)[0].nsite_count)
+            self.assertEqual(0, find_stats_by_seq_ids(session, ['SEQ1'], 2)[0].lrr_count)
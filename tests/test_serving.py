@@ -0,0 +1,47 @@
+import sys
+import unittest
+from unittest import mock
+from web_service import serving
+from settings import server
+
+
+class TestServing(unittest.TestCase):
+    def setUp(self):
+        self.engine = server.engine
+
+    def tearDown(self):
+        server.engine = self.engine
+
+    def test_threaded_server_class(self):
+        server_class = serving._threaded_server_class(128)
+        self.assertEqual(128, server_class.request_queue_size)
+        self.assertTrue(server_class.daemon_threads)
+
+    def test_run_engines(self):
+        with mock.patch('bottle.run') as run:
+            server.engine = 'threaded'
+            serving.run()
+            self.assertEqual('wsgiref', run.call_args[1]['server'])
+            self.assertIn('server_class', run.call_args[1])
+
+            server.engine = 'gunicorn'
+            with mock.patch.dict(sys.modules, {'gunicorn': mock.MagicMock()}):
+                serving.run()
+            self.assertEqual('gunicorn', run.call_args[1]['server'])
+            self.assertEqual(server.workers, run.call_args[1]['workers'])
+
+    def test_run_gunicorn_not_installed(self):
+        server.engine = 'gunicorn'
+        with mock.patch('bottle.run') as run, mock.patch.dict(sys.modules, {'gunicorn': None}):
+            with self.assertRaises(ImportError):
+                serving.run()
+            run.assert_not_called()
+
+    def test_run_unknown_engine(self):
+        server.engine = 'unknown'
+        with self.assertRaises(ValueError):
+            serving.run()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,3 +11,9 @@ class ErrorCode(object):
     OBJECT_NOT_EXISTS = "Does not exits: {}"
     OFFSET_OVERLAP = "The offset is overlapped with current motifs"
     OFFSET_EXISTS_WRONG = "The offset has been marked wrong previously, you can unmark it directly"
+
+
+class ServiceUnavailableError(Exception):
+    def __init__(self, message, retry_after=None):
+        self.message = message
+        self.retry_after = retry_after
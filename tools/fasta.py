@@ -1,4 +1,7 @@
 
+VALID_AMINOS = frozenset('ARNDCEQGHVILKMFPSTWY')
+
+
 class Seq(object):
     def __init__(self):
         self.seq_id = None
@@ -7,14 +10,48 @@ class Seq(object):
 
 
 def _analyse_first_line(line):
-    line.replace(">", "")
+    '''The ID is the first word of the header line, the others are the description'''
+    eles = line[1:].strip().split(None, 1)
+    if len(eles) == 0:
+        raise ValueError(str.format("No sequence ID in line {}", line))
+    return eles[0], eles[1] if len(eles) > 1 else ''
 
 
-def read_in_all_seqs(buf):
-    seq_ids_to_seq = {}
+def read_seqs(lines):
+    '''
+    Read the sequences one by one, the whole file is never kept in memory
+    :param lines: the lines of the fasta, e.g. an opened file
+    :return: the generator of Seq, the letters are upper case
+    '''
     seq = None
-    for line in buf.splitlines():
-        if line.startswith(">"):
+    seq_lines = []
+    for line in lines:
+        line = line.strip()
+        if len(line) == 0:
+            continue
+        if line.startswith('>'):
             if seq is not None:
-                seq_ids_to_seq[seq.seq_id] = seq
+                seq.seq = ''.join(seq_lines).upper()
+                yield seq
             seq = Seq()
+            seq.seq_id, seq.description = _analyse_first_line(line)
+            seq_lines = []
+        elif seq is None:
+            raise ValueError(str.format("The fasta does not start with a header line: {}", line))
+        else:
+            seq_lines.append(line)
+    if seq is not None:
+        seq.seq = ''.join(seq_lines).upper()
+        yield seq
+
+
+def read_in_all_seqs(buf):
+    seq_ids_to_seq = {}
+    for seq in read_seqs(buf.splitlines()):
+        seq_ids_to_seq[seq.seq_id] = seq
+    return seq_ids_to_seq
+
+
+def find_invalid_aminos(seq_str):
+    '''The letters that are not one of the 20 standard amino acids'''
+    return set(seq_str) - VALID_AMINOS
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*
+# THIS FILE IS PART OF phytolrr.com PROJECT.
+# Copyright 2019-2021 phytolrr.com. All rights reserved.
+
+'''Store the computed PSSM matrices in files or redis, keyed by the hash of the motifs they are generated from.'''
+
+import hashlib
+import io
+import logging
+import os
+import numpy
+import redis
+from settings import cache
+from tools import pssm_matrix
+from tools import pvalues
+from tools import motifs as motif_tools
+from tools.redis_client import get_redis_client
+
+REDIS_KEY_PREFIX = 'phytolrr:matrix:'
+
+
+def motifs_hash(motif_seqs_str):
+    '''The content hash of the motifs, independent of the order of the motifs'''
+    sha = hashlib.sha1()
+    for motif_seq_str in sorted(motif_seqs_str):
+        sha.update(motif_seq_str.encode('ascii'))
+        sha.update(b'\n')
+    return sha.hexdigest()
+
+
+def matrix_to_bytes(matrix):
+    alphabet, table = motif_tools.build_score_table(matrix)
+    arrays = {'alphabet': numpy.frombuffer(alphabet.encode('ascii'), dtype=numpy.uint8), 'table': table}
+    if matrix.pvalue_table is not None:
+        arrays['pvalues'] = matrix.pvalue_table.pvalues
+        arrays['pvalue_grid'] = numpy.array([matrix.pvalue_table.start, matrix.pvalue_table.resolution,
+                                             matrix.pvalue_table.margin])
+    buf = io.BytesIO()
+    numpy.savez(buf, **arrays)
+    return buf.getvalue()
+
+
+def matrix_from_bytes(buf, version=None):
+    arrays = numpy.load(io.BytesIO(buf), allow_pickle=False)
+    alphabet = arrays['alphabet'].tobytes().decode('ascii')
+    table = arrays['table']
+    pssm = dict([(letter, table[i].tolist()) for i, letter in enumerate(alphabet)])
+    pvalue_table = None
+    if 'pvalues' in arrays.files:
+        start, resolution, margin = arrays['pvalue_grid'].tolist()
+        pvalue_table = pvalues.PValueTable(start, resolution, arrays['pvalues'], margin)
+    return pssm_matrix.Matrix(table.shape[1], pssm, version=version, pvalue_table=pvalue_table)
+
+
+class MatrixStore(object):
+    def __init__(self, path=None, redis_client=None):
+        self.path = path
+        self.redis_client = redis_client
+
+    def _file_path(self, key):
+        return os.path.join(self.path, key + '.npz')
+
+    def load(self, key):
+        buf = None
+        if self.redis_client is not None:
+            try:
+                buf = self.redis_client.get(REDIS_KEY_PREFIX + key)
+            except redis.RedisError as e:
+                logging.warning(str.format("Failed to load matrix {} from redis: {}", key, e))
+        if buf is None and self.path is not None and os.path.isfile(self._file_path(key)):
+            with open(self._file_path(key), 'rb') as f:
+                buf = f.read()
+        if buf is None:
+            return None
+        return matrix_from_bytes(buf, version=key)
+
+    def save(self, key, matrix):
+        buf = matrix_to_bytes(matrix)
+        if self.redis_client is not None:
+            try:
+                self.redis_client.set(REDIS_KEY_PREFIX + key, buf)
+            except redis.RedisError as e:
+                logging.warning(str.format("Failed to save matrix {} to redis: {}", key, e))
+        if self.path is not None:
+            # write to a temporary file first, other processes never read a partial file
+            tmp_path = str.format("{}.{}.tmp", self._file_path(key), os.getpid())
+            with open(tmp_path, 'wb') as f:
+                f.write(buf)
+            os.replace(tmp_path, self._file_path(key))
+
+
+_default_store = None
+
+
+def get_default_store():
+    global _default_store
+    if _default_store is None:
+        path = cache.matrix_path
+        if path is not None and not os.path.isdir(path):
+            logging.error(str.format("The matrix path {} does not exists", path))
+            path = None
+        _default_store = MatrixStore(path, get_redis_client())
+    return _default_store
+
+
+def get_matrix(motif_seqs_str, store=None, with_pvalue_table=False):
+    '''
+    Get the PSSM matrix of the motifs from the store, the matrix is calculated and saved if not found
+    :param store: MatrixStore, the default store configured in settings.cache is used if None
+    :param with_pvalue_table: the p-value table of the matrix is calculated and saved too if not stored yet,
+    the matrix may still have the table without it if the table was stored before
+    '''
+    if store is None:
+        store = get_default_store()
+    key = motifs_hash(motif_seqs_str)
+    matrix = store.load(key)
+    if matrix is not None and (matrix.pvalue_table is not None or not with_pvalue_table):
+        logging.debug(str.format("Load matrix {} from store", key))
+        return matrix
+
+    if matrix is None:
+        logging.info(str.format("Matrix {} not found in store, calculate it from {} motifs",
+                                key, len(motif_seqs_str)))
+        matrix = pssm_matrix.calc_pssm_matrix(motif_seqs_str)
+        matrix.version = key
+    else:
+        logging.info(str.format("Calculate the p-value table of matrix {}", key))
+    if with_pvalue_table:
+        matrix.pvalue_table = pvalues.calc_pvalue_table(matrix)
+    store.save(key, matrix)
+    return matrix
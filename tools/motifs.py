@@ -1,9 +1,48 @@
 # -*- coding: utf-8 -*
+import bisect
 import math
 import logging
+import threading
+import time
+from collections import OrderedDict
 import numpy
 
 
+# The FDR level of the BH procedure
+FDR_ALPHA = 0.05
+
+# The kernels summing the PSSM scores of the windows:
+# gather: one lookup per residue, the same summation order(and results) as calc_pssm_score
+# block: one lookup per BLOCK_SIZE residues in the precomputed block tables, the scores are summed in another order,
+#   so they may differ from calc_pssm_score in the last bits, never more than kernel_tolerance of the matrix
+# auto: the faster one of each matrix, benchmarked the first time the matrix is used, so the scores are only
+#   bit-identical to calc_pssm_score if gather is chosen, use gather where the scores must be reproduced exactly
+KERNEL_GATHER = 'gather'
+KERNEL_BLOCK = 'block'
+KERNEL_AUTO = 'auto'
+KERNELS = (KERNEL_GATHER, KERNEL_BLOCK, KERNEL_AUTO)
+BLOCK_SIZE = 4
+# The length of the random sequence to benchmark the kernels
+BENCHMARK_SEQ_LENGTH = 200000
+# The max count of the matrices whose block tables are kept
+PREPARED_TABLES_SIZE = 8
+
+_kernel = KERNEL_GATHER
+_prepared_tables = OrderedDict()
+_prepared_tables_lock = threading.Lock()
+
+
+def set_kernel(kernel):
+    global _kernel
+    if kernel not in KERNELS:
+        raise ValueError(str.format("Unknown kernel {}, must be one of {}", kernel, KERNELS))
+    _kernel = kernel
+
+
+def get_kernel():
+    return _kernel
+
+
 def calc_probability_by_score(score):
     return float(numpy.power(2, score * -1))
 
@@ -27,72 +66,412 @@ def calc_pssm_score(seq, m):
     return score
 
 
+def build_score_table(m):
+    """
+    Convert the dict-of-lists pssm of the matrix to a (alphabet x length) array
+    :return: the alphabet (letters ordered as the rows) and the score table
+    """
+    alphabet = ''.join(sorted(m.pssm.keys()))
+    table = numpy.array([m.pssm[letter][:m.length] for letter in alphabet], dtype=numpy.float64)
+    return alphabet, table
+
+
+def build_score_tables(matrices):
+    """
+    Stack the score tables of the matrices, they must have the same length and letters
+    :return: the alphabet and the (matrices x alphabet x length) score tables
+    """
+    tables = [build_score_table(m) for m in matrices]
+    if len(tables) == 0:
+        raise ValueError("No matrix to stack")
+    alphabet = tables[0][0]
+    for i, (matrix_alphabet, table) in enumerate(tables):
+        if matrix_alphabet != alphabet or matrices[i].length != matrices[0].length:
+            raise ValueError(str.format("The matrix {} differs from the first one in letters or length", i))
+    return alphabet, numpy.stack([table for matrix_alphabet, table in tables])
+
+
+def encode_seq(seq, alphabet):
+    """
+    Encode the sequence to an int8 array, each amino is replaced by its row index in the alphabet
+    """
+    lookup = numpy.full(256, -1, dtype=numpy.int8)
+    lookup[numpy.frombuffer(alphabet.encode('ascii'), dtype=numpy.uint8)] = numpy.arange(len(alphabet))
+    codes = lookup[numpy.frombuffer(seq.encode('ascii', 'replace'), dtype=numpy.uint8)]
+    invalid = numpy.flatnonzero(codes < 0)
+    if len(invalid) > 0:
+        raise KeyError(seq[invalid[0]])
+    return codes
+
+
+def encode_seqs(seqs, alphabet):
+    """
+    Encode the sequences into one int8 buffer
+    :return: the buffer, and the start position of each sequence in it (with the total length appended)
+    """
+    starts = numpy.zeros(len(seqs) + 1, dtype=numpy.int64)
+    numpy.cumsum([len(seq) for seq in seqs], out=starts[1:])
+    return encode_seq(''.join(seqs), alphabet), starts
+
+
+def _sum_window_scores(codes, table):
+    # The columns are accumulated one by one, so the summation order (and the result)
+    # is exactly the same as calc_pssm_score on each window.
+    length = table.shape[1]
+    count = len(codes) - length + 1
+    if count <= 0:
+        return numpy.zeros(0, dtype=numpy.float64)
+    columns = numpy.ascontiguousarray(table.T)
+    scores = numpy.zeros(count, dtype=numpy.float64)
+    for i in range(0, length):
+        scores += columns[i][codes[i:i + count]]
+    return scores
+
+
+def _sum_window_scores_by_tables(codes, tables):
+    # the same as _sum_window_scores on each table, a row of the scores per table
+    length = tables.shape[2]
+    count = len(codes) - length + 1
+    if count <= 0:
+        return numpy.zeros((len(tables), 0), dtype=numpy.float64)
+    columns = numpy.ascontiguousarray(tables.transpose(2, 0, 1))
+    scores = numpy.zeros((len(tables), count), dtype=numpy.float64)
+    for i in range(0, length):
+        scores += columns[i][:, codes[i:i + count]]
+    return scores
+
+
+def build_block_tables(table, block_size=BLOCK_SIZE):
+    """
+    Precompute the scores of all the blocks of block_size residues, for each block of the columns
+    :return: (blocks x alphabet^block_size) array, the code of a block is its residue codes in base len(alphabet)
+    """
+    letters = table.shape[0]
+    block_tables = []
+    for start in range(0, table.shape[1] - block_size + 1, block_size):
+        scores = numpy.zeros((1, ) * block_size, dtype=numpy.float64)
+        for j in range(0, block_size):
+            shape = [1] * block_size
+            shape[j] = letters
+            scores = scores + table[:, start + j].reshape(shape)
+        block_tables.append(scores.ravel())
+    return numpy.array(block_tables, dtype=numpy.float64).reshape(len(block_tables), letters ** block_size)
+
+
+def _sum_window_scores_by_blocks(codes, table, block_tables, block_size=BLOCK_SIZE):
+    # the columns not in a full block are accumulated one by one
+    length = table.shape[1]
+    count = len(codes) - length + 1
+    if count <= 0:
+        return numpy.zeros(0, dtype=numpy.float64)
+    letters = table.shape[0]
+    block_count = len(codes) - block_size + 1
+    block_codes = numpy.zeros(block_count, dtype=numpy.intp)
+    for j in range(0, block_size):
+        block_codes *= letters
+        block_codes += codes[j:j + block_count]
+    scores = numpy.zeros(count, dtype=numpy.float64)
+    for b in range(0, len(block_tables)):
+        scores += block_tables[b][block_codes[b * block_size:b * block_size + count]]
+    columns = numpy.ascontiguousarray(table.T)
+    for i in range(len(block_tables) * block_size, length):
+        scores += columns[i][codes[i:i + count]]
+    return scores
+
+
+def kernel_tolerance(table):
+    """
+    The max difference between the scores of a window by the kernels: each kernel sums the columns by at most
+    length additions, and the error of each addition is bound by the unit roundoff of the sum of the max absolute
+    scores of the columns
+    """
+    return 2 * table.shape[1] * numpy.finfo(numpy.float64).eps * numpy.abs(table).max(axis=0).sum()
+
+
+def benchmark_kernels(table, seq_length=BENCHMARK_SEQ_LENGTH, repeat=3, block_tables=None):
+    """
+    Time the kernels on a random sequence
+    :return: the best seconds of each kernel by name
+    """
+    if block_tables is None:
+        block_tables = build_block_tables(table)
+    codes = numpy.random.RandomState(0).randint(0, table.shape[0], seq_length).astype(numpy.int8)
+    kernels = {
+        KERNEL_GATHER: lambda: _sum_window_scores(codes, table),
+        KERNEL_BLOCK: lambda: _sum_window_scores_by_blocks(codes, table, block_tables),
+    }
+    kernels_to_seconds = {}
+    for name, kernel in kernels.items():
+        seconds = []
+        for i in range(0, repeat):
+            start = time.perf_counter()
+            kernel()
+            seconds.append(time.perf_counter() - start)
+        kernels_to_seconds[name] = min(seconds)
+    return kernels_to_seconds
+
+
+def _prepare_tables(table, choose_kernel=False):
+    """
+    The block tables of the table, and the kernel chosen for it by the benchmark if choose_kernel(else None),
+    kept for the last PREPARED_TABLES_SIZE tables
+    :return: [block_tables, kernel]
+    """
+    key = table.tobytes()
+    with _prepared_tables_lock:
+        prepared = _prepared_tables.get(key, None)
+        if prepared is not None:
+            _prepared_tables.move_to_end(key)
+    if prepared is not None and (prepared[1] is not None or not choose_kernel):
+        return prepared
+
+    if prepared is None:
+        prepared = [build_block_tables(table), None]
+    if choose_kernel:
+        kernels_to_seconds = benchmark_kernels(table, block_tables=prepared[0])
+        prepared[1] = min(kernels_to_seconds, key=kernels_to_seconds.get)
+        logging.info(str.format("Kernel {} is chosen for the matrix, seconds of the kernels: {}",
+                                prepared[1], kernels_to_seconds))
+    with _prepared_tables_lock:
+        _prepared_tables[key] = prepared
+        while len(_prepared_tables) > PREPARED_TABLES_SIZE:
+            _prepared_tables.popitem(last=False)
+    return prepared
+
+
+def _sum_window_scores_by_kernel(codes, table):
+    # the kernel set by set_kernel
+    if _kernel == KERNEL_GATHER or table.shape[1] < BLOCK_SIZE:
+        return _sum_window_scores(codes, table)
+    block_tables, kernel = _prepare_tables(table, _kernel == KERNEL_AUTO)
+    if _kernel == KERNEL_BLOCK or kernel == KERNEL_BLOCK:
+        return _sum_window_scores_by_blocks(codes, table, block_tables)
+    return _sum_window_scores(codes, table)
+
+
+def calc_pssm_scores(seq, m):
+    """
+    Calculate the PSSM score of every window of the sequence at once.
+    :return: float64 array, the i-th element is the score of seq[i:i+m.length]
+    """
+    if len(seq) < m.length:
+        return numpy.zeros(0, dtype=numpy.float64)
+    alphabet, table = build_score_table(m)
+    return _sum_window_scores_by_kernel(encode_seq(seq, alphabet), table)
+
+
 def generate_motifs_with_pssm_score(seq, m):
-    motifs = []
-    count = 0
-    for i in range(0, len(seq) - m.length + 1):
-        sub_seq = seq[i:i + m.length]
-        count += 1
-        m_score = Motif(i, None, calc_pssm_score(sub_seq, m))
-        motifs.append(m_score)
-    return motifs
+    scores = calc_pssm_scores(seq, m)
+    return [Motif(i, None, score) for i, score in enumerate(scores.tolist())]
+
+
+def calc_probabilities_by_scores(scores, pvalue_table=None):
+    if pvalue_table is not None:
+        return pvalue_table.lookup(scores)
+    return numpy.power(2.0, -scores)
 
 
-def _fdr_procedure(motifs):
-    motifs.sort(key=lambda k: k.probability, reverse=True)
-    for i, motif in enumerate(motifs):
-        motif.fdr_probability = 0.05 * i / len(motifs)
-    return [m for m in motifs if m.probability < m.fdr_probability]
+def fdr_procedure(probabilities, window_counts=None, alpha=FDR_ALPHA):
+    """
+    The BH procedure(FDR) on the probabilities of the windows.
+    :param window_counts: the windows count of each sequence if the probabilities are of many sequences,
+    the windows of a sequence must be adjacent, and the procedure is done in each sequence separately
+    :param alpha: the FDR level
+    :return: the indexes of the found windows ordered by probability descending,
+    and the fdr_probability of every window
+    """
+    if window_counts is None:
+        window_counts = numpy.array([len(probabilities)])
+    window_starts = numpy.cumsum(window_counts) - window_counts
+    seq_indexes = numpy.repeat(numpy.arange(len(window_counts)), window_counts)
 
+    # stable sort, the windows with the same probability are kept in offset order
+    order = numpy.lexsort((-probabilities, seq_indexes))
+    ranks = numpy.arange(len(order)) - numpy.repeat(window_starts, window_counts)
+    fdr_probabilities = numpy.empty(len(order), dtype=numpy.float64)
+    fdr_probabilities[order] = alpha * ranks / numpy.repeat(window_counts, window_counts)
+    found = order[probabilities[order] < fdr_probabilities[order]]
+    return found, fdr_probabilities
 
-def lrr_search(matrix, seq):
+
+def _fdr_procedure(motifs, alpha=FDR_ALPHA):
+    probabilities = numpy.array([m.probability for m in motifs], dtype=numpy.float64)
+    found, fdr_probabilities = fdr_procedure(probabilities, alpha=alpha)
+    for m, fdr_probability in zip(motifs, fdr_probabilities.tolist()):
+        m.fdr_probability = fdr_probability
+    return [motifs[i] for i in found]
+
+
+def lrr_search(matrix, seq, alpha=FDR_ALPHA):
     # generate the PSSM score and probability
     logging.debug("Begin to generate the PSSM score and probability...")
-    motifs_score = generate_motifs_with_pssm_score(seq, matrix)
+    return lrr_search_by_scores(calc_pssm_scores(seq, matrix), alpha)
+
+
+def lrr_search_by_scores(scores, alpha=FDR_ALPHA, pvalue_table=None):
+    """
+    Find the LRR motifs by the scores of all the windows of a sequence, e.g. a stored score track
+    :param pvalue_table: the probabilities are the exact p-values looked up in the table if not None,
+    see pvalues.calc_pvalue_table
+    """
+    probabilities = calc_probabilities_by_scores(scores, pvalue_table)
 
     # FDR procedure
     logging.debug("Do the BH procedure(FDR)")
-    return _fdr_procedure(motifs_score)
+    found, fdr_probabilities = fdr_procedure(probabilities, alpha=alpha)
+    motifs = []
+    for i in found.tolist():
+        m = Motif(i, None, float(scores[i]))
+        m.probability = float(probabilities[i])
+        m.fdr_probability = float(fdr_probabilities[i])
+        motifs.append(m)
+    return motifs
 
 
-def get_highest_score_recursively(current_index, offsets, total_score, last_score, length, motifs):
-    if current_index >= len(motifs):
-        return total_score, offsets
+class LrrSearchResult(object):
+    """
+    The motifs found by lrr_search_batch, stored column by column and ordered by (seq_index, offset)
+    """
+    def __init__(self, seq_indexes, offsets, scores, probabilities, fdr_probabilities, window_scores=None):
+        self.seq_indexes = seq_indexes
+        self.offsets = offsets
+        self.scores = scores
+        self.probabilities = probabilities
+        self.fdr_probabilities = fdr_probabilities
+        # the scores of all the windows of each sequence, if requested
+        self.window_scores = window_scores
 
-    current_motif = motifs[current_index]
+    def __len__(self):
+        return len(self.offsets)
 
-    if offsets[-1] + length <= current_motif.offset:
-        offsets.append(current_motif.offset)
-        return get_highest_score_recursively(current_index + 1, offsets,
-                                             total_score + current_motif.score, current_motif.score,
-                                             length, motifs)
-    else:
-        # 出现重叠，干掉自己或者干掉上一个看看那个score更高
-        return max(
-            # 干掉自己
-            get_highest_score_recursively(current_index + 1, offsets[:],
-                                          total_score, last_score,
-                                          length, motifs),
+    def to_motifs(self, seq_index, seq_id=None):
+        start, end = numpy.searchsorted(self.seq_indexes, [seq_index, seq_index + 1])
+        motifs = []
+        for i in range(start, end):
+            m = Motif(int(self.offsets[i]), seq_id, float(self.scores[i]))
+            m.probability = float(self.probabilities[i])
+            m.fdr_probability = float(self.fdr_probabilities[i])
+            motifs.append(m)
+        return motifs
 
-            # 干掉上一个
-            get_highest_score_recursively(current_index + 1, offsets[:-1] + [current_motif.offset],
-                                          total_score - last_score + current_motif.score, current_motif.score,
-                                          length, motifs),
 
-            key=lambda x: x[0]
-        )
+def lrr_search_batch(matrix, seqs, with_window_scores=False, pvalue_table=None):
+    """
+    Search the LRR motifs of many sequences in one vectorized pass,
+    the FDR procedure is still done for each sequence separately.
+    The scores of all the windows are kept in memory, split huge inputs into chunks.
+    :param with_window_scores: keep the scores of all the windows of each sequence in the result
+    :param pvalue_table: the probabilities are the exact p-values looked up in the table if not None
+    :return: LrrSearchResult
+    """
+    alphabet, table = build_score_table(matrix)
+    codes, starts = encode_seqs(seqs, alphabet)
+    all_scores = _sum_window_scores_by_kernel(codes, table)
+
+    window_counts, seq_indexes, offsets, positions = _windows_of_seqs(starts, matrix.length)
+    scores = all_scores[positions]
+    window_scores = None
+    if with_window_scores:
+        window_scores = _split_by_seqs(scores, window_counts)
+    return _search_windows(scores, seq_indexes, offsets, window_counts, window_scores=window_scores,
+                           pvalue_table=pvalue_table)
+
+
+def _windows_of_seqs(starts, length):
+    """
+    The windows in the buffer of the encoded sequences, the windows across two sequences are dropped
+    :return: the windows count of each sequence, the seq_index, offset and the position in the buffer of each window
+    """
+    window_counts = numpy.maximum(numpy.diff(starts) - length + 1, 0)
+    window_starts = numpy.cumsum(window_counts) - window_counts
+    seq_indexes = numpy.repeat(numpy.arange(len(window_counts)), window_counts)
+    offsets = numpy.arange(len(seq_indexes)) - numpy.repeat(window_starts, window_counts)
+    return window_counts, seq_indexes, offsets, numpy.repeat(starts[:-1], window_counts) + offsets
+
+
+def _split_by_seqs(values, window_counts):
+    # the values of the windows split into one array per sequence
+    if len(window_counts) == 0:
+        return []
+    return numpy.split(values, numpy.cumsum(window_counts)[:-1])
+
+
+def _search_windows(scores, seq_indexes, offsets, window_counts, alpha=FDR_ALPHA, window_scores=None,
+                    pvalue_table=None):
+    probabilities = calc_probabilities_by_scores(scores, pvalue_table)
+    found, fdr_probabilities = fdr_procedure(probabilities, window_counts, alpha)
+    found.sort()
+    return LrrSearchResult(seq_indexes[found], offsets[found], scores[found],
+                           probabilities[found], fdr_probabilities[found], window_scores)
+
+
+class MultiLrrSearchResult(object):
+    """
+    The motifs found by lrr_search_batch_by_matrices
+    """
+    def __init__(self, results, best_matrix_indexes):
+        # LrrSearchResult of each matrix, in the order of the matrices
+        self.results = results
+        # the index of the matrix of the highest score of each window, an array per sequence
+        self.best_matrix_indexes = best_matrix_indexes
+
+    def __len__(self):
+        return len(self.results)
+
+
+def lrr_search_batch_by_matrices(matrices, seqs, alpha=FDR_ALPHA):
+    """
+    Search the LRR motifs of many sequences by a stack of matrices(e.g. one per subgroup) in one pass,
+    the results of each matrix are the same as lrr_search_batch.
+    The scores of all the windows by all the matrices are kept in memory, split huge inputs into chunks.
+    :param matrices: the matrices of the same length and letters
+    :return: MultiLrrSearchResult, the first matrix is the best one of a window if the highest scores are equal
+    """
+    alphabet, tables = build_score_tables(matrices)
+    codes, starts = encode_seqs(seqs, alphabet)
+    all_scores = _sum_window_scores_by_tables(codes, tables)
+
+    window_counts, seq_indexes, offsets, positions = _windows_of_seqs(starts, matrices[0].length)
+    scores = all_scores[:, positions]
+    results = [_search_windows(matrix_scores, seq_indexes, offsets, window_counts, alpha)
+               for matrix_scores in scores]
+    return MultiLrrSearchResult(results, _split_by_seqs(numpy.argmax(scores, axis=0), window_counts))
 
 
 def get_highest_score_without_overlay(motifs, length):
+    """
+    Find the non-overlapped motifs with the highest total score (weighted interval scheduling).
+    :return: the highest total score, and the chosen motifs ordered by offset
+    """
     ordered_motifs = list(motifs)
     ordered_motifs.sort(key=lambda m: m.offset)
+    offsets = [m.offset for m in ordered_motifs]
+
+    # best_scores[i] is the highest score of the first i motifs,
+    # previous[i] is the count of motifs ending before the i-th motif starts
+    best_scores = [0.0] * (len(ordered_motifs) + 1)
+    previous = [0] * len(ordered_motifs)
+    chosen = [False] * len(ordered_motifs)
+    for i, m in enumerate(ordered_motifs):
+        previous[i] = bisect.bisect_right(offsets, m.offset - length, 0, i)
+        score_with_current = best_scores[previous[i]] + m.score
+        if score_with_current > best_scores[i]:
+            best_scores[i + 1] = score_with_current
+            chosen[i] = True
+        else:
+            best_scores[i + 1] = best_scores[i]
 
-    offsets = [ordered_motifs[0].offset]
-    score = ordered_motifs[0].score
-    score, no_overlap_offsets = get_highest_score_recursively(1, offsets, score, score, length, ordered_motifs)
-    no_overlap_offsets = set(no_overlap_offsets)
+    no_overlap_motifs = []
+    i = len(ordered_motifs)
+    while i > 0:
+        if chosen[i - 1]:
+            no_overlap_motifs.append(ordered_motifs[i - 1])
+            i = previous[i - 1]
+        else:
+            i -= 1
+    no_overlap_motifs.reverse()
 
-    return score, [m for m in ordered_motifs if m.offset in no_overlap_offsets]
+    return best_scores[-1], no_overlap_motifs
 
 
 def found_no_overlapped_motifs(motifs, length=16):
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*
+# THIS FILE IS PART OF phytolrr.com PROJECT.
+# Copyright 2019-2021 phytolrr.com. All rights reserved.
+
+'''Find the N-glycosylation sites (sequons, N-X-S/T where X is not P) of the sequences in one pass'''
+
+import re
+
+NSITE_PATTERN = r"N[A-OQ-Z][ST]"
+
+# The type of a nsite by its last letter, the same as dao.nsite_entity
+S = 0
+T = 1
+LETTERS_TO_NTYPE = {'S': S, 'T': T}
+
+
+class NSiteScanner(object):
+    def __init__(self, pattern=NSITE_PATTERN, overlapping=False):
+        '''
+        :param pattern: the regex of the sequon, the type of a site is its last letter(S or T)
+        :param overlapping: find the overlapping sites, e.g. both NNS and NST in NNST
+        '''
+        self.pattern = pattern
+        self.overlapping = overlapping
+        if overlapping:
+            # a lookahead matches nothing, so the next search starts from the next letter
+            self._regex = re.compile(str.format("(?=({}))", pattern))
+        else:
+            self._regex = re.compile(str.format("({})", pattern))
+
+    def search(self, seq_str):
+        '''
+        :return: the start positions and the types of the nsites
+        '''
+        positions = []
+        ntypes = []
+        for m in self._regex.finditer(seq_str):
+            sequon = m.group(1)
+            ntype = LETTERS_TO_NTYPE.get(sequon[-1], None)
+            if ntype is None:
+                raise ValueError(str.format("Unexpected sequon {} at {}", sequon, m.start()))
+            positions.append(m.start())
+            ntypes.append(ntype)
+        return positions, ntypes
+
+
+_default_scanner = NSiteScanner()
+
+
+def search_nsites(seq_str):
+    return _default_scanner.search(seq_str)
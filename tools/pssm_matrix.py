@@ -1,27 +1,70 @@
-from Bio.Seq import Seq
-from Bio import motifs
-from Bio.Alphabet import IUPAC
+import math
+import numpy
+from tools import motifs as motif_tools
+
+# The letters of IUPAC.protein, in the same order as Biopython
+PROTEIN_ALPHABET = 'ACDEFGHIKLMNPQRSTVWY'
 
 
 # The operation of the motif.pssm in Bio-python is very slow,
 # storing pssm in dict/list could increase performance by more than 10,000 times.
 class Matrix(object):
-    def __init__(self, matrix):
-        self.length = matrix.length
-        self.pssm = {}
-        for a in matrix.pssm:
-            self.pssm[a] = [matrix.pssm[a][i] for i in range(0, self.length)]
+    def __init__(self, length, pssm, version=None, pvalue_table=None):
+        self.length = length
+        self.pssm = pssm
+        # the hash of the motifs which the matrix is generated from, see matrix_store.motifs_hash
+        self.version = version
+        # the exact p-values of the scores, see pvalues.calc_pvalue_table
+        self.pvalue_table = pvalue_table
 
 
-def calc_pssm_matrix(motif_seqs_str, origin=False):
+def _calc_origin_matrix(motif_seqs_str):
+    # Biopython is imported only here, it is slow to import and not needed by the web service
+    from Bio.Seq import Seq
+    from Bio import motifs
+    from Bio.Alphabet import IUPAC
+
     motif_seq = [Seq(motif_seq_str, IUPAC.protein) for motif_seq_str in motif_seqs_str]
     matrix = motifs.create(motif_seq, IUPAC.protein)
 
     # Laplace smoothing(add pseudo-count)
     for p in matrix.pseudocounts:
         matrix.pseudocounts[p] = 1
+    return matrix
+
+
+def _log_odds(p, background):
+    # math.log is used rather than numpy.log, the values are exactly the same as Biopython
+    if p > 0:
+        return math.log(p / background, 2)
+    return -math.inf
+
 
+def calc_pssm_matrix(motif_seqs_str, origin=False):
+    '''
+    Calculate the PSSM matrix of the motifs, with Laplace smoothing and uniform background
+    :param origin: return the Biopython motif instead of Matrix
+    '''
     if origin:
-        return matrix
-    else:
-        return Matrix(matrix)
+        return _calc_origin_matrix(motif_seqs_str)
+
+    if len(motif_seqs_str) == 0:
+        raise ValueError("No motif to calculate the PSSM matrix")
+    if len(set([len(motif_seq_str) for motif_seq_str in motif_seqs_str])) != 1:
+        raise ValueError("The motifs to calculate the PSSM matrix must be of the same length")
+    codes = numpy.array([motif_tools.encode_seq(motif_seq_str, PROTEIN_ALPHABET)
+                         for motif_seq_str in motif_seqs_str], dtype=numpy.intp)
+    length = codes.shape[1]
+
+    # Laplace smoothing(add pseudo-count)
+    counts = numpy.ones((len(PROTEIN_ALPHABET), length), dtype=numpy.float64)
+    numpy.add.at(counts, (codes, numpy.arange(length)), 1.0)
+    pwm = counts / counts.sum(axis=0)
+
+    # Biopython normalizes the uniform background again in log_odds, keep the same rounding
+    backgrounds = [1.0 / len(PROTEIN_ALPHABET)] * len(PROTEIN_ALPHABET)
+    background = backgrounds[0] / sum(backgrounds)
+    pssm = {}
+    for i, letter in enumerate(PROTEIN_ALPHABET):
+        pssm[letter] = [_log_odds(p, background) for p in pwm[i].tolist()]
+    return Matrix(length, pssm)
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*
+# THIS FILE IS PART OF phytolrr.com PROJECT.
+# Copyright 2019-2021 phytolrr.com. All rights reserved.
+
+'''
+The exact p-values of the PSSM scores: the distribution of the score of a random window, the letters drawn from the
+background, is calculated once per matrix by the dynamic programming over the columns, on the scores rounded to
+RESOLUTION. The rounded scores are on a uniform grid, so the p-values of any count of windows are looked up by
+indexing the grid directly, with no search.
+'''
+
+import numpy
+from tools import motifs as motif_tools
+
+# The step(in bits) the scores of the columns are rounded to
+RESOLUTION = 0.001
+
+
+class PValueTable(object):
+    def __init__(self, start, resolution, pvalues, margin):
+        '''
+        :param start: the lowest rounded score of a window
+        :param pvalues: the probability that the rounded score of a random window is not less than
+        start + i * resolution
+        :param margin: the max difference between the score of a window and its rounded score
+        '''
+        self.start = start
+        self.resolution = resolution
+        self.pvalues = pvalues
+        self.margin = margin
+
+    def scores(self):
+        return self.start + numpy.arange(len(self.pvalues)) * self.resolution
+
+    def lookup(self, scores):
+        '''
+        The p-values of the scores, never less than the exact ones, the error is bound by the margin of the scores
+        '''
+        # the first grid score not less than score - margin, a tiny tolerance for the float rounding
+        positions = (numpy.asarray(scores, dtype=numpy.float64) - self.margin - self.start) / self.resolution
+        indexes = numpy.ceil(positions - 1e-9)
+        return self.pvalues[numpy.clip(indexes, 0, len(self.pvalues) - 1).astype(numpy.intp)]
+
+
+def calc_pvalue_table(matrix, backgrounds=None, resolution=RESOLUTION):
+    '''
+    :param backgrounds: the frequency of each letter by letter, uniform if None(the same as pssm_matrix)
+    '''
+    alphabet, table = motif_tools.build_score_table(matrix)
+    if not numpy.all(numpy.isfinite(table)):
+        raise ValueError("The scores of the matrix must be finite")
+    if backgrounds is None:
+        frequencies = numpy.full(len(alphabet), 1.0 / len(alphabet))
+    else:
+        frequencies = numpy.array([backgrounds[letter] for letter in alphabet], dtype=numpy.float64)
+        frequencies /= frequencies.sum()
+
+    steps = numpy.rint(table / resolution).astype(numpy.int64)
+    min_steps = steps.min(axis=0)
+    # distribution[i] is the probability of the score (sum(min_steps) + i) * resolution
+    distribution = numpy.ones(1, dtype=numpy.float64)
+    for column in range(0, table.shape[1]):
+        shifts = steps[:, column] - min_steps[column]
+        next_distribution = numpy.zeros(len(distribution) + shifts.max(), dtype=numpy.float64)
+        for shift, frequency in zip(shifts.tolist(), frequencies.tolist()):
+            next_distribution[shift:shift + len(distribution)] += frequency * distribution
+        distribution = next_distribution
+
+    pvalues = numpy.cumsum(distribution[::-1])[::-1]
+    # all the windows reach the lowest score, correct the rounding of the frequencies and the sums
+    pvalues /= pvalues[0]
+    return PValueTable(float(min_steps.sum() * resolution), resolution, pvalues, table.shape[1] * resolution / 2)
@@ -0,0 +1,18 @@
+# THIS FILE IS PART OF phytolrr.com PROJECT.
+# Copyright 2019-2021 phytolrr.com. All rights reserved.
+
+import redis
+from settings import cache
+
+_client = None
+
+
+def get_redis_client():
+    '''The redis client shared in the process, None if redis is not enabled in settings.cache'''
+    global _client
+    if not cache.redis_enabled:
+        return None
+    if _client is None:
+        pool = redis.ConnectionPool(host=cache.host, port=cache.port)
+        _client = redis.Redis(connection_pool=pool)
+    return _client
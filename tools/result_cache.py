@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*
+# THIS FILE IS PART OF phytolrr.com PROJECT.
+# Copyright 2019-2021 phytolrr.com. All rights reserved.
+
+'''A content addressed cache for the results of the LRR search, an in-process LRU layer and an optional redis layer.'''
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+import redis
+
+REDIS_KEY_PREFIX = 'phytolrr:result:'
+
+
+def make_key(seq, matrix_version, *args):
+    '''The key of the result of a sequence searched by a matrix, args are the other search options'''
+    sha = hashlib.sha1(seq.encode('utf-8')).hexdigest()
+    return ':'.join([sha, str(matrix_version)] + [str(arg) for arg in args])
+
+
+class ResultCache(object):
+    def __init__(self, size, ttl, redis_client=None):
+        '''
+        :param size: the max count of the results kept in process
+        :param ttl: the seconds a result is kept
+        :param redis_client: the redis layer is disabled if None
+        '''
+        self.size = size
+        self.ttl = ttl
+        self.redis_client = redis_client
+        self._lock = threading.Lock()
+        self._keys_to_value = OrderedDict()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            item = self._keys_to_value.get(key, None)
+            if item is not None:
+                expire_at, value = item
+                if expire_at > now:
+                    self._keys_to_value.move_to_end(key)
+                    return value
+                del self._keys_to_value[key]
+
+        if self.redis_client is None:
+            return None
+        try:
+            value = self.redis_client.get(REDIS_KEY_PREFIX + key)
+        except redis.RedisError as e:
+            logging.warning(str.format("Failed to get result {} from redis: {}", key, e))
+            return None
+        if value is None:
+            return None
+        value = value.decode('utf-8')
+        self._put_local(key, value, now)
+        return value
+
+    def put(self, key, value):
+        '''value: str'''
+        self._put_local(key, value, time.monotonic())
+        if self.redis_client is None:
+            return
+        try:
+            self.redis_client.setex(REDIS_KEY_PREFIX + key, self.ttl, value.encode('utf-8'))
+        except redis.RedisError as e:
+            logging.warning(str.format("Failed to put result {} to redis: {}", key, e))
+
+    def _put_local(self, key, value, now):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._keys_to_value[key] = (now + self.ttl, value)
+            self._keys_to_value.move_to_end(key)
+            while len(self._keys_to_value) > self.size:
+                self._keys_to_value.popitem(last=False)
+
+    def __len__(self):
+        return len(self._keys_to_value)
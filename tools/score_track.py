@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*
+# THIS FILE IS PART OF phytolrr.com PROJECT.
+# Copyright 2019-2021 phytolrr.com. All rights reserved.
+
+'''
+The score track of a sequence: the PSSM scores of all its windows, stored as a float32 blob per sequence and matrix.
+The motifs can be found again at another FDR level, and the score of a window looked up, without scanning.
+The scores are rounded to float32, about 7 significant digits.
+'''
+
+import numpy
+from tools import motifs as motif_tools
+
+TRACK_DTYPE = numpy.dtype('<f4')
+
+
+def scores_to_track(scores):
+    return numpy.asarray(scores, dtype=TRACK_DTYPE).tobytes()
+
+
+def track_to_scores(track):
+    '''The float64 scores of the track'''
+    return numpy.frombuffer(track, dtype=TRACK_DTYPE).astype(numpy.float64)
+
+
+def track_length(track):
+    return len(track) // TRACK_DTYPE.itemsize
+
+
+def score_at(track, offset):
+    '''The score of the window at the offset, None if out of the track'''
+    if offset < 0 or offset >= track_length(track):
+        return None
+    return float(numpy.frombuffer(track, dtype=TRACK_DTYPE, count=1, offset=offset * TRACK_DTYPE.itemsize)[0])
+
+
+def lrr_search_by_track(track, alpha=motif_tools.FDR_ALPHA, length=16, pvalue_table=None):
+    '''The no overlapped LRR motifs found in the track at the FDR level alpha'''
+    motifs = motif_tools.lrr_search_by_scores(track_to_scores(track), alpha, pvalue_table)
+    return motif_tools.found_no_overlapped_motifs(motifs, length)
+
+
+def fdr_probabilities_by_track(track, alpha=motif_tools.FDR_ALPHA, pvalue_table=None):
+    '''The fdr_probability of every window of the track at the FDR level alpha, the same as lrr_search_by_track'''
+    probabilities = motif_tools.calc_probabilities_by_scores(track_to_scores(track), pvalue_table)
+    return motif_tools.fdr_procedure(probabilities, alpha=alpha)[1]
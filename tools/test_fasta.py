@@ -0,0 +1,38 @@
+import unittest
+from tools import fasta
+
+FASTA = '''>AT1G01010.1 NAC domain containing protein 1
+MEDQVGFGFRPNDEELVGHYLRNKIEGNTS
+RDVEVAISEVNICSYDPWNLRFQSKYKSRDAM
+
+>AT1G01020.1
+maaeeq
+>AT1G01030.1 | empty
+'''
+
+
+class TestFasta(unittest.TestCase):
+    def test_read_seqs(self):
+        seqs = list(fasta.read_seqs(FASTA.splitlines()))
+        self.assertEqual(['AT1G01010.1', 'AT1G01020.1', 'AT1G01030.1'], [seq.seq_id for seq in seqs])
+        self.assertEqual('NAC domain containing protein 1', seqs[0].description)
+        self.assertEqual('MEDQVGFGFRPNDEELVGHYLRNKIEGNTSRDVEVAISEVNICSYDPWNLRFQSKYKSRDAM', seqs[0].seq)
+        self.assertEqual('MAAEEQ', seqs[1].seq)
+        self.assertEqual('', seqs[1].description)
+        self.assertEqual('', seqs[2].seq)
+
+    def test_read_seqs_without_header(self):
+        with self.assertRaises(ValueError):
+            list(fasta.read_seqs(['MAAEEQ', '>SEQ1', 'MAAEEQ']))
+
+    def test_read_in_all_seqs(self):
+        seq_ids_to_seq = fasta.read_in_all_seqs(FASTA)
+        self.assertEqual({'AT1G01010.1', 'AT1G01020.1', 'AT1G01030.1'}, seq_ids_to_seq.keys())
+
+    def test_find_invalid_aminos(self):
+        self.assertEqual(set(), fasta.find_invalid_aminos('MAAEEQ'))
+        self.assertEqual({'X', '*'}, fasta.find_invalid_aminos('MAXEEQ*'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import random
+import shutil
+import tempfile
+import unittest
+from tools import matrix_store
+from tools.pssm_matrix import calc_pssm_matrix
+
+
+AMINOS = 'ACDEFGHIKLMNPQRSTVWY'
+
+
+class FakeRedis(object):
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key, None)
+
+    def set(self, key, value):
+        self.values[key] = value
+
+
+class TestMatrixStore(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.motifs = [''.join([random.choice(AMINOS) for i in range(0, 16)]) for j in range(0, 50)]
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_motifs_hash(self):
+        shuffled_motifs = list(self.motifs)
+        random.shuffle(shuffled_motifs)
+        self.assertEqual(matrix_store.motifs_hash(self.motifs), matrix_store.motifs_hash(shuffled_motifs))
+        self.assertNotEqual(matrix_store.motifs_hash(self.motifs), matrix_store.motifs_hash(self.motifs[1:]))
+
+    def test_matrix_bytes(self):
+        matrix = calc_pssm_matrix(self.motifs)
+        loaded_matrix = matrix_store.matrix_from_bytes(matrix_store.matrix_to_bytes(matrix), 'v1')
+        self.assertEqual(matrix.length, loaded_matrix.length)
+        self.assertEqual(matrix.pssm, loaded_matrix.pssm)
+        self.assertEqual('v1', loaded_matrix.version)
+
+    def test_get_matrix_from_file(self):
+        store = matrix_store.MatrixStore(self.path)
+        key = matrix_store.motifs_hash(self.motifs)
+        self.assertIsNone(store.load(key))
+        matrix = matrix_store.get_matrix(self.motifs, store)
+        self.assertEqual(key, matrix.version)
+        self.assertEqual(calc_pssm_matrix(self.motifs).pssm, matrix.pssm)
+
+        loaded_matrix = matrix_store.MatrixStore(self.path).load(key)
+        self.assertIsNotNone(loaded_matrix)
+        self.assertEqual(key, loaded_matrix.version)
+        self.assertEqual(matrix.pssm, loaded_matrix.pssm)
+
+    def test_get_matrix_from_redis(self):
+        redis_client = FakeRedis()
+        matrix = matrix_store.get_matrix(self.motifs, matrix_store.MatrixStore(redis_client=redis_client))
+        self.assertEqual(1, len(redis_client.values))
+        loaded_matrix = matrix_store.MatrixStore(redis_client=redis_client).load(matrix.version)
+        self.assertEqual(matrix.pssm, loaded_matrix.pssm)
+
+    def test_get_matrix_motifs_changed(self):
+        store = matrix_store.MatrixStore(self.path)
+        matrix = matrix_store.get_matrix(self.motifs, store)
+        changed_matrix = matrix_store.get_matrix(self.motifs[1:], store)
+        self.assertNotEqual(matrix.version, changed_matrix.version)
+        self.assertEqual(calc_pssm_matrix(self.motifs[1:]).pssm, changed_matrix.pssm)
+
+    def test_get_matrix_with_pvalue_table(self):
+        store = matrix_store.MatrixStore(self.path)
+        matrix = matrix_store.get_matrix(self.motifs, store, with_pvalue_table=True)
+        self.assertIsNotNone(matrix.pvalue_table)
+        loaded_matrix = store.load(matrix.version)
+        self.assertEqual(matrix.pvalue_table.pvalues.tolist(), loaded_matrix.pvalue_table.pvalues.tolist())
+        self.assertEqual(matrix.pvalue_table.start, loaded_matrix.pvalue_table.start)
+        self.assertEqual(matrix.pvalue_table.resolution, loaded_matrix.pvalue_table.resolution)
+        self.assertEqual(matrix.pvalue_table.margin, loaded_matrix.pvalue_table.margin)
+
+    def test_get_matrix_stored_without_pvalue_table(self):
+        store = matrix_store.MatrixStore(self.path)
+        key = matrix_store.motifs_hash(self.motifs)
+        store.save(key, calc_pssm_matrix(self.motifs))
+        self.assertIsNone(matrix_store.get_matrix(self.motifs, store).pvalue_table)
+        self.assertIsNone(store.load(key).pvalue_table)
+        self.assertIsNotNone(matrix_store.get_matrix(self.motifs, store, with_pvalue_table=True).pvalue_table)
+        self.assertIsNotNone(store.load(key).pvalue_table)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,8 @@
 import random
 import unittest
 from tools.motifs import *
+from tools.motifs import _fdr_procedure
+from tools import motifs as motifs_module
 from tools.pssm_matrix import *
 
 
@@ -40,6 +42,237 @@ class TestLrrSearch(unittest.TestCase):
                          len(test_seq), len(ms), end - start))
 
 
+class TestPssmScores(unittest.TestCase):
+    def setUp(self):
+        self.matrix = SimulateMatrix()
+        self.seq = ''.join([random.choice(sorted(VALID_AMINO)) for i in range(0, 2000)])
+
+    def test_calc_pssm_scores_same_as_calc_pssm_score(self):
+        scores = calc_pssm_scores(self.seq, self.matrix)
+        self.assertEqual(len(self.seq) - 15, len(scores))
+        for i in range(0, len(scores)):
+            self.assertEqual(calc_pssm_score(self.seq[i:i + 16], self.matrix), scores[i])
+
+    def test_calc_pssm_scores_short_seq(self):
+        self.assertEqual(0, len(calc_pssm_scores(self.seq[:15], self.matrix)))
+        self.assertEqual(1, len(calc_pssm_scores(self.seq[:16], self.matrix)))
+
+    def test_calc_pssm_scores_invalid_amino(self):
+        with self.assertRaises(KeyError):
+            calc_pssm_scores(self.seq[:100] + 'X' + self.seq[100:200], self.matrix)
+
+    def test_generate_motifs_with_pssm_score(self):
+        motifs = generate_motifs_with_pssm_score(self.seq[:200], self.matrix)
+        self.assertEqual(185, len(motifs))
+        for m in motifs:
+            self.assertEqual(calc_pssm_score(self.seq[m.offset:m.offset + 16], self.matrix), m.score)
+            self.assertEqual(calc_probability_by_score(m.score), m.probability)
+
+
+def best_motif(matrix):
+    return ''.join([max(matrix.pssm.keys(), key=lambda a: matrix.pssm[a][i]) for i in range(0, matrix.length)])
+
+
+def motifs_fdr_procedure(motifs):
+    # the BH procedure on Motif objects one by one, as the reference of the vectorized one
+    motifs.sort(key=lambda k: k.probability, reverse=True)
+    for i, motif in enumerate(motifs):
+        motif.fdr_probability = 0.05 * i / len(motifs)
+    return [m for m in motifs if m.probability < m.fdr_probability]
+
+
+class TestFdrProcedure(unittest.TestCase):
+    def setUp(self):
+        self.matrix = SimulateMatrix()
+        for amino in VALID_AMINO:
+            self.matrix.pssm[amino] = [random.uniform(-4.0, 2.0) for i in range(0, self.matrix.length)]
+        self.seq = ''.join([random.choice(sorted(VALID_AMINO)) for i in range(0, 3000)])
+        self.seq = self.seq[:1000] + best_motif(self.matrix) + self.seq[1000:]
+
+    def test_lrr_search_same_as_motifs_fdr_procedure(self):
+        expect_motifs = motifs_fdr_procedure(generate_motifs_with_pssm_score(self.seq, self.matrix))
+        motifs = lrr_search(self.matrix, self.seq)
+        self.assertGreater(len(motifs), 0)
+        self.assertEqual([(m.offset, m.score, m.probability, m.fdr_probability) for m in expect_motifs],
+                         [(m.offset, m.score, m.probability, m.fdr_probability) for m in motifs])
+
+    def test_fdr_procedure_with_same_probabilities(self):
+        motifs = [SimulateMotif(i, 10.0) for i in range(0, 100)] + [SimulateMotif(100, 1.0)]
+        for m in motifs:
+            m.probability = calc_probability_by_score(m.score)
+        expect_motifs = motifs_fdr_procedure(list(motifs))
+        found_motifs = _fdr_procedure(list(motifs))
+        self.assertEqual([m.offset for m in expect_motifs], [m.offset for m in found_motifs])
+
+    def test_fdr_procedure_by_window_counts(self):
+        probabilities = numpy.array([0.5, 0.0001, 0.2, 0.9, 0.00001, 0.3, 0.4])
+        found, fdr_probabilities = fdr_procedure(probabilities, numpy.array([3, 0, 4]))
+        self.assertEqual([0.0, 0.05 * 2 / 3, 0.05 / 3, 0.0, 0.05 * 3 / 4, 0.05 * 2 / 4, 0.05 / 4],
+                         fdr_probabilities.tolist())
+        self.assertEqual([1, 4], found.tolist())
+
+
+class TestLrrSearchBatch(unittest.TestCase):
+    def setUp(self):
+        self.matrix = SimulateMatrix()
+        # make the scores spread widely, so that some motifs can pass the FDR procedure
+        for amino in VALID_AMINO:
+            self.matrix.pssm[amino] = [random.uniform(-4.0, 2.0) for i in range(0, self.matrix.length)]
+        aminos = sorted(VALID_AMINO)
+        self.seqs = [''.join([random.choice(aminos) for i in range(0, random.randint(0, 1500))])
+                     for j in range(0, 30)]
+        self.seqs[0] += best_motif(self.matrix)
+        self.seqs.append(''.join([random.choice(aminos) for i in range(0, 15)]))
+
+    def test_lrr_search_batch_same_as_lrr_search(self):
+        result = lrr_search_batch(self.matrix, self.seqs)
+        self.assertGreater(len(result), 0)
+        for seq_index, seq in enumerate(self.seqs):
+            expect_motifs = lrr_search(self.matrix, seq)
+            expect_motifs.sort(key=lambda m: m.offset)
+            motifs = result.to_motifs(seq_index)
+            self.assertEqual([m.offset for m in expect_motifs], [m.offset for m in motifs])
+            self.assertEqual([m.score for m in expect_motifs], [m.score for m in motifs])
+            self.assertEqual([m.probability for m in expect_motifs], [m.probability for m in motifs])
+            self.assertEqual([m.fdr_probability for m in expect_motifs], [m.fdr_probability for m in motifs])
+
+    def test_lrr_search_batch_empty(self):
+        self.assertEqual(0, len(lrr_search_batch(self.matrix, [])))
+        self.assertEqual(0, len(lrr_search_batch(self.matrix, ['', 'ACDE'])))
+
+
+class TestKernels(unittest.TestCase):
+    def setUp(self):
+        self.matrix = SimulateMatrix()
+        for amino in VALID_AMINO:
+            self.matrix.pssm[amino] = [random.uniform(-4.0, 2.0) for i in range(0, self.matrix.length)]
+        aminos = sorted(VALID_AMINO)
+        self.seqs = [''.join([random.choice(aminos) for i in range(0, random.randint(0, 1500))])
+                     for j in range(0, 20)]
+        self.seqs[0] += best_motif(self.matrix)
+
+    def tearDown(self):
+        set_kernel(KERNEL_GATHER)
+
+    def test_block_kernel_same_as_gather_kernel(self):
+        alphabet = ''.join(sorted(VALID_AMINO))
+        table = numpy.array([[random.uniform(-4.0, 2.0) for i in range(0, 24)] for letter in alphabet])
+        codes = encode_seq(''.join(self.seqs), alphabet)
+        # 18 and 3 have the last columns not in a full block
+        for length in [16, 24, 18, 3]:
+            block_tables = build_block_tables(table[:, :length])
+            self.assertEqual((length // BLOCK_SIZE, len(alphabet) ** BLOCK_SIZE), block_tables.shape)
+            scores = motifs_module._sum_window_scores_by_blocks(codes, table[:, :length], block_tables)
+            numpy.testing.assert_allclose(motifs_module._sum_window_scores(codes, table[:, :length]), scores,
+                                          rtol=0, atol=kernel_tolerance(table[:, :length]))
+
+    def test_kernel_tolerance(self):
+        alphabet, table = build_score_table(self.matrix)
+        self.assertLess(kernel_tolerance(table), 1e-12)
+        self.assertEqual(0.0, kernel_tolerance(numpy.zeros((20, 16))))
+        codes = encode_seq(''.join(self.seqs), alphabet)
+        gather_scores = motifs_module._sum_window_scores(codes, table)
+        block_scores = motifs_module._sum_window_scores_by_blocks(codes, table, build_block_tables(table))
+        self.assertLessEqual(numpy.abs(gather_scores - block_scores).max(), kernel_tolerance(table))
+        # only the gather kernel is bit-identical to calc_pssm_score
+        self.assertEqual([calc_pssm_score(self.seqs[0][i:i + 16], self.matrix) for i in range(0, 100)],
+                         gather_scores[:100].tolist())
+
+    def test_lrr_search_batch_by_block_kernel(self):
+        expect = lrr_search_batch(self.matrix, self.seqs)
+        self.assertGreater(len(expect), 0)
+        for kernel in [KERNEL_BLOCK, KERNEL_AUTO]:
+            set_kernel(kernel)
+            result = lrr_search_batch(self.matrix, self.seqs)
+            self.assertEqual(expect.seq_indexes.tolist(), result.seq_indexes.tolist())
+            self.assertEqual(expect.offsets.tolist(), result.offsets.tolist())
+            alphabet, table = build_score_table(self.matrix)
+            numpy.testing.assert_allclose(expect.scores, result.scores, rtol=0, atol=kernel_tolerance(table))
+            numpy.testing.assert_allclose(calc_pssm_scores(self.seqs[1], self.matrix),
+                                          [calc_pssm_score(self.seqs[1][i:i + 16], self.matrix)
+                                           for i in range(0, len(self.seqs[1]) - 15)],
+                                          rtol=0, atol=kernel_tolerance(table))
+
+    def test_block_kernel_without_benchmark(self):
+        def benchmark(*args, **kwargs):
+            raise AssertionError("The forced kernel must not be benchmarked")
+
+        motifs_module._prepared_tables.clear()
+        benchmark_kernels = motifs_module.benchmark_kernels
+        motifs_module.benchmark_kernels = benchmark
+        try:
+            set_kernel(KERNEL_BLOCK)
+            lrr_search_batch(self.matrix, self.seqs)
+            alphabet, table = build_score_table(self.matrix)
+            self.assertIsNone(motifs_module._prepare_tables(table)[1])
+        finally:
+            motifs_module.benchmark_kernels = benchmark_kernels
+
+        # the block tables are reused, the kernel is chosen once in auto mode
+        set_kernel(KERNEL_AUTO)
+        lrr_search_batch(self.matrix, self.seqs)
+        self.assertIn(motifs_module._prepare_tables(table)[1], (KERNEL_GATHER, KERNEL_BLOCK))
+
+    def test_benchmark_kernels(self):
+        alphabet, table = build_score_table(self.matrix)
+        kernels_to_seconds = benchmark_kernels(table, seq_length=1000, repeat=1)
+        self.assertEqual({KERNEL_GATHER, KERNEL_BLOCK}, set(kernels_to_seconds.keys()))
+
+    def test_set_kernel(self):
+        set_kernel(KERNEL_AUTO)
+        self.assertEqual(KERNEL_AUTO, get_kernel())
+        with self.assertRaises(ValueError):
+            set_kernel('simd')
+        self.assertEqual(KERNEL_AUTO, get_kernel())
+
+
+class TestLrrSearchBatchByMatrices(unittest.TestCase):
+    def setUp(self):
+        self.matrices = [SimulateMatrix() for i in range(0, 3)]
+        for matrix in self.matrices:
+            for amino in VALID_AMINO:
+                matrix.pssm[amino] = [random.uniform(-4.0, 2.0) for i in range(0, matrix.length)]
+        aminos = sorted(VALID_AMINO)
+        self.seqs = [''.join([random.choice(aminos) for i in range(0, random.randint(0, 800))])
+                     for j in range(0, 10)]
+        self.seqs[0] += best_motif(self.matrices[1])
+        self.seqs.append(''.join([random.choice(aminos) for i in range(0, 15)]))
+
+    def test_same_as_lrr_search_batch(self):
+        result = lrr_search_batch_by_matrices(self.matrices, self.seqs)
+        self.assertEqual(3, len(result))
+        for matrix, matrix_result in zip(self.matrices, result.results):
+            expect = lrr_search_batch(matrix, self.seqs)
+            self.assertEqual(expect.seq_indexes.tolist(), matrix_result.seq_indexes.tolist())
+            self.assertEqual(expect.offsets.tolist(), matrix_result.offsets.tolist())
+            self.assertEqual(expect.scores.tolist(), matrix_result.scores.tolist())
+            self.assertEqual(expect.fdr_probabilities.tolist(), matrix_result.fdr_probabilities.tolist())
+
+    def test_best_matrix_indexes(self):
+        result = lrr_search_batch_by_matrices(self.matrices, self.seqs)
+        self.assertEqual(len(self.seqs), len(result.best_matrix_indexes))
+        for seq, best in zip(self.seqs, result.best_matrix_indexes):
+            scores = numpy.array([calc_pssm_scores(seq, matrix) for matrix in self.matrices])
+            self.assertEqual(max(len(seq) - 15, 0), len(best))
+            self.assertEqual(numpy.argmax(scores, axis=0).tolist() if len(best) > 0 else [], best.tolist())
+        self.assertEqual(1, result.best_matrix_indexes[0][-1])
+
+    def test_empty(self):
+        result = lrr_search_batch_by_matrices(self.matrices, [])
+        self.assertEqual([0, 0, 0], [len(r) for r in result.results])
+        self.assertEqual([], result.best_matrix_indexes)
+        result = lrr_search_batch_by_matrices(self.matrices, ['', 'ACDE'])
+        self.assertEqual([[], []], [best.tolist() for best in result.best_matrix_indexes])
+
+    def test_different_lengths(self):
+        matrix = SimulateMatrix()
+        matrix.length = 24
+        with self.assertRaises(ValueError):
+            lrr_search_batch_by_matrices(self.matrices + [matrix], self.seqs)
+        with self.assertRaises(ValueError):
+            lrr_search_batch_by_matrices([], self.seqs)
+
+
 class TestMotifTools(unittest.TestCase):
     def test_get_highest_score_3_motif(self):
         motifs = [
@@ -171,6 +404,38 @@ class TestMotifTools(unittest.TestCase):
         offsets = set([m.offset for m in motifs])
         self.assertEqual(expect_offsets, offsets)
 
+    def test_get_highest_score_same_as_brute_force(self):
+        import itertools
+        for _ in range(0, 50):
+            motifs = [SimulateMotif(random.randint(0, 120), random.uniform(1.0, 30.0)) for i in range(0, 10)]
+            expect_score = 0.0
+            for n in range(1, len(motifs) + 1):
+                for chosen in itertools.combinations(motifs, n):
+                    if not is_overlapped([m.offset for m in chosen], 16):
+                        expect_score = max(expect_score, sum([m.score for m in chosen]))
+            score, no_overlap_motifs = get_highest_score_without_overlay(motifs, 16)
+            self.assertAlmostEqual(expect_score, score)
+            self.assertAlmostEqual(score, sum([m.score for m in no_overlap_motifs]))
+            self.assertFalse(is_overlapped([m.offset for m in no_overlap_motifs], 16))
+
+    def test_get_highest_score_dense_motifs(self):
+        motifs = [SimulateMotif(i, 10.0) for i in range(0, 20000)]
+        score, no_overlap_motifs = get_highest_score_without_overlay(motifs, 16)
+        self.assertFalse(is_overlapped([m.offset for m in no_overlap_motifs], 16))
+        self.assertEqual(20000 // 16, len(no_overlap_motifs))
+
+    def test_found_no_overlapped_motifs_with_length(self):
+        motifs = [SimulateMotif(0, 10.0), SimulateMotif(20, 10.0), SimulateMotif(40, 15.0)]
+        self.assertEqual(3, len(found_no_overlapped_motifs(motifs, 16)))
+        offsets = [m.offset for m in found_no_overlapped_motifs(motifs, 24)]
+        self.assertEqual([0, 40], offsets)
+        self.assertEqual([], found_no_overlapped_motifs([], 16))
+
+
+def is_overlapped(offsets, length):
+    offsets = sorted(offsets)
+    return any([offsets[i] + length > offsets[i + 1] for i in range(0, len(offsets) - 1)])
+
 
 if __name__ == '__main__':
     unittest.main()
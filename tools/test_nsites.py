@@ -0,0 +1,49 @@
+import random
+import re
+import unittest
+from tools import nsites
+
+
+def search_by_slicing(seq, regex_str):
+    '''The search of the old ot-flush-nsites.py'''
+    r = re.compile(regex_str)
+    start_positions = []
+    cur_pos = 0
+    while True:
+        m = r.search(seq)
+        if m is None:
+            break
+        start_positions.append(m.start() + cur_pos)
+        end_pos = m.end()
+        seq = seq[end_pos:]
+        cur_pos += end_pos
+    return start_positions
+
+
+class TestNSites(unittest.TestCase):
+    def test_search_nsites(self):
+        self.assertEqual(([2, 8], [nsites.S, nsites.T]), nsites.search_nsites('MANASQQPNGTNPS'))
+        self.assertEqual(([], []), nsites.search_nsites('NPSNPT'))
+        self.assertEqual(([0], [nsites.S]), nsites.search_nsites('NNST'))
+
+    def test_search_nsites_same_as_slicing(self):
+        for i in range(0, 20):
+            seq = ''.join([random.choice('NPSTAG') for j in range(0, 500)])
+            self.assertEqual(search_by_slicing(seq, nsites.NSITE_PATTERN), nsites.search_nsites(seq)[0])
+
+    def test_search_overlapping(self):
+        scanner = nsites.NSiteScanner(overlapping=True)
+        self.assertEqual(([0, 1], [nsites.S, nsites.T]), scanner.search('NNST'))
+        self.assertEqual(([1, 2], [nsites.T, nsites.S]), scanner.search('NNNTS'))
+
+    def test_search_pattern(self):
+        # N-X-C is not counted as S or T
+        scanner = nsites.NSiteScanner(pattern=r"N[A-OQ-Z][STC]")
+        with self.assertRaises(ValueError):
+            scanner.search('MANAC')
+        scanner = nsites.NSiteScanner(pattern=r"N[A-OQ-Z]T")
+        self.assertEqual(([5], [nsites.T]), scanner.search('MANASNAT'))
+
+
+if __name__ == '__main__':
+    unittest.main()
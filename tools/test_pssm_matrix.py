@@ -0,0 +1,40 @@
+import random
+import subprocess
+import sys
+import unittest
+from tools.pssm_matrix import *
+
+
+class TestPssmMatrix(unittest.TestCase):
+    def test_calc_pssm_matrix_same_as_biopython(self):
+        for count in [1, 2, 50, 500]:
+            motifs = [''.join([random.choice(PROTEIN_ALPHABET) for i in range(0, 16)]) for j in range(0, count)]
+            matrix = calc_pssm_matrix(motifs)
+            origin_matrix = calc_pssm_matrix(motifs, origin=True)
+            self.assertEqual(16, matrix.length)
+            self.assertEqual(set(PROTEIN_ALPHABET), set(matrix.pssm.keys()))
+            for letter in PROTEIN_ALPHABET:
+                self.assertEqual([origin_matrix.pssm[letter][i] for i in range(0, 16)], matrix.pssm[letter])
+
+    def test_calc_pssm_matrix_length(self):
+        matrix = calc_pssm_matrix(['LEVLFLHGNQLENDPYLELS', 'VTYLNLTHTGLQGTLTLRRL'])
+        self.assertEqual(20, matrix.length)
+        self.assertEqual(20, len(matrix.pssm['L']))
+
+    def test_calc_pssm_matrix_invalid_amino(self):
+        with self.assertRaises(KeyError):
+            calc_pssm_matrix(['LEVLFLHGNQLENDPX'])
+
+    def test_calc_pssm_matrix_invalid_motifs(self):
+        with self.assertRaises(ValueError):
+            calc_pssm_matrix([])
+        with self.assertRaises(ValueError):
+            calc_pssm_matrix(['LEVLFLHGNQLENDPY', 'LEVLFLHGNQLENDP'])
+
+    def test_biopython_not_imported(self):
+        code = 'import sys; from tools import pssm_matrix; pssm_matrix.calc_pssm_matrix(["LEVLFLHGNQLENDPY"]); ' \
+               'sys.exit(1 if "Bio" in sys.modules else 0)'
+        self.assertEqual(0, subprocess.call([sys.executable, '-c', code]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import itertools
+import random
+import unittest
+import numpy
+from tools import motifs as motif_tools
+from tools.pssm_matrix import Matrix, PROTEIN_ALPHABET, calc_pssm_matrix
+from tools.pvalues import *
+
+
+def random_matrix(length):
+    return Matrix(length, dict([(letter, [random.uniform(-4.0, 2.0) for i in range(0, length)])
+                                for letter in PROTEIN_ALPHABET]))
+
+
+class TestPValueTable(unittest.TestCase):
+    def setUp(self):
+        random.seed(25)
+
+    def test_same_as_enumerated(self):
+        matrix = random_matrix(3)
+        all_scores = numpy.array(sorted([sum([matrix.pssm[letter][i] for i, letter in enumerate(letters)])
+                                         for letters in itertools.product(PROTEIN_ALPHABET, repeat=3)]))
+        table = calc_pvalue_table(matrix)
+        self.assertAlmostEqual(1.0, table.pvalues[0])
+        self.assertTrue(numpy.all(numpy.diff(table.pvalues) <= 0))
+        self.assertAlmostEqual(all_scores[0], table.scores()[0], delta=table.margin)
+        self.assertAlmostEqual(all_scores[-1], table.scores()[-1], delta=table.margin)
+
+        def exact(score):
+            return (len(all_scores) - numpy.searchsorted(all_scores, score)) / len(all_scores)
+
+        for score in list(all_scores[::97]) + [all_scores[-1], all_scores[0] - 1.0]:
+            pvalue = table.lookup([score])[0]
+            # never less than the exact p-value, and bound by the rounding of the scores
+            self.assertGreaterEqual(pvalue + 1e-12, exact(score))
+            self.assertLessEqual(pvalue, exact(score - 2 * table.margin) + 1e-12)
+
+    def test_lookup_out_of_range(self):
+        matrix = random_matrix(16)
+        table = calc_pvalue_table(matrix)
+        pvalues = table.lookup([-1000.0, 1000.0])
+        self.assertEqual(1.0, pvalues[0])
+        self.assertEqual(table.pvalues[-1], pvalues[1])
+        # only the window of the highest letters of all the columns
+        self.assertAlmostEqual(1.0, pvalues[1] * len(PROTEIN_ALPHABET) ** 16, places=6)
+
+    def test_backgrounds(self):
+        matrix = random_matrix(2)
+        backgrounds = dict([(letter, 0.0) for letter in PROTEIN_ALPHABET])
+        backgrounds['A'] = 1.0
+        table = calc_pvalue_table(matrix, backgrounds)
+        score = matrix.pssm['A'][0] + matrix.pssm['A'][1]
+        self.assertEqual([1.0, 0.0], table.lookup([score, score + 0.01]).tolist())
+
+    def test_infinite_scores(self):
+        matrix = random_matrix(2)
+        matrix.pssm['A'][0] = -numpy.inf
+        with self.assertRaises(ValueError):
+            calc_pvalue_table(matrix)
+
+    def test_lrr_search_batch_by_pvalue_table(self):
+        motifs = [''.join([random.choice(PROTEIN_ALPHABET) for i in range(0, 16)]) for j in range(0, 50)]
+        matrix = calc_pssm_matrix(motifs)
+        table = calc_pvalue_table(matrix)
+        seqs = [''.join([random.choice(PROTEIN_ALPHABET) for i in range(0, 500)]) + motifs[0] for j in range(0, 5)]
+        result = motif_tools.lrr_search_batch(matrix, seqs, pvalue_table=table)
+        self.assertGreater(len(result), 0)
+        numpy.testing.assert_array_equal(table.lookup(result.scores), result.probabilities)
+        motifs = result.to_motifs(0)
+        self.assertEqual(result.probabilities[0], motifs[0].probability)
+        scores = motif_tools.calc_pssm_scores(seqs[0], matrix)
+        self.assertEqual([m.offset for m in motifs],
+                         sorted([m.offset for m in motif_tools.lrr_search_by_scores(scores, pvalue_table=table)]))
+
+
+if __name__ == '__main__':
+    unittest.main()
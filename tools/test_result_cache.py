@@ -0,0 +1,61 @@
+import time
+import unittest
+from tools.result_cache import *
+
+
+class FakeRedis(object):
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key, None)
+
+    def setex(self, key, ttl, value):
+        self.values[key] = value
+
+
+class TestResultCache(unittest.TestCase):
+    def test_make_key(self):
+        self.assertEqual(make_key('LEVLFLHGNQLENDPY', 'v1'), make_key('LEVLFLHGNQLENDPY', 'v1'))
+        self.assertNotEqual(make_key('LEVLFLHGNQLENDPY', 'v1'), make_key('LEVLFLHGNQLENDPY', 'v2'))
+        self.assertNotEqual(make_key('LEVLFLHGNQLENDPY', 'v1'), make_key('LEVLFLHGNQLENDPA', 'v1'))
+        self.assertNotEqual(make_key('LEVLFLHGNQLENDPY', 'v1', 16), make_key('LEVLFLHGNQLENDPY', 'v1', 24))
+
+    def test_get_and_put(self):
+        cache = ResultCache(10, 100)
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', 'A')
+        self.assertEqual('A', cache.get('a'))
+
+    def test_lru_eviction(self):
+        cache = ResultCache(3, 100)
+        for key in ['a', 'b', 'c']:
+            cache.put(key, key.upper())
+        # a is used recently, so b is evicted first
+        self.assertEqual('A', cache.get('a'))
+        cache.put('d', 'D')
+        self.assertEqual(3, len(cache))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual('A', cache.get('a'))
+        self.assertEqual('C', cache.get('c'))
+        self.assertEqual('D', cache.get('d'))
+
+    def test_ttl(self):
+        cache = ResultCache(10, 0.05)
+        cache.put('a', 'A')
+        self.assertEqual('A', cache.get('a'))
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(0, len(cache))
+
+    def test_redis_layer(self):
+        redis_client = FakeRedis()
+        ResultCache(10, 100, redis_client).put('a', 'A')
+        self.assertEqual(1, len(redis_client.values))
+        cache = ResultCache(10, 100, redis_client)
+        self.assertEqual('A', cache.get('a'))
+        self.assertEqual(1, len(cache))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import random
+import unittest
+from tools.motifs import *
+from tools.score_track import *
+from tools.test_motifs import SimulateMatrix, VALID_AMINO, best_motif
+
+
+class TestScoreTrack(unittest.TestCase):
+    def setUp(self):
+        random.seed(21)
+        self.matrix = SimulateMatrix()
+        for amino in VALID_AMINO:
+            self.matrix.pssm[amino] = [random.uniform(-4.0, 2.0) for i in range(0, self.matrix.length)]
+        aminos = sorted(VALID_AMINO)
+        self.seq = ''.join([random.choice(aminos) for i in range(0, 2000)])
+        self.seq = self.seq[:500] + best_motif(self.matrix) + self.seq[500:1200] + best_motif(self.matrix)
+
+    def test_track_round_trip(self):
+        scores = calc_pssm_scores(self.seq, self.matrix)
+        track = scores_to_track(scores)
+        self.assertEqual(len(scores) * 4, len(track))
+        self.assertEqual(len(scores), track_length(track))
+        numpy.testing.assert_allclose(scores, track_to_scores(track), rtol=1e-6)
+
+    def test_score_at(self):
+        scores = calc_pssm_scores(self.seq, self.matrix)
+        track = scores_to_track(scores)
+        for offset in [0, 100, len(scores) - 1]:
+            self.assertAlmostEqual(scores[offset], score_at(track, offset), places=4)
+        self.assertIsNone(score_at(track, -1))
+        self.assertIsNone(score_at(track, len(scores)))
+        self.assertIsNone(score_at(scores_to_track([]), 0))
+
+    def test_lrr_search_by_track_same_as_lrr_search(self):
+        expect_motifs = found_no_overlapped_motifs(lrr_search(self.matrix, self.seq))
+        self.assertGreater(len(expect_motifs), 0)
+        motifs = lrr_search_by_track(scores_to_track(calc_pssm_scores(self.seq, self.matrix)))
+        self.assertEqual(sorted([m.offset for m in expect_motifs]), sorted([m.offset for m in motifs]))
+
+    def test_lrr_search_by_track_alpha(self):
+        track = scores_to_track(calc_pssm_scores(self.seq, self.matrix))
+        strict = lrr_search_by_track(track, 1e-12)
+        loose = lrr_search_by_track(track, 0.5)
+        self.assertEqual(0, len(strict))
+        self.assertGreater(len(loose), len(lrr_search_by_track(track)))
+
+    def test_fdr_probabilities_by_track(self):
+        track = scores_to_track(calc_pssm_scores(self.seq, self.matrix))
+        motifs = lrr_search_by_track(track, 0.5)
+        fdr_probabilities = fdr_probabilities_by_track(track, 0.5)
+        self.assertEqual(track_length(track), len(fdr_probabilities))
+        for m in motifs:
+            self.assertEqual(m.fdr_probability, fdr_probabilities[m.offset])
+            self.assertLess(m.probability, fdr_probabilities[m.offset])
+
+    def test_lrr_search_batch_window_scores(self):
+        seqs = [self.seq, self.seq[:15], self.seq[:300]]
+        result = lrr_search_batch(self.matrix, seqs, with_window_scores=True)
+        self.assertEqual(len(seqs), len(result.window_scores))
+        for seq, scores in zip(seqs, result.window_scores):
+            self.assertEqual(calc_pssm_scores(seq, self.matrix).tolist(), scores.tolist())
+        self.assertIsNone(lrr_search_batch(self.matrix, seqs).window_scores)
+        self.assertEqual([], lrr_search_batch(self.matrix, [], with_window_scores=True).window_scores)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,27 +3,30 @@ import os
 from logging.handlers import RotatingFileHandler
 import bottle
 import settings
+from web_service import serving
 from web_service.motif_service import *
 from web_service.sequence_service import *
 from web_service.lrr_service import *
+from web_service.plugin_traffic_control import traffic_controller
 
 
-@bottle.get('/<filepath:path>')
+# the static files are not limited by the traffic control, only the API routes are
+@bottle.get('/<filepath:path>', skip=[traffic_controller])
 def sequence_index_default(filepath):
     return bottle.static_file(filepath, root='../frontend/dist')
 
 
-@bottle.get('/')
+@bottle.get('/', skip=[traffic_controller])
 def get_index():
     return sequence_index_default('lrr_db.html')
 
 
-@bottle.get('/findlrr')
+@bottle.get('/findlrr', skip=[traffic_controller])
 def get_index():
     return sequence_index_default('find_lrr.html')
 
 
-@bottle.get('/about')
+@bottle.get('/about', skip=[traffic_controller])
 def get_index():
     return sequence_index_default('about.html')
 
@@ -66,5 +69,9 @@ if __name__ == '__main__':
     import sys
     print(str.format("Configs: {}", settings.repr_all_configs()))
     _init_log()
+    logging.warning("Begin to load the baseline matrix")
+    get_baseline_matrix()
+    if settings.traffic.enabled:
+        bottle.install(traffic_controller)
     logging.warning("Begin to start the bottle server")
-    bottle.run(host=settings.server.host, port=settings.server.port)
+    serving.run()
@@ -1,22 +1,72 @@
-from bottle import post, request
-from tools.exception import ValidationError, ErrorCode
+from bottle import post, request, response
+from tools.exception import ValidationError, ErrorCode, ServiceUnavailableError
 from web_service import service_utils
-from tools import motifs as motif_tool, pssm_matrix
+from web_service.scan_executor import ScanExecutor, search_lrr
+from tools import matrix_store, result_cache
+from tools import motifs as motif_tools
+from tools.redis_client import get_redis_client
 import dao
+import json
 import logging
+import settings
+import time
 
 
 MAX_SEQ_LENGTH = 8000
-MATRIX = None
+# The lengths of the motifs could be searched, 24 is the extended LRR window
+MOTIF_LENGTHS = (16, 24)
+MAX_TOP_K = 1000
+# The matrices of the baseline motifs, and the time they are checked, by motif length
+MATRICES = {}
+MATRICES_CHECKED_AT = {}
+RESULT_CACHE = result_cache.ResultCache(settings.cache.result_cache_size, settings.cache.result_cache_ttl,
+                                        get_redis_client())
+SCAN_EXECUTOR = None
 
 
-def _get_matrix():
-    global MATRIX
-    if MATRIX is None:
-        motifs = dao.find_baseline_motifs(baseline_version=1, with_wrong=False)
-        logging.info(str.format("Baseline LRR motifs for lrr-service( count {}): {}", len(motifs), motifs))
-        MATRIX = pssm_matrix.calc_pssm_matrix(motifs)
-    return MATRIX
+def get_baseline_matrix(length=16):
+    """
+    Get the matrix of the baseline motifs of the length, the baseline motifs are re-checked every
+    settings.cache.matrix_check_interval seconds and the matrix is reloaded once they change.
+    The matrices are built once by matrix_store and shared with the other processes.
+    """
+    now = time.time()
+    matrix = MATRICES.get(length, None)
+    if matrix is not None and now - MATRICES_CHECKED_AT.get(length, 0.0) < settings.cache.matrix_check_interval:
+        return matrix
+
+    motifs = dao.find_baseline_motifs(baseline_version=1, with_wrong=False, length=length)
+    if len(motifs) == 0:
+        logging.error(str.format("No baseline LRR motif fits the windows of length {}", length))
+        raise ServiceUnavailableError(str.format("The LRR search of motif length {} is not available, "
+                                                 "no baseline motif fits the length", length))
+    if matrix is None or matrix.version != matrix_store.motifs_hash(motifs):
+        logging.info(str.format("Baseline LRR motifs of length {} for lrr-service( count {}): {}",
+                                length, len(motifs), motifs))
+        matrix = matrix_store.get_matrix(motifs)
+        MATRICES[length] = matrix
+    MATRICES_CHECKED_AT[length] = now
+    return matrix
+
+
+def get_baseline_matrices():
+    """The matrices of all the motif lengths, the lengths without baseline motifs are skipped"""
+    matrices = []
+    for length in MOTIF_LENGTHS:
+        try:
+            matrices.append(get_baseline_matrix(length))
+        except ServiceUnavailableError:
+            continue
+    return matrices
+
+
+def _get_scan_executor():
+    """The process pool to run the scans, created in each worker process on the first scan"""
+    global SCAN_EXECUTOR
+    if SCAN_EXECUTOR is None and settings.server.scan_workers > 0:
+        SCAN_EXECUTOR = ScanExecutor(settings.server.scan_workers, settings.server.scan_queue_size,
+                                     settings.server.scan_timeout, get_baseline_matrices)
+    return SCAN_EXECUTOR
 
 
 def _get_sequence():
@@ -31,14 +81,46 @@ def _get_sequence():
     return seq
 
 
+def _get_search_options():
+    """
+    The optional alpha(the FDR level), motif_length and top_k of the search
+    :return: (alpha, motif_length, top_k), top_k is None if not limited
+    """
+    payload = request.json
+    alpha = payload.get("alpha", motif_tools.FDR_ALPHA)
+    if isinstance(alpha, bool) or not isinstance(alpha, (int, float)) or not 0 < alpha < 1:
+        raise ValidationError(str.format(ErrorCode.INVALID_PARA, "alpha", "must be between 0 and 1"))
+    motif_length = payload.get("motif_length", 16)
+    if isinstance(motif_length, bool) or motif_length not in MOTIF_LENGTHS:
+        raise ValidationError(str.format(ErrorCode.INVALID_PARA, "motif_length",
+                                         str.format("must be one of {}", MOTIF_LENGTHS)))
+    top_k = payload.get("top_k", None)
+    if top_k is not None and (isinstance(top_k, bool) or not isinstance(top_k, int) or not 0 < top_k <= MAX_TOP_K):
+        raise ValidationError(str.format(ErrorCode.INVALID_PARA, "top_k",
+                                         str.format("must be an integer between 1 and {}", MAX_TOP_K)))
+    return float(alpha), motif_length, top_k
+
+
 @post("/find-lrr")
 def find_lrr():
     try:
         seq = _get_sequence()
-        matrix = _get_matrix()
-        motifs = motif_tool.lrr_search(matrix, seq)
-        motifs = motif_tool.found_no_overlapped_motifs(motifs, 16)
-        motifs.sort(key=lambda m:m.offset)
-        return service_utils.response_ok({'LRRs': [m.__dict__ for m in motifs]})
+        alpha, motif_length, top_k = _get_search_options()
+        matrix = get_baseline_matrix(motif_length)
+        key = result_cache.make_key(seq, matrix.version, alpha, top_k)
+        body = RESULT_CACHE.get(key)
+        if body is None:
+            executor = _get_scan_executor()
+            if executor is None:
+                lrrs = search_lrr(matrix, seq, alpha, top_k)
+            else:
+                lrrs = executor.search(matrix, seq, alpha, top_k)
+            body = json.dumps({'LRRs': lrrs})
+            RESULT_CACHE.put(key, body)
+        return service_utils.response_ok(body)
     except ValidationError as e:
         return service_utils.response_error(e.message)
+    except ServiceUnavailableError as e:
+        if e.retry_after is not None:
+            response.headers['Retry-After'] = str(e.retry_after)
+        return service_utils.response_error(e.message, 503)
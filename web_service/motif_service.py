@@ -7,8 +7,9 @@ import dao
 import settings
 from web_service.service_utils import *
 from tools.exception import *
-from tools import pssm_matrix
 from tools import motifs as motif_tools
+from tools import score_track
+from web_service.lrr_service import get_baseline_matrix
 
 
 def motif_entity_output(motifs, ids_to_tag_names):
@@ -36,6 +37,20 @@ def motif_entity_output(motifs, ids_to_tag_names):
     return output
 
 
+def calc_motif_score(seq, offset, matrix):
+    '''
+    The score of the window at the offset, looked up in the score track of the sequence if saved,
+    else calculated by calc_pssm_score. The scores of the tracks are float32(see tools.score_track),
+    so a score looked up differs from the calculated one after about 7 significant digits.
+    '''
+    track = dao.find_score_track(seq.seq_id, matrix.version)
+    if track is not None:
+        score = score_track.score_at(track, offset)
+        if score is not None:
+            return score
+    return motif_tools.calc_pssm_score(seq.seq[offset:offset+16], matrix)
+
+
 def get_and_check_int(num_str, message):
     try:
         return int(num_str)
@@ -119,18 +134,13 @@ def is_overlapped(offsets):
     return False
 
 
-MATRIX = None
-
 if settings.mode == settings.MODE_DEV:
     @post('/version/<version>/sequences/<sid>/motifs')
     def add_manually_motif(version, sid):
-        global MATRIX
-        if MATRIX is None:
-            MATRIX = pssm_matrix.calc_pssm_matrix(dao.find_baseline_motifs(1, False))
         try:
             seq = get_and_check_sid(sid)
             offset = get_and_check_offset(seq, get_version_arg(version))
-            score = motif_tools.calc_pssm_score(seq.seq[offset:offset+16], MATRIX)
+            score = calc_motif_score(seq, offset, get_baseline_matrix())
             probability = motif_tools.calc_probability_by_score(score)
             result = dao.add_manually_motif(seq.seq_id, offset, get_version_arg(version), score, probability)
             if result is None:
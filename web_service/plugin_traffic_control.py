@@ -1,12 +1,155 @@
+import ipaddress
+import logging
+import math
+import time
+import bottle
 import redis
-from settings import cache
+from settings import traffic
+from tools.redis_client import get_redis_client
 from web_service import service_utils
 
-pool = redis.ConnectionPool(host=cache.host, port=cache.port)
-r = redis.Redis(connection_pool=pool)
+
+# KEYS: the bucket of the client, the statistics of current minute
+# ARGV: capacity, refill rate per second, now in seconds, the budget name
+# Return: {1 if allowed else 0, the seconds to wait before the next token}
+TOKEN_BUCKET_SCRIPT = '''
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+    redis.call('HINCRBY', KEYS[2], ARGV[4], 1)
+else
+    retry_after = (1 - tokens) / rate
+    redis.call('HINCRBY', KEYS[2], ARGV[4] .. ':limited', 1)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens))
+redis.call('HSET', KEYS[1], 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+redis.call('EXPIRE', KEYS[2], 86400)
+return {allowed, tostring(retry_after)}
+'''
+
+BUCKET_KEY_PREFIX = 'phytolrr:bucket:'
+STATS_KEY_PREFIX = 'phytolrr:stats:'
+
+# The endpoints limited by the scan budget, the others share the default budget
+SCAN_PATHS = {'/find-lrr'}
+
+
+class Budget(object):
+    def __init__(self, name, capacity, rate):
+        self.name = name
+        self.capacity = capacity
+        self.rate = rate
+
+
+def get_budget(path):
+    if path in SCAN_PATHS:
+        return Budget('scan', traffic.scan_capacity, traffic.scan_rate)
+    return Budget('default', traffic.default_capacity, traffic.default_rate)
+
+
+_networks = {}
+
+
+def _parse_networks(networks_str):
+    networks = _networks.get(networks_str, None)
+    if networks is None:
+        networks = [ipaddress.ip_network(network.strip(), strict=False)
+                    for network in networks_str.split(',') if network.strip()]
+        _networks[networks_str] = networks
+    return networks
+
+
+def _in_networks(ip, networks_str):
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any([address in network for network in _parse_networks(networks_str)])
+
+
+def get_client_ip(request):
+    '''
+    The real ip of the client. The headers set by the client itself are passed through by the proxies,
+    so only CF-Connecting-IP from Cloudflare and the hops of X-Forwarded-For appended by the trusted proxies are used.
+    '''
+    remote_addr = request.environ.get('REMOTE_ADDR')
+    if _in_networks(remote_addr, traffic.cloudflare_proxies):
+        ip = request.get_header('CF-Connecting-IP')
+        if ip:
+            return ip.strip()
+    if not _in_networks(remote_addr, traffic.trusted_proxies):
+        return remote_addr
+    forwarded_for = request.get_header('X-Forwarded-For')
+    if not forwarded_for:
+        return remote_addr
+    hops = [hop.strip() for hop in forwarded_for.split(',') if hop.strip()]
+    for hop in reversed(hops):
+        if not _in_networks(hop, traffic.trusted_proxies):
+            return hop
+    return hops[0] if len(hops) > 0 else remote_addr
+
+
+class RateLimiter(object):
+    def __init__(self, redis_client):
+        self._script = redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def take(self, client_ip, budget, now=None):
+        '''
+        Take a token of the client from the budget, return 0 if allowed, or the seconds to retry
+        :param now: the time in seconds, the current time if None
+        '''
+        if now is None:
+            now = time.time()
+        keys = [str.format("{}{}:{}", BUCKET_KEY_PREFIX, budget.name, client_ip),
+                str.format("{}{}", STATS_KEY_PREFIX, int(now // 60))]
+        allowed, retry_after = self._script(keys=keys, args=[budget.capacity, budget.rate, now, budget.name])
+        if allowed:
+            return 0.0
+        return float(retry_after)
+
+
+_limiter = None
+
+
+def get_limiter():
+    global _limiter
+    if _limiter is None and traffic.enabled:
+        redis_client = get_redis_client()
+        if redis_client is None:
+            logging.error("The traffic control requires redis, enable it by redis_enabled in cache section")
+            return None
+        _limiter = RateLimiter(redis_client)
+    return _limiter
+
 
 def traffic_controller(callback):
     def wrapper(*args, **kwargs):
-        body = callback(*args, **kwargs)
-        return body
+        limiter = get_limiter()
+        if limiter is not None:
+            client_ip = get_client_ip(bottle.request)
+            try:
+                retry_after = limiter.take(client_ip, get_budget(bottle.request.path))
+            except redis.RedisError as e:
+                # do not reject the requests if redis is unavailable
+                logging.warning(str.format("Failed to take token for client {}: {}", client_ip, e))
+                retry_after = 0.0
+            if retry_after > 0:
+                bottle.response.headers['Retry-After'] = str(int(math.ceil(retry_after)))
+                return service_utils.response_error("Too many requests, please retry later", 429)
+        return callback(*args, **kwargs)
     return wrapper
@@ -0,0 +1,119 @@
+'''
+Run the LRR scans in a bounded process pool, each worker process holds the matrices sent by the initializer,
+one matrix per motif length.
+The workers are spawned, so like any spawned process they import the main module of the parent, e.g. the web
+service with bottle and dao, whose __main__ guard keeps them from serving. The functions run in the workers only
+use the matrices and tools.motifs.
+'''
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from tools import motifs as motif_tool
+from tools.exception import ServiceUnavailableError
+
+# The matrices in the worker process by version
+_worker_matrices = {}
+
+
+def search_lrr(matrix, seq, alpha=motif_tool.FDR_ALPHA, top_k=None):
+    '''
+    :param alpha: the FDR level
+    :param top_k: only the top_k motifs of the highest scores are returned if not None
+    '''
+    motifs = motif_tool.lrr_search(matrix, seq, alpha)
+    motifs = motif_tool.found_no_overlapped_motifs(motifs, matrix.length)
+    if top_k is not None:
+        motifs.sort(key=lambda m:m.score, reverse=True)
+        motifs = motifs[:top_k]
+    motifs.sort(key=lambda m:m.offset)
+    return [m.__dict__ for m in motifs]
+
+
+def _init_worker(matrices):
+    global _worker_matrices
+    _worker_matrices = dict([(matrix.version, matrix) for matrix in matrices])
+
+
+def _search_lrr_in_worker(matrix_version, seq, alpha, top_k):
+    return search_lrr(_worker_matrices[matrix_version], seq, alpha, top_k)
+
+
+class ScanExecutor(object):
+    def __init__(self, workers, queue_size, timeout, preload_matrices=None):
+        '''
+        :param workers: the count of the worker processes
+        :param queue_size: the max count of the scans waiting for a worker, more scans are rejected
+        :param timeout: the seconds to wait for a scan
+        :param preload_matrices: the function returning the matrices sent to the workers with the one searched when
+        the pool is created, e.g. of all the motif lengths, so the first scan of another length does not restart
+        the pool
+        '''
+        self.workers = workers
+        self.timeout = timeout
+        self._preload_matrices = preload_matrices
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self._pool = None
+        # the matrices held by the workers by motif length
+        self._matrices = {}
+
+    def _get_pool(self, matrix):
+        with self._lock:
+            current = self._matrices.get(matrix.length, None)
+            if self._pool is not None and current is not None and current.version == matrix.version:
+                return self._pool
+            if self._pool is not None:
+                logging.info(str.format("Matrix of length {} changed to {}, restart the scan workers",
+                                        matrix.length, matrix.version))
+                self._pool.shutdown(wait=False)
+            if self._preload_matrices is not None:
+                for preload_matrix in self._preload_matrices():
+                    self._matrices[preload_matrix.length] = preload_matrix
+            self._matrices[matrix.length] = matrix
+            # spawn rather than fork, the request threads may hold locks when forking
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=_init_worker, initargs=(list(self._matrices.values()),))
+            return self._pool
+
+    def _reset_pool(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+    def search(self, matrix, seq, alpha=motif_tool.FDR_ALPHA, top_k=None):
+        if not self._slots.acquire(blocking=False):
+            raise ServiceUnavailableError("Too many LRR searches in progress, please retry later", retry_after=5)
+
+        pool = None
+        future = None
+        try:
+            pool = self._get_pool(matrix)
+            future = pool.submit(_search_lrr_in_worker, matrix.version, seq, alpha, top_k)
+        except BrokenProcessPool:
+            self._reset_pool(pool)
+            raise ServiceUnavailableError("The LRR search workers are restarting, please retry later", retry_after=1)
+        finally:
+            # failed to create the pool or submit the scan
+            if future is None:
+                self._slots.release()
+        # the slot is released when the scan is really done, not when the request gives up waiting
+        future.add_done_callback(lambda f: self._slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise ServiceUnavailableError("The LRR search timed out, please retry later", retry_after=5)
+        except BrokenProcessPool:
+            self._reset_pool(pool)
+            raise ServiceUnavailableError("The LRR search workers are restarting, please retry later", retry_after=1)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
@@ -1,4 +1,6 @@
 
+import base64
+import binascii
 import logging
 from bottle import get
 from bottle import request
@@ -55,6 +57,9 @@ def _get_page_arg():
     size = None
     try:
         page = int(request.query.page)
+    except ValueError:
+        pass
+    try:
         size = int(request.query.size)
     except ValueError:
         pass
@@ -91,6 +96,24 @@ def _get_species_arg(filters):
             filters['species'] = set(species)
 
 
+def encode_cursor(seq_id):
+    '''The opaque cursor of the sequences after the seq_id'''
+    return base64.urlsafe_b64encode(seq_id.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        return base64.b64decode(cursor.encode('ascii'), altchars=b'-_', validate=True).decode('utf-8')
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValidationError(str.format(ErrorCode.INVALID_PARA, 'after', "not a cursor"))
+
+
+def _get_after_arg(filters):
+    after = request.query.after
+    if after is not None and len(after.strip()) > 0:
+        filters['after'] = decode_cursor(after.strip())
+
+
 def sequence_entity_to_output(seq, motifs, nsites, ids_to_tag_names):
     return {
         'id': seq.id,
@@ -104,8 +127,17 @@ def sequence_entity_to_output(seq, motifs, nsites, ids_to_tag_names):
 
 @get('/version/<version>/sequences')
 def get_sequences(version):
+    '''
+    The sequences are paged by page and size, or by the cursor after, which is the next of the previous page.
+    The page is ignored if the cursor is given, the database seeks to the cursor by the index of seq_id
+    instead of skipping the rows before the page.
+    '''
     filters = {}
-    filters['page_index'], filters['page_size'] = _get_page_arg()
+    try:
+        filters['page_index'], filters['page_size'] = _get_page_arg()
+        _get_after_arg(filters)
+    except ValidationError as e:
+        return response_error(e.message)
     filters['keyword'] = _get_keyword_arg()
     _get_offset_arg(filters)
     _get_lrr_count_arg(filters)
@@ -113,23 +145,15 @@ def get_sequences(version):
 
     filters['page_index'] = filters['page_index'] * filters['page_size']
     logging.debug(str.format("Filters: {}", filters))
-    seqs, total = dao.query_sequences(filters, get_version_arg(version))
-
-    # find motifs and nsites
-    seq_ids = [seq.seq_id for seq in seqs]
-    seq_ids_to_motifs = dao.find_motifs_by_seq_ids(seq_ids, get_version_arg(version))
-    seq_ids_to_nsites = dao.find_nsites_by_seq_ids(seq_ids)
-
-    # find tags, the overlap mark is tagged on version 1 motifs
-    if get_version_arg(version) == 1:
-        ids_to_tag_names = dao.find_tags_by_motif_ids(set([m.id for motifs in seq_ids_to_motifs.values() for m in motifs]))
-    else:
-        ids_to_tag_names = {}
+    # find motifs and nsites, the overlap mark is tagged on version 1 motifs
+    page = dao.query_sequences_page(filters, get_version_arg(version), with_tags=get_version_arg(version) == 1)
 
-    result = {'sequences': [], 'total': total}
-    for seq in seqs:
+    result = {'sequences': [], 'total': page.total, 'next': None}
+    for seq in page.seqs:
         result['sequences'].append(sequence_entity_to_output(seq,
-                                                             seq_ids_to_motifs.get(seq.seq_id, []),
-                                                             seq_ids_to_nsites.get(seq.seq_id, []),
-                                                             ids_to_tag_names))
+                                                             page.seq_ids_to_motifs.get(seq.seq_id, []),
+                                                             page.seq_ids_to_nsites.get(seq.seq_id, []),
+                                                             page.motif_ids_to_tag_names))
+    if len(page.seqs) > 0 and len(page.seqs) == filters['page_size']:
+        result['next'] = encode_cursor(page.seqs[-1].seq_id)
     return response_ok(result, True)
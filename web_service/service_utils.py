@@ -11,9 +11,9 @@ def get_version_arg(version):
     return VALID_VERSIONS.get(version, 3)
 
 
-def response_error(message):
+def response_error(message, status=400):
     response.headers['Content-Type'] = 'application/json'
-    response.status = 400
+    response.status = status
     return json.dumps({
         'message': message
     })
@@ -0,0 +1,50 @@
+'''
+Run the bottle app by the engine configured in [server] section of settings.ini:
+wsgiref: the single-threaded server of bottle, for development
+threaded: the wsgiref server handling each request in a thread
+gunicorn: pre-fork workers by gunicorn(pip install gunicorn, not in requirements.txt as it only runs on unix),
+the app is loaded once by the master, so SIGHUP to the master restarts the workers gracefully but does not load
+new code, restart the master to deploy
+'''
+import logging
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIServer
+import bottle
+import dao
+from settings import server
+
+ENGINES = {'wsgiref', 'threaded', 'gunicorn'}
+
+
+def _threaded_server_class(backlog):
+    class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+        daemon_threads = True
+        request_queue_size = backlog
+    return ThreadingWSGIServer
+
+
+def _post_fork(master, worker):
+    # the connections must not be shared with the master
+    dao.reconnect()
+
+
+def run():
+    engine = server.engine
+    if engine not in ENGINES:
+        raise ValueError(str.format("Unknown server engine {}, must be one of {}", engine, ENGINES))
+    logging.warning(str.format("Run bottle server by {} on {}:{}", engine, server.host, server.port))
+
+    if engine == 'threaded':
+        bottle.run(host=server.host, port=server.port, server='wsgiref',
+                   server_class=_threaded_server_class(server.backlog))
+    elif engine == 'gunicorn':
+        try:
+            import gunicorn
+        except ImportError:
+            raise ImportError("The server engine gunicorn requires gunicorn, install it by pip install gunicorn")
+        bottle.run(host=server.host, port=server.port, server='gunicorn',
+                   workers=server.workers, backlog=server.backlog,
+                   timeout=server.timeout, graceful_timeout=server.graceful_timeout,
+                   preload_app=True, post_fork=_post_fork)
+    else:
+        bottle.run(host=server.host, port=server.port)